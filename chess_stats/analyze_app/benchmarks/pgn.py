@@ -0,0 +1,101 @@
+import random
+from datetime import datetime, timedelta
+
+import chess
+import chess.pgn
+
+OPENINGS = (
+    ("e2e4", "e7e5", "g1f3", "b8c6", "f1b5"),  # Ruy Lopez
+    ("e2e4", "c7c5", "g1f3", "d7d6"),  # Sicilian Defense
+    ("e2e4", "e7e6", "d2d4", "d7d5"),  # French Defense
+    ("d2d4", "d7d5", "c2c4", "e7e6"),  # Queen's Gambit Declined
+    ("e2e4", "c7c6", "d2d4", "d7d5"),  # Caro-Kann Defense
+)
+TERMINATIONS = ("won by resignation", "won on time", "won by checkmate")
+
+
+def synthetic_pgns(
+    username: str,
+    host: str = "chess.com",
+    count: int = 10,
+    plies: int = 60,
+    seed: int = 0,
+    time_control: str = "180+0",
+) -> list[str]:
+    """
+    Random, but legal games of `username` formatted like PGNs returned by `host`,
+    newest first. They can be parsed by `chess_insight.Game`.
+    """
+    rng = random.Random(seed)
+    newest = datetime(2023, 10, 1, 12)
+    return [
+        _synthetic_pgn(
+            rng,
+            username,
+            host,
+            number,
+            plies,
+            time_control,
+            newest - timedelta(hours=number),
+        )
+        for number in range(count)
+    ]
+
+
+def _synthetic_pgn(
+    rng: random.Random,
+    username: str,
+    host: str,
+    number: int,
+    plies: int,
+    time_control: str,
+    date: datetime,
+) -> str:
+    board = chess.Board()
+    for move in rng.choice(OPENINGS):
+        board.push_uci(move)
+    while len(board.move_stack) < plies and not board.is_game_over():
+        board.push(rng.choice(list(board.legal_moves)))
+
+    game = chess.pgn.Game.from_board(board)
+    total, increment = map(int, time_control.split("+"))
+    clocks = [float(total), float(total)]
+    for ply, node in enumerate(game.mainline()):
+        spent = round(rng.uniform(0.1, total / 40), 1)
+        clocks[ply % 2] = max(clocks[ply % 2] - spent, 0.1) + increment
+        node.set_clock(clocks[ply % 2])
+
+    white, black = username, f"rival{number}"
+    if rng.random() < 0.5:
+        white, black = black, white
+    result = board.result() if board.is_game_over() else rng.choice(("1-0", "0-1"))
+    winner = white if result == "1-0" else black
+    game.headers.update(
+        {
+            "Event": "Live Chess",
+            "Date": date.strftime("%Y.%m.%d"),
+            "White": white,
+            "Black": black,
+            "Result": result,
+            "WhiteElo": str(rng.randint(1000, 2000)),
+            "BlackElo": str(rng.randint(1000, 2000)),
+            "TimeControl": time_control,
+            "UTCDate": date.strftime("%Y.%m.%d"),
+            "UTCTime": date.strftime("%H:%M:%S"),
+            "Termination": f"{winner} {rng.choice(TERMINATIONS)}"
+            if result != "1/2-1/2"
+            else "Game drawn by repetition",
+        }
+    )
+    if host == "chess.com":
+        game.headers["Site"] = "Chess.com"
+        game.headers[
+            "Link"
+        ] = f"https://www.chess.com/game/live/{seed_id(username, number)}"
+    else:
+        game.headers["Site"] = f"https://lichess.org/{seed_id(username, number):08d}"
+    return str(game)
+
+
+def seed_id(username: str, number: int) -> int:
+    return sum(map(ord, username)) * 100_000 + number
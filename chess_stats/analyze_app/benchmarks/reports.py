@@ -0,0 +1,137 @@
+import math
+import random
+from datetime import datetime, timedelta
+
+from django.db import transaction
+
+from ..models import (
+    MISTAKES,
+    PHASES,
+    ChessGame,
+    Color,
+    Report,
+    ReportGame,
+    Result,
+    SingleGamePlayer,
+)
+
+OPENINGS = (
+    ("Sicilian Defense", "Sicilian Defense: Alapin Variation"),
+    ("Sicilian Defense", "Sicilian Defense: Najdorf Variation"),
+    ("French Defense", "French Defense: Advance Variation"),
+    ("Queen's Gambit", "Queen's Gambit Declined"),
+    ("Caro-Kann Defense", "Caro-Kann Defense: Classical Variation"),
+    ("King's Pawn Game", "King's Pawn Game: Wayward Queen Attack"),
+    ("Italian Game", "Italian Game: Giuoco Piano"),
+    ("Ruy Lopez", "Ruy Lopez: Berlin Defense"),
+    ("Scandinavian Defense", "Scandinavian Defense: Main Line"),
+    ("English Opening", "English Opening: Symmetrical Variation"),
+)
+# chance of each mistake in a phase, later phases are played worse
+MISTAKE_RATES = {
+    "opening": (0.6, 0.3, 0.1),
+    "middle_game": (1.5, 0.8, 0.4),
+    "end_game": (1.0, 0.5, 0.3),
+}
+CHUNK_SIZE = 5000
+
+
+def synthetic_report(
+    games: int, seed: int = 0, username: str = "benchmark", depth: int = 10
+) -> Report:
+    """
+    Complete report of `games` random games with a realistic mix of hosts, colors,
+    results, openings, mistakes, move times and dates spread over two years.
+    """
+    rng = random.Random(seed)
+    report = Report.objects.create(
+        chess_com_username=username,
+        lichess_username=username,
+        time_class="blitz",
+        games_num=games,
+        analyzed_games=games,
+        engine_depth=depth,
+    )
+    newest = datetime(2023, 10, 1, 12)
+    elo = {"chess.com": 1200, "lichess.org": 1500}
+    for start in range(0, games, CHUNK_SIZE):
+        players, chess_games = [], []
+        for number in range(start, min(start + CHUNK_SIZE, games)):
+            host = "chess.com" if rng.random() < 0.6 else "lichess.org"
+            # ratings walk from the oldest game to the newest one
+            elo[host] += rng.randint(-8, 8)
+            player = _player(rng, elo[host])
+            opponent = _player(rng, elo[host] + rng.randint(-150, 150))
+            players += [player, opponent]
+            date = newest - timedelta(minutes=(games - number) * 730 * 24 * 60 // games)
+            chess_games.append(
+                _game(rng, username, host, number, depth, date, player, opponent)
+            )
+        with transaction.atomic():
+            SingleGamePlayer.objects.bulk_create(players)
+            ChessGame.objects.bulk_create(chess_games)
+            ReportGame.objects.bulk_create(
+                ReportGame(report=report, game=game) for game in chess_games
+            )
+    return report
+
+
+def _player(rng: random.Random, elo: int) -> SingleGamePlayer:
+    player = SingleGamePlayer(elo=elo)
+    # some games end before the end game, few games have no clock times
+    phases = PHASES if rng.random() < 0.8 else PHASES[:2]
+    clock = rng.random() < 0.97
+    for phase in phases:
+        for kind, rate in zip(MISTAKES, MISTAKE_RATES[phase]):
+            setattr(player, f"{phase}_{kind}", _poisson(rng, rate))
+        if clock:
+            setattr(player, f"{phase}_move_time", round(rng.uniform(0.5, 15), 3))
+    return player
+
+
+def _game(
+    rng: random.Random,
+    username: str,
+    host: str,
+    number: int,
+    depth: int,
+    date: datetime,
+    player: SingleGamePlayer,
+    opponent: SingleGamePlayer,
+) -> ChessGame:
+    opening_short, opening = rng.choice(OPENINGS)
+    color = rng.choice([Color.WHITE, Color.BLACK])
+    result = rng.choices(
+        [Result.WHITE, Result.DRAW, Result.BLACK], weights=[48, 6, 46]
+    )[0]
+    end_reason = (
+        "draw"
+        if result == Result.DRAW
+        else rng.choices(["resign", "timeout", "mate"], weights=[60, 25, 15])[0]
+    )
+    return ChessGame(
+        host=host,
+        player=player,
+        opponent=opponent,
+        date=date,
+        opening=opening,
+        opening_short=opening_short,
+        phases={"opening": 10, "middle_game": 30, "end_game": rng.randint(30, 60)},
+        player_color=color,
+        result=result,
+        end_reason=end_reason,
+        time_class="blitz",
+        time_control=rng.choice(["180+0", "180+2", "300+0"]),
+        url=f"https://{host}/game/{username}/{number}",
+        username=username,
+        engine_depth=depth,
+    )
+
+
+def _poisson(rng: random.Random, rate: float) -> int:
+    # Knuth's algorithm, rates are small
+    count, product, limit = 0, rng.random(), math.exp(-rate)
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
@@ -0,0 +1,74 @@
+import tracemalloc
+from logging import Logger
+from time import perf_counter
+from typing import Callable
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from ..models import ChessGame, Report
+from ..queries import ColumnarQueriesMaker, QueriesMaker
+
+
+def benchmark_statistics(report: Report, logger: Logger, repeat: int = 3) -> dict:
+    """
+    Seconds (best of `repeat` runs), SQL queries and peak of traced memory in KiB
+    of every `get_` method of `QueriesMaker` over all games of the report and of
+    `asdict` of both makers.
+    """
+    maker = QueriesMaker(report, logger)
+    columnar = ColumnarQueriesMaker(report, logger)
+    games = ChessGame.objects.filter(reports=report)
+    calls: dict[str, Callable] = {
+        method: (lambda method=method: getattr(maker, method)(games))
+        for method in maker.get_methods
+    }
+    calls["asdict"] = maker.asdict
+    calls["columnar_asdict"] = columnar.asdict
+    return {name: _measure(call, repeat) for name, call in calls.items()}
+
+
+def compare(results: dict, baseline: dict, threshold: float, noise: float) -> list:
+    """
+    Regressions of `results` against `baseline`, both keyed by number of games.
+    Time may grow by `threshold` (relative) or `noise` (seconds), queries can't grow.
+    """
+    regressions = []
+    for games, methods in results.items():
+        for name, result in methods.items():
+            before = baseline.get(games, {}).get(name)
+            if before is None:
+                continue
+            limit = max(before["seconds"] * (1 + threshold), before["seconds"] + noise)
+            if result["seconds"] > limit:
+                regressions.append(
+                    f"{name} ({games} games): {before['seconds']}s -> "
+                    f"{result['seconds']}s"
+                )
+            if result["queries"] > before["queries"]:
+                regressions.append(
+                    f"{name} ({games} games): {before['queries']} -> "
+                    f"{result['queries']} queries"
+                )
+    return regressions
+
+
+def _measure(call: Callable, repeat: int) -> dict:
+    seconds = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as context:
+            start = perf_counter()
+            call()
+            seconds.append(perf_counter() - start)
+    # tracing slows the call down, so memory is measured in a separate run
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": round(min(seconds), 4),
+        "queries": len(context.captured_queries),
+        "peak_kib": round(peak / 1024, 1),
+    }
@@ -0,0 +1,302 @@
+import io
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+
+import chess.pgn
+import httpx
+from chess_insight.api_communicator import ApiCommunicator
+from chess_insight.utils import get_time_class
+
+from .fetch import get_fetcher
+from .response_cache import get_response_cache
+
+
+def pgn_date(pgn: str) -> datetime:
+    """Start of the game in UTC, as stored in `ChessGame.date`."""
+    headers = chess.pgn.read_headers(io.StringIO(pgn))
+    return datetime.strptime(
+        f"{headers['UTCDate']} {headers['UTCTime']}", "%Y.%m.%d %H:%M:%S"
+    )
+
+
+def pgn_url(pgn: str) -> str | None:
+    """`ChessGame.url` of the game, read without parsing its moves."""
+    headers = chess.pgn.read_headers(io.StringIO(pgn))
+    if headers is None:
+        return None
+    # chess.com links games in `Link`, lichess in `Site`
+    return headers.get("Link") or headers.get("Site")
+
+
+def pgn_host(pgn: str) -> str:
+    """Host the game was played on, as named by `ChessGame.host`."""
+    url = pgn_url(pgn) or ""
+    return "lichess.org" if "lichess.org" in url else "chess.com"
+
+
+class ArchiveCommunicator(ApiCommunicator):
+    """
+    Games downloaded per month, newest first, up to `concurrency` months of the host
+    at once. Months are read through the response cache, past months are fetched
+    only once and the current month only if it changed.
+    """
+
+    def get_pgns(self, username: str, count: int, time_class: str) -> list[str]:
+        """Newest games, the interface of `ApiCommunicator`, see `iter_pgns`."""
+        return list(self.iter_pgns(username, count, time_class))
+
+    def iter_pgns(
+        self, username: str, count: int, time_class: str, since: datetime = None
+    ) -> Iterator[str]:
+        """
+        Newest games played after `since` (all of them without it), newest first.
+        Only months from the month of `since` on are downloaded, games are yielded
+        as soon as their month is downloaded, so they can be analyzed meanwhile.
+        """
+        months = self._get_months(username)
+        if since is not None:
+            months = [month for month in months if month >= (since.year, since.month)]
+        found = 0
+        for pgns in get_fetcher(self.HOST).map(
+            lambda month: self._get_month(username, *month), months
+        ):
+            for pgn in pgns:
+                if since is not None and pgn_date(pgn) <= since:
+                    return
+                if is_standard(chess.pgn.read_headers(io.StringIO(pgn)), time_class):
+                    found += 1
+                    yield pgn
+                if found >= count:
+                    return
+
+    def _get_month(self, username: str, year: int, month: int) -> list[str]:
+        cache = get_response_cache()
+        key = (self.HOST, username.lower(), f"{year}-{month:02d}")
+        entry = cache.get(*key) if cache else None
+        if entry and entry["complete"]:
+            return self._split_month(entry["body"])
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        response = self._fetch_month(username, year, month, headers)
+        body = entry["body"] if response.status_code == 304 else response.text
+        if cache:
+            cache.set(
+                *key,
+                body=body,
+                complete=_is_past(year, month),
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+        return self._split_month(body)
+
+    def _get_months(self, username: str) -> list[tuple[int, int]]:
+        """Months the user may have played in, newest first."""
+        raise NotImplementedError
+
+    def _fetch_month(
+        self, username: str, year: int, month: int, headers: dict
+    ) -> httpx.Response:
+        raise NotImplementedError
+
+    def _split_month(self, body: str) -> list[str]:
+        """PGNs of the month, newest first."""
+        raise NotImplementedError
+
+    def _get_user(self, path: str, username: str, **kwargs) -> httpx.Response:
+        try:
+            return get_fetcher(self.HOST).get(path, **kwargs)
+        except httpx.HTTPStatusError as err:
+            if err.response.status_code == 404:
+                raise ValueError(f"User {username} doesn't exist on {self.HOST}.")
+            raise err
+
+
+class ChessComCommunicator(ArchiveCommunicator):
+    """Games of chess.com users from their monthly archives."""
+
+    HOST = "chess.com"
+
+    def _get_months(self, username: str) -> list[tuple[int, int]]:
+        response = self._get_user(
+            f"/pub/player/{username.lower()}/games/archives", username
+        )
+        # archives are urls ending with year and month
+        months = [
+            tuple(map(int, url.rstrip("/").split("/")[-2:]))
+            for url in response.json()["archives"]
+        ]
+        return sorted(months, reverse=True)
+
+    def _fetch_month(
+        self, username: str, year: int, month: int, headers: dict
+    ) -> httpx.Response:
+        return get_fetcher(self.HOST).get(
+            f"/pub/player/{username.lower()}/games/{year}/{month:02d}/pgn",
+            headers=headers,
+        )
+
+    def _split_month(self, body: str) -> list[str]:
+        # archives are in chronological order
+        return list(reversed(self.split_pgns(body)))
+
+
+class LichessCommunicator(ArchiveCommunicator):
+    """
+    Games of lichess users of a time class, newest first. Months cached by earlier
+    reports are read from the response cache, the games left are exported by a
+    single request for at most as many games as are still needed - only the
+    current month if older ones are cached. Past months the export covered
+    completely are cached, also months without games.
+    """
+
+    HOST = "lichess.org"
+
+    def iter_pgns(
+        self, username: str, count: int, time_class: str, since: datetime = None
+    ) -> Iterator[str]:
+        now = datetime.utcnow()
+        month, found = (now.year, now.month), 0
+        while since is None or month >= (since.year, since.month):
+            pgns = self._get_cached_month(username, time_class, *month)
+            exported_all = False
+            if pgns is None:
+                # only this month is exported if the older one is cached
+                older = self._get_cached_month(username, time_class, *_previous(month))
+                exported_all = older is None
+                last = None if exported_all else month
+                pgns = self._export(
+                    username, time_class, month, last, count - found, since
+                )
+            for pgn in pgns:
+                if since is not None and pgn_date(pgn) <= since:
+                    return
+                if is_standard(chess.pgn.read_headers(io.StringIO(pgn)), time_class):
+                    found += 1
+                    yield pgn
+                if found >= count:
+                    return
+            if exported_all:
+                return
+            month = _previous(month)
+
+    def _get_cached_month(
+        self, username: str, time_class: str, year: int, month: int
+    ) -> list[str] | None:
+        cache = get_response_cache()
+        key = (self.HOST, username.lower(), f"{year}-{month:02d}-{time_class}")
+        entry = cache.get(*key) if cache else None
+        if entry and entry["complete"]:
+            return self.split_pgns(entry["body"])
+        return None
+
+    def _export(
+        self,
+        username: str,
+        time_class: str,
+        first: tuple[int, int],
+        last: tuple[int, int] | None,
+        count: int,
+        since: datetime | None,
+    ) -> list[str]:
+        """
+        At most `count` games played from the end of month `first` back to the start
+        of month `last` (or `since`), newest first. Months covered completely are
+        cached.
+        """
+        start = datetime(*last, 1) if last else None
+        if since and (start is None or since > start):
+            start = since
+        params = {
+            "perfType": time_class,
+            "max": count,
+            "until": _timestamp(datetime(*_next(first), 1)) - 1,
+            "clocks": "true",
+        }
+        if start:
+            params["since"] = _timestamp(start)
+        response = self._get_user(
+            f"/api/games/user/{username}",
+            username,
+            params=params,
+            headers={"Accept": "application/x-chess-pgn"},
+        )
+        pgns = self.split_pgns(response.text)
+        cache = get_response_cache()
+        if not cache:
+            return pgns
+        if len(pgns) >= count:
+            # the month of the oldest game may have more games
+            oldest = pgn_date(pgns[-1])
+            floor = _next((oldest.year, oldest.month))
+        elif start:
+            floor = (start.year, start.month)
+            if start.day > 1 or start.time() != datetime.min.time():
+                floor = _next(floor)
+        else:
+            oldest = pgn_date(pgns[-1]) if pgns else datetime(*first, 1)
+            floor = (oldest.year, oldest.month)
+        months = {}
+        for pgn in pgns:
+            date = pgn_date(pgn)
+            months.setdefault((date.year, date.month), []).append(pgn)
+        month = first
+        while month >= floor:
+            if _is_past(*month):
+                cache.set(
+                    self.HOST,
+                    username.lower(),
+                    f"{month[0]}-{month[1]:02d}-{time_class}",
+                    body="\n\n\n".join(months.get(month, [])),
+                    complete=True,
+                )
+            month = _previous(month)
+        return pgns
+
+
+def _previous(month: tuple[int, int]) -> tuple[int, int]:
+    year, month = month
+    return (year, month - 1) if month > 1 else (year - 1, 12)
+
+
+def _next(month: tuple[int, int]) -> tuple[int, int]:
+    year, month = month
+    return (year, month + 1) if month < 12 else (year + 1, 1)
+
+
+def _timestamp(date: datetime) -> int:
+    """Milliseconds since the epoch of a UTC `date`, as used by the lichess API."""
+    return int(date.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _is_past(year: int, month: int) -> bool:
+    """The month is over, its games won't change anymore."""
+    # a day of margin for games finished after midnight
+    current = datetime.utcnow() - timedelta(days=1)
+    return (year, month) < (current.year, current.month)
+
+
+def is_standard(headers: chess.pgn.Headers, time_class: str) -> bool:
+    """Standard chess game of `time_class`, e.g. not correspondence or a variant."""
+    if headers.get("Variant", "Standard") not in ("Standard", "Chess"):
+        return False
+    try:
+        return get_time_class(chess.pgn.Game(headers)) == time_class
+    except (KeyError, ValueError):
+        return False
+
+
+COMMUNICATORS = {
+    "chess.com": ChessComCommunicator,
+    "lichess.org": LichessCommunicator,
+}
+
+
+def get_communicator(host: str) -> ApiCommunicator:
+    """
+    Like `chess_insight.get_communicator`, but games are downloaded by the shared
+    fetcher of the host and analyzed by the engine pool, so no engine is started.
+    """
+    return COMMUNICATORS[host](None)
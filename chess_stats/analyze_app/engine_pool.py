@@ -0,0 +1,140 @@
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import Logger
+from pathlib import Path
+from queue import Queue
+from threading import Lock
+
+from chess_insight import Game
+from django.conf import settings
+from easy_logs import get_logger
+from stockfish import Stockfish, StockfishException
+
+from .evaluation_cache import CachedEngine, EvaluationCache, get_evaluation_cache
+from .metrics import INGEST_SECONDS
+
+
+class EnginePool:
+    """
+    Long-lived Stockfish processes shared by every report analyzed in the process.
+    Each game is analyzed by one engine checked out from the pool, so up to `size`
+    games are analyzed in parallel. Threads are enough - they only wait for engines,
+    and qcluster workers are daemonic, so they can't start a process pool.
+    """
+
+    def __init__(
+        self,
+        engine_path: Path,
+        size: int,
+        logger: Logger = None,
+        cache: EvaluationCache = None,
+    ) -> None:
+        self.size = size
+        self.cache = cache
+        self.logger = logger or get_logger()
+        self.engine_path = engine_path
+        if not engine_path or not Path(engine_path).exists():
+            self.logger.warning(
+                f"Stockfish does not exist in {engine_path}. Games won't be evaluated."
+            )
+            self.engine_path = None
+        self._engines = Queue()
+        for _ in range(size):
+            self._engines.put(self._start_engine())
+        self._executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix="engine"
+        )
+
+    def _start_engine(self) -> Stockfish | None:
+        if not self.engine_path:
+            return None
+        return Stockfish(str(Path(self.engine_path).resolve()))
+
+    def analyze(
+        self,
+        pgns: Iterable[str],
+        username: str,
+        depth: int,
+        errors: list = None,
+        decisive_depth: int = None,
+    ) -> Iterator[Game]:
+        """
+        Yields analyzed games in order of `pgns`. At most `2 * size` games are
+        analyzed ahead of the consumer. A game failing to be analyzed raises,
+        unless `errors` is given - its exception is appended there instead.
+        Positions after a decisive evaluation are searched `decisive_depth` deep.
+        """
+        pending = deque()
+        try:
+            for pgn in pgns:
+                pending.append(
+                    self._executor.submit(
+                        self.analyze_game, pgn, username, depth, decisive_depth
+                    )
+                )
+                if len(pending) >= 2 * self.size:
+                    yield from _results(pending.popleft(), errors)
+            while pending:
+                yield from _results(pending.popleft(), errors)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def analyze_game(
+        self, pgn: str, username: str, depth: int, decisive_depth: int = None
+    ) -> Game:
+        """
+        Analyzes a game in the calling thread, waiting for an engine if all of them
+        are busy, e.g. by a stage of `Pipeline` running its own workers.
+        """
+        engine = self._engines.get()
+        try:
+            stockfish = engine
+            if engine and self.cache:
+                stockfish = CachedEngine(engine, self.cache, depth, decisive_depth)
+            elif engine:
+                engine.set_depth(depth)
+            with INGEST_SECONDS.time(stage="analysis"):
+                return Game(pgn, username, stockfish=stockfish)
+        except StockfishException as exc:
+            self.logger.error(f"Engine crashed, starting a new one: {exc}")
+            engine = self._start_engine()
+            raise exc
+        finally:
+            self._engines.put(engine)
+
+    def close(self) -> None:
+        """Stops the threads, engines quit once they are garbage collected."""
+        self._executor.shutdown(cancel_futures=True)
+        self._engines = Queue()
+
+
+def _results(future: Future, errors: list | None) -> list[Game]:
+    if errors is None:
+        return [future.result()]
+    try:
+        return [future.result()]
+    except Exception as exc:  # pylint: disable=broad-except
+        errors.append(exc)
+        return []
+
+
+_POOL = None
+_POOL_LOCK = Lock()
+
+
+def get_engine_pool() -> EnginePool:
+    """
+    Pool configured by `ENGINE_PATH` and `ENGINE_POOL_SIZE`, started on first use.
+    Its engines share the evaluation cache.
+    """
+    global _POOL  # pylint: disable=global-statement
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = EnginePool(
+                settings.ENGINE_PATH,
+                settings.ENGINE_POOL_SIZE,
+                cache=get_evaluation_cache(),
+            )
+        return _POOL
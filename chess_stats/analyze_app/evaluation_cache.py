@@ -0,0 +1,183 @@
+import json
+import os
+from collections import OrderedDict
+from logging import Logger
+from pathlib import Path
+from threading import Lock
+
+import chess
+from django.conf import settings
+from easy_logs import get_logger
+from stockfish import Stockfish
+
+
+class EvaluationCache:
+    """
+    LRU cache of engine evaluations shared by all games analyzed in the process.
+    Positions are keyed by FEN without move counters (EPD), so the same position
+    reached in different games or move orders is evaluated only once.
+    An evaluation found at some depth is also used for any shallower lookup.
+    """
+
+    def __init__(self, max_size: int, path: Path = None) -> None:
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._changed = False
+        self._entries: OrderedDict[str, tuple[int, dict]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, position: str, depth: int) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(position)
+            if entry is None or entry[0] < depth:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(position)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, position: str, depth: int, evaluation: dict) -> None:
+        with self._lock:
+            entry = self._entries.get(position)
+            if entry is None or entry[0] <= depth:
+                self._entries[position] = (depth, evaluation)
+                self._changed = True
+            self._entries.move_to_end(position)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0,
+        }
+
+    def load(self) -> None:
+        if not self.path or not Path(self.path).exists():
+            return
+        with open(self.path, encoding="utf-8") as file:
+            entries = json.load(file)
+        with self._lock:
+            for position, (depth, evaluation) in entries[-self.max_size :]:
+                self._entries[position] = (depth, evaluation)
+
+    def save(self) -> None:
+        """
+        Writes entries from least to most recently used, replacing the file atomically.
+        Nothing is written if no evaluation was added since the last save.
+        Entries saved meanwhile by other processes are kept, unless they are
+        deeper in this cache or don't fit into it.
+        """
+        if not self.path or not self._changed:
+            return
+        with self._lock:
+            ours = dict(self._entries)
+            self._changed = False
+        entries = {}
+        try:
+            if Path(self.path).exists():
+                with open(self.path, encoding="utf-8") as file:
+                    entries = {
+                        position: (depth, evaluation)
+                        for position, (depth, evaluation) in json.load(file)
+                    }
+        except (OSError, ValueError):
+            pass  # e.g. a file of an older format, it is replaced
+        for position, entry in ours.items():
+            saved = entries.pop(position, None)
+            entries[position] = (
+                entry if saved is None or saved[0] <= entry[0] else saved
+            )
+        kept = list(entries.items())[-self.max_size :]
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump([[position, list(entry)] for position, entry in kept], file)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            self._changed = True
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+
+# `chess_insight` clips evaluations to +-1000 centipawns, deeper search beyond it is lost
+DECISIVE_CENTIPAWNS = 1000
+
+
+class CachedEngine:
+    """
+    Stands in for `Stockfish` in `chess_insight.Game`. Moves are played on a local
+    board and the engine is asked only for positions missing in the cache.
+    Positions after a decisive evaluation are searched only `decisive_depth` deep.
+    """
+
+    def __init__(
+        self,
+        engine: Stockfish,
+        cache: EvaluationCache,
+        depth: int,
+        decisive_depth: int = None,
+    ) -> None:
+        self.engine = engine
+        self.cache = cache
+        self.depth = depth
+        self.decisive_depth = decisive_depth
+        self.decisive = False
+        self.board = chess.Board()
+
+    def set_position(self, moves: list[str] = None) -> None:
+        self.board = chess.Board()
+        self.decisive = False
+        self.make_moves_from_current_position(moves)
+
+    def make_moves_from_current_position(self, moves: list[str] | None) -> None:
+        for move in moves or []:
+            self.board.push_uci(move)
+
+    def get_evaluation(self) -> dict:
+        depth = self.depth
+        if self.decisive and self.decisive_depth:
+            depth = min(depth, self.decisive_depth)
+        position = self.board.epd()
+        evaluation = self.cache.get(position, depth)
+        if evaluation is None:
+            self.engine.set_depth(depth)
+            # no `ucinewgame` - consecutive positions share the engine's hash table
+            self.engine.set_fen_position(self.board.fen(), False)
+            evaluation = self.engine.get_evaluation()
+            self.cache.set(position, depth, evaluation)
+        self.decisive = (
+            evaluation["type"] == "mate"
+            or abs(evaluation["value"]) >= DECISIVE_CENTIPAWNS
+        )
+        return evaluation
+
+
+_CACHE = None
+_CACHE_LOCK = Lock()
+
+
+def get_evaluation_cache(logger: Logger = None) -> EvaluationCache:
+    """
+    Cache configured by `EVALUATION_CACHE_SIZE` and `EVALUATION_CACHE_PATH`,
+    loaded from the file on first use.
+    """
+    global _CACHE  # pylint: disable=global-statement
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = EvaluationCache(
+                settings.EVALUATION_CACHE_SIZE, settings.EVALUATION_CACHE_PATH
+            )
+            try:
+                _CACHE.load()
+            except (OSError, ValueError) as exc:
+                (logger or get_logger()).error(f"Failed to load evaluations: {exc}")
+        return _CACHE
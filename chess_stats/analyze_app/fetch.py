@@ -0,0 +1,152 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from threading import Lock, Semaphore
+from time import monotonic, sleep
+from typing import Callable, Iterable, Iterator
+
+import httpx
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .metrics import FETCH_REQUESTS
+
+try:
+    import h2  # noqa: F401 pylint: disable=unused-import
+
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+# responses retried after a backoff, other errors are raised right away
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class HostFetcher:
+    """
+    Client of a host API shared by every fetch of the process. Connections are
+    pooled and kept alive (HTTP/2 if `h2` is installed), at most `concurrency`
+    requests run at once. When the host answers `429 Too Many Requests`, all
+    requests to it wait as long as its `Retry-After` asks.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        base_url: str,
+        concurrency: int = 1,
+        retries: int = 5,
+        timeout: float = 30,
+        backoff: float = 1,
+    ) -> None:
+        self.host = host
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.client = httpx.Client(
+            base_url=base_url,
+            http2=HTTP2,
+            timeout=timeout,
+            follow_redirects=True,
+            headers={"User-Agent": settings.FETCH_USER_AGENT},
+            limits=httpx.Limits(
+                max_connections=concurrency, max_keepalive_connections=concurrency
+            ),
+        )
+        self._slots = Semaphore(concurrency)
+        self._lock = Lock()
+        self._resume_at = 0.0
+
+    def get(self, path: str, **kwargs) -> httpx.Response:
+        """
+        Successful or `304 Not Modified` response of `GET path`. Rate limited and
+        unavailable responses are retried `retries` times, errors raise
+        `httpx.HTTPStatusError`.
+        """
+        for attempt in range(self.retries + 1):
+            self._wait()
+            with self._slots:
+                response = self.client.get(path, **kwargs)
+            FETCH_REQUESTS.inc(host=self.host, status=response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                break
+            self._pause(_retry_after(response) or self.backoff * 2**attempt)
+        if response.status_code == 304:
+            return response
+        return response.raise_for_status()
+
+    def map(self, function: Callable, items: Iterable) -> Iterator:
+        """
+        Results of `function` for each of `items`, in their order. Up to
+        `concurrency` items are fetched ahead of the consumer, so it can stop early.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = []
+            try:
+                for item in items:
+                    pending.append(executor.submit(function, item))
+                    if len(pending) >= self.concurrency:
+                        yield pending.pop(0).result()
+                while pending:
+                    yield pending.pop(0).result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def close(self) -> None:
+        self.client.close()
+
+    def _wait(self) -> None:
+        while (delay := self._resume_at - monotonic()) > 0:
+            sleep(delay)
+
+    def _pause(self, seconds: float) -> None:
+        with self._lock:
+            self._resume_at = max(self._resume_at, monotonic() + seconds)
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    """Seconds from `Retry-After`, sent either as seconds or as a date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+_FETCHERS: dict[str, HostFetcher] = {}
+_FETCHERS_LOCK = Lock()
+
+
+def get_fetcher(host: str) -> HostFetcher:
+    """Fetcher of `host` configured by `HOST_APIS`, created on first use."""
+    with _FETCHERS_LOCK:
+        if host not in _FETCHERS:
+            _FETCHERS[host] = HostFetcher(
+                host,
+                retries=settings.FETCH_RETRIES,
+                timeout=settings.FETCH_TIMEOUT,
+                **settings.HOST_APIS[host],
+            )
+        return _FETCHERS[host]
+
+
+def close_fetchers() -> None:
+    with _FETCHERS_LOCK:
+        for fetcher in _FETCHERS.values():
+            fetcher.close()
+        _FETCHERS.clear()
+
+
+@receiver(setting_changed)
+def _reset_fetchers(setting: str, **kwargs) -> None:
+    if setting in ("HOST_APIS", "FETCH_RETRIES", "FETCH_TIMEOUT", "FETCH_USER_AGENT"):
+        close_fetchers()
@@ -31,6 +31,18 @@ class ReportForm(forms.ModelForm):
         initial=False,
     )
     engine_depth = forms.IntegerField(initial=5)
+    analysis_minutes = forms.IntegerField(
+        initial=30,
+        min_value=1,
+        required=False,
+        help_text="time the engine may analyze your games, "
+        "engine depth is lowered for the rest of games if it's too short",
+    )
+    games_file = forms.FileField(
+        required=False,
+        help_text="optional PGN file or lichess NDJSON export of your games, "
+        "analyzed instead of downloading games (username above identifies you)",
+    )
 
     class Meta:
         model = Report
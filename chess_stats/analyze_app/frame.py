@@ -0,0 +1,124 @@
+from string import ascii_lowercase, ascii_uppercase
+
+import numpy as np
+
+from .models import MISTAKES, PHASES
+from .models import ChessGame as Game
+from .models import Report
+
+# SQLite `LIKE` (used by `__contains`) only folds the case of ASCII letters.
+_ASCII_FOLD = str.maketrans(ascii_uppercase, ascii_lowercase)
+
+
+class GamesFrame:
+    """
+    Games of a report (with their players) loaded by a single query into numpy columns.
+    Rows are ordered by game id - the order in which the ORM iterates the games.
+    Hosts are numbered in order of their first game, same as `SELECT DISTINCT host`.
+    """
+
+    COLUMNS = (
+        "id",
+        "host",
+        "date",
+        "opening",
+        "opening_short",
+        "player_color",
+        "result",
+        "end_reason",
+        "player__elo",
+        "opponent__elo",
+        "evaluated",
+        *(f"player__{phase}_{kind}" for phase in PHASES for kind in MISTAKES),
+        *(f"player__{phase}_move_time" for phase in PHASES),
+        *(f"opponent__{phase}_move_time" for phase in PHASES),
+    )
+
+    def __init__(self, rows: list[tuple]) -> None:
+        columns = dict(zip(self.COLUMNS, list(zip(*rows)) or [()] * len(self.COLUMNS)))
+        self.size = len(rows)
+        self.id = np.array(columns["id"], dtype=np.int64)
+        self.host = np.array(columns["host"], dtype=str)
+        self.date = np.array(columns["date"], dtype="datetime64[us]")
+        self.opening = np.array(columns["opening"], dtype=str)
+        self.opening_short = np.array(columns["opening_short"], dtype=str)
+        self._opening_folded = None
+        self.player_color = np.array(columns["player_color"], dtype=str)
+        self.result = np.array(columns["result"], dtype=str)
+        self.end_reason = np.array(columns["end_reason"], dtype=str)
+        self.player_elo = np.array(columns["player__elo"], dtype=np.int64)
+        self.opponent_elo = np.array(columns["opponent__elo"], dtype=np.int64)
+        self.evaluated = np.array(columns["evaluated"], dtype=bool)
+        # shape (games, phase, mistake type)
+        self.evaluation = self._stack(
+            columns, [f"player__{p}_{k}" for p in PHASES for k in MISTAKES]
+        ).reshape(self.size, len(PHASES), len(MISTAKES))
+        # shape (games, phase), NaN where the phase is missing
+        self.player_move_time = self._stack(
+            columns, [f"player__{phase}_move_time" for phase in PHASES]
+        )
+        self.opponent_move_time = self._stack(
+            columns, [f"opponent__{phase}_move_time" for phase in PHASES]
+        )
+
+        hosts, first_index, codes = np.unique(
+            self.host, return_index=True, return_inverse=True
+        )
+        order = np.argsort(first_index, kind="stable")
+        self.hosts = [str(host) for host in hosts[order]]
+        self.host_codes = np.argsort(order)[codes.reshape(-1)]
+
+    @classmethod
+    def from_report(cls, report: Report) -> "GamesFrame":
+        rows = (
+            Game.objects.filter(reports=report).order_by("id").values_list(*cls.COLUMNS)
+        )
+        return cls(list(rows))
+
+    def _stack(self, columns: dict[str, tuple], names: list[str]) -> np.ndarray:
+        """Float columns side by side, `None` becomes NaN."""
+        return np.array([columns[name] for name in names], dtype=np.float64).T.reshape(
+            self.size, len(names)
+        )
+
+    @property
+    def host_keys(self) -> list[str]:
+        """Names used as keys in `QueriesMaker.asdict` - host with `_` instead of `.`"""
+        return [host.replace(".", "_") for host in self.hosts] + ["total"]
+
+    def partitions(self):
+        """Yields `(host_key, mask)` for each host and then for all games."""
+        for code, key in enumerate(self.host_keys[:-1]):
+            yield key, self.host_codes == code
+        yield "total", np.ones(self.size, dtype=bool)
+
+    def group_count(self, mask: np.ndarray = None) -> dict[str, int]:
+        """Number of rows matching `mask` per host and in total."""
+        codes = self.host_codes if mask is None else self.host_codes[mask]
+        counts = np.bincount(codes, minlength=len(self.hosts))
+        return self._per_key(counts.tolist(), int(counts.sum()))
+
+    def group_sum(
+        self, values: np.ndarray, mask: np.ndarray = None
+    ) -> dict[str, float]:
+        """
+        Sum of `values` matching `mask` per host and in total.
+        Values are accumulated one by one in row order, so floats are rounded exactly
+        like in a python loop over the queryset.
+        """
+        if mask is not None:
+            values = values[mask]
+        codes = self.host_codes if mask is None else self.host_codes[mask]
+        sums = np.zeros(len(self.hosts) + 1)
+        np.add.at(sums, codes, values)
+        np.add.at(sums, np.full(len(values), len(self.hosts)), values)
+        return self._per_key(sums[:-1].tolist(), float(sums[-1]))
+
+    def _per_key(self, per_host: list, total) -> dict:
+        return dict(zip(self.host_keys, per_host + [total]))
+
+    def opening_contains(self, value: str) -> np.ndarray:
+        """Equivalent of `opening__contains=value` on SQLite (ASCII case insensitive)."""
+        if self._opening_folded is None:
+            self._opening_folded = np.char.translate(self.opening, _ASCII_FOLD)
+        return np.char.find(self._opening_folded, value.translate(_ASCII_FOLD)) >= 0
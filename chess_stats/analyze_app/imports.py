@@ -0,0 +1,131 @@
+import io
+import json
+from datetime import datetime, timezone
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import chess
+import chess.pgn
+
+from .communicators import is_standard
+
+# lichess statuses as worded in `Termination` of PGNs of chess.com
+TERMINATIONS = {
+    "mate": "won by checkmate",
+    "resign": "won by resignation",
+    "outoftime": "won on time",
+    "timeout": "won - game abandoned",
+    "stalemate": "drawn by stalemate",
+    "draw": "drawn by agreement",
+}
+
+
+def read_pgns(path: Path) -> Iterator[str]:
+    """
+    PGNs of games in a PGN file or a lichess NDJSON export, read line by line,
+    so files of any size are read in constant memory.
+    """
+    with open(path, encoding="utf-8-sig") as file:
+        first = file.read(1)
+        while first.isspace():
+            first = file.read(1)
+        file.seek(0)
+        if first == "{":
+            yield from iter_ndjson_pgns(file)
+        else:
+            yield from iter_pgns(file)
+
+
+def iter_pgns(lines: Iterable[str]) -> Iterator[str]:
+    """Games of a PGN file, a game ends when headers of the next one start."""
+    game, in_moves = [], False
+    for line in lines:
+        if line.startswith("[") and in_moves:
+            yield "".join(game).strip() + "\n"
+            game, in_moves = [], False
+        if line.strip() and not line.startswith("["):
+            in_moves = True
+        game.append(line)
+    if "".join(game).strip():
+        yield "".join(game).strip() + "\n"
+
+
+def iter_ndjson_pgns(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Games of a lichess NDJSON export. Exports with `pgnInJson` carry PGNs, others
+    are converted with `lichess_json_pgn`, games failing to convert are skipped.
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            game = json.loads(line)
+            pgn = game["pgn"] if "pgn" in game else lichess_json_pgn(game)
+        except (KeyError, ValueError):
+            continue  # e.g. a game without clocks
+        yield pgn
+
+
+def lichess_json_pgn(game: dict) -> str:
+    """
+    PGN of a game exported by lichess as JSON. Clocks are needed to analyze move
+    times, so games exported without `clocks` raise `ValueError`.
+    """
+    if "clocks" not in game or "clock" not in game:
+        raise ValueError(f"Game {game.get('id')} was exported without clocks")
+    pgn = chess.pgn.Game()
+    node = pgn
+    for move, clock in zip(game["moves"].split(), game["clocks"]):
+        node = node.add_variation(node.board().parse_san(move))
+        node.set_clock(clock / 100)
+    date = datetime.fromtimestamp(game["createdAt"] / 1000, timezone.utc)
+    players = {
+        color: game["players"][color].get("user", {}).get("name", "Anonymous")
+        for color in ("white", "black")
+    }
+    result = {"white": "1-0", "black": "0-1"}.get(game.get("winner"), "1/2-1/2")
+    termination = TERMINATIONS.get(game["status"], game["status"])
+    if result != "1/2-1/2":
+        termination = f"{players[game['winner']]} {termination}"
+    pgn.headers.update(
+        {
+            "Event": f"Rated {game['speed']} game",
+            "Site": f"https://lichess.org/{game['id']}",
+            "Date": date.strftime("%Y.%m.%d"),
+            "White": players["white"],
+            "Black": players["black"],
+            "Result": result,
+            "UTCDate": date.strftime("%Y.%m.%d"),
+            "UTCTime": date.strftime("%H:%M:%S"),
+            "WhiteElo": str(game["players"]["white"].get("rating", "?")),
+            "BlackElo": str(game["players"]["black"].get("rating", "?")),
+            "TimeControl": f"{game['clock']['initial']}+{game['clock']['increment']}",
+            "Termination": termination,
+        }
+    )
+    if game.get("variant", "standard") != "standard":
+        pgn.headers["Variant"] = game["variant"]
+    return str(pgn)
+
+
+def matching_pgns(
+    pgns: Iterable[str], time_class: str, limit: int = None
+) -> Iterator[str]:
+    """
+    Standard games of `time_class`, up to `limit` of them. Games with broken
+    headers are skipped.
+    """
+    matching = (
+        pgn
+        for pgn in pgns
+        if (headers := chess.pgn.read_headers(io.StringIO(pgn)))
+        and is_standard(headers, time_class)
+    )
+    return islice(matching, limit)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,70 @@
+import json
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from easy_logs import get_logger
+
+from analyze_app.benchmarks.pgn import synthetic_pgns
+from analyze_app.engine_pool import EnginePool
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure games analyzed per second by engine pools of different sizes. "
+        "Speedup should be close to the pool size as long as there are free cores."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--engine", default=settings.ENGINE_PATH)
+        parser.add_argument(
+            "--sizes", nargs="+", type=int, default=[1, 2, 4, settings.ENGINE_POOL_SIZE]
+        )
+        parser.add_argument("--games", type=int, default=16)
+        parser.add_argument("--plies", type=int, default=40)
+        parser.add_argument("--depth", type=int, default=8)
+        parser.add_argument(
+            "--json", action="store_true", help="Print results as JSON."
+        )
+
+    def handle(self, *args, **options):
+        logger = get_logger(lvl=30)
+        pgns = synthetic_pgns(
+            "benchmark", count=options["games"], plies=options["plies"]
+        )
+        results = []
+        for size in sorted(set(options["sizes"])):
+            pool = EnginePool(options["engine"], size, logger)
+            try:
+                start = perf_counter()
+                for _ in pool.analyze(pgns, "benchmark", options["depth"]):
+                    pass
+                elapsed = perf_counter() - start
+            finally:
+                pool.close()
+            games_per_second = len(pgns) / elapsed
+            speedup = (
+                games_per_second / results[0]["games_per_second"] if results else 1
+            )
+            results.append(
+                {
+                    "size": size,
+                    "seconds": round(elapsed, 3),
+                    "games_per_second": round(games_per_second, 3),
+                    "speedup": round(speedup, 2),
+                    "efficiency": round(speedup / (size / results[0]["size"]), 2)
+                    if results
+                    else 1,
+                }
+            )
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"{'engines':>8} {'seconds':>8} {'games/s':>8} {'speedup':>8}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['size']:>8} {result['seconds']:>8} "
+                f"{result['games_per_second']:>8} {result['speedup']:>8}"
+            )
@@ -0,0 +1,86 @@
+import json
+import platform
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from easy_logs import get_logger
+
+from analyze_app.benchmarks.reports import synthetic_report
+from analyze_app.benchmarks.statistics import benchmark_statistics, compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure time, SQL queries and memory of every statistic of synthetic "
+        "reports. Generated games are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--games",
+            nargs="+",
+            type=int,
+            default=[1_000, 10_000],
+            help="Sizes of reports, e.g. 1000 10000 100000 1000000.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--output", help="Write results as JSON to this file.")
+        parser.add_argument(
+            "--baseline", help="JSON results of an earlier run to compare with."
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Relative slowdown against the baseline reported as regression.",
+        )
+        parser.add_argument(
+            "--noise",
+            type=float,
+            default=0.01,
+            help="Slowdown in seconds ignored as noise.",
+        )
+
+    def handle(self, *args, **options):
+        logger = get_logger(lvl=50)
+        results = {}
+        for games in options["games"]:
+            with transaction.atomic():
+                report = synthetic_report(games, seed=options["seed"])
+                results[str(games)] = benchmark_statistics(
+                    report, logger, options["repeat"]
+                )
+                transaction.set_rollback(True)
+            self._print(games, results[str(games)])
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(
+                    {
+                        "python": platform.python_version(),
+                        "sqlite": sqlite3.sqlite_version,
+                        "results": results,
+                    },
+                    file,
+                    indent=2,
+                )
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)["results"]
+            regressions = compare(
+                results, baseline, options["threshold"], options["noise"]
+            )
+            if regressions:
+                raise CommandError("Regressions:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions"))
+
+    def _print(self, games: int, results: dict):
+        self.stdout.write(f"{games} games")
+        self.stdout.write(f"{'':40} {'seconds':>8} {'queries':>8} {'peak KiB':>10}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:40} {result['seconds']:>8} {result['queries']:>8} "
+                f"{result['peak_kib']:>10}"
+            )
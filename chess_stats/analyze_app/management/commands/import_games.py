@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from easy_logs import get_logger
+
+from analyze_app.models import Report
+from analyze_app.tasks import import_games
+
+
+class Command(BaseCommand):
+    help = (
+        "Import games from a PGN file or a lichess NDJSON export into a new or an "
+        "existing report. The file is streamed, so it may be of any size. Games are "
+        "evaluated by qcluster workers afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="PGN or NDJSON file with games.")
+        parser.add_argument(
+            "--username", required=True, help="Player whose games are imported."
+        )
+        parser.add_argument(
+            "--report", type=int, help="Report to add games to. Default: a new one."
+        )
+        parser.add_argument(
+            "--time-class",
+            default="blitz",
+            choices=["rapid", "blitz", "bullet"],
+            help="Time class of a new report, games of others are skipped.",
+        )
+        parser.add_argument(
+            "--engine-depth", type=int, default=5, help="Engine depth of a new report."
+        )
+        parser.add_argument(
+            "--limit", type=int, help="Import at most this many games. Default: all."
+        )
+
+    def handle(self, *args, **options):
+        logger = get_logger(lvl=30)
+        if options["report"]:
+            try:
+                report = Report.objects.get(pk=options["report"])
+            except Report.DoesNotExist as exc:
+                raise CommandError(f"Report {options['report']} doesn't exist") from exc
+        else:
+            report = Report.objects.create(
+                chess_com_username="",
+                lichess_username="",
+                time_class=options["time_class"],
+                games_num=0,
+                engine_depth=options["engine_depth"],
+            )
+        try:
+            import_games(
+                report, options["path"], options["username"], logger, options["limit"]
+            )
+        except OSError as exc:
+            raise CommandError(f"Failed to read {options['path']}: {exc}") from exc
+        report.refresh_from_db()
+        if report.analyzed_games < 0:
+            raise CommandError(f"Report {report.pk} failed: {report.fail_reason}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report.analyzed_games} games into report {report.pk}"
+            )
+        )
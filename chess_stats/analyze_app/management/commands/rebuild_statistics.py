@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from easy_logs import get_logger
+
+from analyze_app.models import Report
+from analyze_app.queries import STATISTICS_VERSION, save_report_statistics
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute stored statistics of complete reports. "
+        "By default only missing or outdated statistics are rebuilt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "ids", nargs="*", type=int, help="Reports to rebuild. Default: all."
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild also statistics that are up to date.",
+        )
+
+    def handle(self, *args, **options):
+        logger = get_logger(lvl=30)
+        reports = Report.objects.filter(
+            analyzed_games__gt=0, analyzed_games__gte=F("games_num")
+        )
+        if options["ids"]:
+            reports = reports.filter(id__in=options["ids"])
+        if not options["force"]:
+            reports = reports.filter(
+                Q(statistics__isnull=True)
+                | ~Q(statistics__version=STATISTICS_VERSION)
+                | ~Q(statistics__analyzed_games=F("analyzed_games"))
+            )
+        rebuilt = 0
+        for report in reports.iterator():
+            save_report_statistics(report, logger)
+            rebuilt += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt statistics of {rebuilt} reports (version {STATISTICS_VERSION})"
+            )
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django_q.tasks import async_task
+
+from analyze_app.models import Report
+from analyze_app.tasks import resume_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Enqueue ingestion of reports interrupted e.g. while qcluster was down, "
+        "it continues after the games already analyzed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "ids",
+            nargs="*",
+            type=int,
+            help="Reports to resume, also failed ones. Default: all unfinished.",
+        )
+
+    def handle(self, *args, **options):
+        if options["ids"]:
+            reports = Report.objects.filter(id__in=options["ids"])
+        else:
+            reports = Report.objects.filter(
+                Q(chunks__isnull=False)
+                | Q(analyzed_games__gte=0, analyzed_games__lt=F("games_num"))
+            ).distinct()
+        resumed = 0
+        for report in reports.iterator():
+            async_task(resume_report, report)
+            resumed += 1
+        self.stdout.write(self.style.SUCCESS(f"Resumed {resumed} reports"))
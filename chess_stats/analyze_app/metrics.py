@@ -0,0 +1,280 @@
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from math import inf
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+
+SECONDS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNTS = (1, 2, 5, 10, 20, 50, 100, 500, 1_000, 10_000, 100_000, 1_000_000)
+
+
+class Metric:
+    """
+    Metric of the process in Prometheus text format. Samples are kept per values
+    of `labels` as lists of numbers, so samples of processes can be summed up.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.samples: dict[tuple, list] = {}
+        self._lock = Lock()
+        REGISTRY[name] = self
+
+    def _sample(self, labels: dict) -> list:
+        key = tuple(str(labels[label]) for label in self.labels)
+        if key not in self.samples:
+            self.samples[key] = self._empty()
+        return self.samples[key]
+
+    def _empty(self) -> list:
+        raise NotImplementedError
+
+    def _lines(self, labels: str, values: list) -> list[str]:
+        raise NotImplementedError
+
+    def render(self, samples: dict[tuple, list]) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for key, values in sorted(samples.items()):
+            labels = ",".join(
+                f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key)
+            )
+            lines += self._lines(labels, values)
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, value: float = 1, **labels) -> None:
+        with self._lock:
+            self._sample(labels)[0] += value
+
+    def _empty(self) -> list:
+        return [0]
+
+    def _lines(self, labels: str, values: list) -> list[str]:
+        return [f"{self.name}{_braces(labels)} {_number(values[0])}"]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: tuple = (), buckets=SECONDS
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = (*buckets, inf)
+
+    def observe(self, value: float, count: int = 1, **labels) -> None:
+        """Observes `value` `count` times, e.g. for each game of a batch."""
+        bucket = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            sample = self._sample(labels)
+            sample[bucket] += count
+            sample[-2] += value * count
+            sample[-1] += count
+
+    @contextmanager
+    def time(self, **labels):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, **labels)
+
+    def _empty(self) -> list:
+        # counts per bucket, sum and count
+        return [0] * len(self.buckets) + [0, 0]
+
+    def _lines(self, labels: str, values: list) -> list[str]:
+        separator = "," if labels else ""
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, values):
+            cumulative += count
+            le = "+Inf" if bound == inf else _number(bound)
+            lines.append(
+                f'{self.name}_bucket{{{labels}{separator}le="{le}"}} {cumulative}'
+            )
+        lines.append(f"{self.name}_sum{_braces(labels)} {_number(values[-2])}")
+        lines.append(f"{self.name}_count{_braces(labels)} {values[-1]}")
+        return lines
+
+
+REGISTRY: dict[str, Metric] = {}
+
+STATISTIC_SECONDS = Histogram(
+    "chess_stats_statistic_seconds",
+    "Time to compute a statistic for games of a host.",
+    ("statistic", "host"),
+)
+STATISTIC_QUERIES = Histogram(
+    "chess_stats_statistic_queries",
+    "SQL queries run to compute a statistic for games of a host.",
+    ("statistic", "host"),
+    COUNTS,
+)
+STATISTIC_ROWS = Histogram(
+    "chess_stats_statistic_rows",
+    "Rows fetched and iterated in Python to compute a statistic for games of a "
+    "host, `frame` counts games loaded for all statistics of a report at once.",
+    ("statistic", "host"),
+    COUNTS,
+)
+INGEST_SECONDS = Histogram(
+    "chess_stats_ingest_seconds",
+    "Time of an ingestion stage - fetching games of a host, reading a game "
+    "without the engine, analyzing and writing a single game.",
+    ("stage",),
+)
+FETCH_REQUESTS = Counter(
+    "chess_stats_fetch_requests_total",
+    "Requests to host APIs by status of their responses, retries included.",
+    ("host", "status"),
+)
+INGESTED_GAMES = Counter(
+    "chess_stats_ingested_games_total",
+    "Games added to reports, either analyzed or reused from other reports.",
+    ("host", "source"),
+)
+PIPELINE_ITEMS = Counter(
+    "chess_stats_pipeline_items_total",
+    "Items processed by a stage of the ingestion pipeline, e.g. games fetched.",
+    ("stage",),
+)
+PIPELINE_SECONDS = Counter(
+    "chess_stats_pipeline_busy_seconds_total",
+    "Time stages of the ingestion pipeline spent on items, summed over their "
+    "workers. Divided into items, it shows the slowest stage.",
+    ("stage",),
+)
+
+
+# rows counted by `count_rows` for the statistic measured in the current context
+_ROWS = ContextVar("statistic_rows", default=None)
+
+
+@contextmanager
+def measure_statistic(statistic: str, host: str):
+    """Observes time, SQL queries and rows iterated of computing `statistic`."""
+    queries, rows = [0], [0]
+
+    def count(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    token = _ROWS.set(rows)
+    try:
+        with connection.execute_wrapper(count), STATISTIC_SECONDS.time(
+            statistic=statistic, host=host
+        ):
+            yield
+    finally:
+        _ROWS.reset(token)
+    STATISTIC_QUERIES.observe(queries[0], statistic=statistic, host=host)
+    STATISTIC_ROWS.observe(rows[0], statistic=statistic, host=host)
+
+
+def count_rows(rows: int) -> None:
+    """Counts `rows` iterated in Python by the statistic measured right now."""
+    counter = _ROWS.get()
+    if counter is not None:
+        counter[0] += rows
+
+
+def save_metrics() -> None:
+    """
+    Writes metrics of the process to `METRICS_DIR`, so `/metrics` of the web server
+    also shows metrics of qcluster workers. The file is replaced atomically.
+    """
+    if not settings.METRICS_DIR:
+        return
+    Path(settings.METRICS_DIR).mkdir(parents=True, exist_ok=True)
+    path = Path(settings.METRICS_DIR) / f"{os.getpid()}.json"
+    data = {}
+    for name, metric in REGISTRY.items():
+        with metric._lock:
+            data[name] = [[list(key), values] for key, values in metric.samples.items()]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
+
+
+def render_metrics() -> str:
+    """
+    Metrics of the process summed with metrics saved by other processes.
+    Files of processes which ended are removed, their counters would be summed
+    up forever otherwise.
+    """
+    samples = {name: {} for name in REGISTRY}
+    paths = []
+    if settings.METRICS_DIR and Path(settings.METRICS_DIR).exists():
+        paths = [
+            path
+            for path in Path(settings.METRICS_DIR).glob("*.json")
+            if path.stem != str(os.getpid())
+        ]
+    for path in paths:
+        if path.stem.isdigit() and not _is_running(int(path.stem)):
+            path.unlink(missing_ok=True)
+            continue
+        try:
+            with open(path, encoding="utf-8") as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, entries in saved.items():
+            if name in samples:
+                for key, values in entries:
+                    _add(samples[name], tuple(key), values)
+    for name, metric in REGISTRY.items():
+        with metric._lock:
+            for key, values in metric.samples.items():
+                _add(samples[name], key, values)
+    return (
+        "\n".join(metric.render(samples[name]) for name, metric in REGISTRY.items())
+        + "\n"
+    )
+
+
+def _is_running(pid: int) -> bool:
+    """A process `pid` runs on this host, `METRICS_DIR` is shared by its processes."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # it runs as another user
+        return True
+    return True
+
+
+def _add(samples: dict, key: tuple, values: list) -> None:
+    if key not in samples:
+        samples[key] = [0] * len(values)
+    samples[key] = [a + b for a, b in zip(samples[key], values)]
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _braces(labels: str) -> str:
+    return f"{{{labels}}}" if labels else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
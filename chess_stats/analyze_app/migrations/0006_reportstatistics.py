@@ -0,0 +1,48 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:40
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analyze_app", "0005_alter_report_professional"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportStatistics",
+            fields=[
+                (
+                    "report",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="statistics",
+                        serialize=False,
+                        to="analyze_app.report",
+                    ),
+                ),
+                (
+                    "analyzed_games",
+                    models.IntegerField(
+                        help_text="Number of analyzed games the statistics were computed for."
+                    ),
+                ),
+                (
+                    "version",
+                    models.IntegerField(
+                        help_text="`STATISTICS_VERSION` the statistics were computed with."
+                    ),
+                ),
+                (
+                    "data",
+                    models.JSONField(
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        help_text="Output of `QueriesMaker.asdict`.",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,149 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+CHUNK_SIZE = 500
+
+
+def share_games(apps, schema_editor):
+    """
+    Links games to their reports and keeps one game per url, username and depth.
+    Duplicates are deleted together with their players.
+    """
+    ChessGame = apps.get_model("analyze_app", "ChessGame")
+    ReportGame = apps.get_model("analyze_app", "ReportGame")
+    SingleGamePlayer = apps.get_model("analyze_app", "SingleGamePlayer")
+    Report = apps.get_model("analyze_app", "Report")
+
+    ChessGame.objects.filter(report__isnull=False).update(
+        engine_depth=models.Subquery(
+            Report.objects.filter(pk=models.OuterRef("report_id")).values(
+                "engine_depth"
+            )
+        )
+    )
+    kept, duplicates, memberships = {}, [], {}
+    rows = ChessGame.objects.order_by("id").values_list(
+        "id", "report_id", "url", "username", "engine_depth"
+    )
+    for game_id, report_id, *key in rows.iterator():
+        kept_id = kept.setdefault(tuple(key), game_id)
+        if kept_id != game_id:
+            duplicates.append(game_id)
+        if report_id is not None:
+            memberships[(report_id, kept_id)] = None
+    ReportGame.objects.bulk_create(
+        [
+            ReportGame(report_id=report_id, game_id=game_id)
+            for report_id, game_id in memberships
+        ],
+        batch_size=CHUNK_SIZE,
+    )
+    for start in range(0, len(duplicates), CHUNK_SIZE):
+        players = ChessGame.objects.filter(
+            id__in=duplicates[start : start + CHUNK_SIZE]
+        ).values_list("player_id", "opponent_id")
+        # games are deleted with their players
+        SingleGamePlayer.objects.filter(
+            id__in=[player_id for pair in players for player_id in pair]
+        ).delete()
+
+
+def unshare_games(apps, schema_editor):
+    """
+    Games stay with the first of their reports and are copied, together with
+    their players, for each other report sharing them.
+    """
+    ChessGame = apps.get_model("analyze_app", "ChessGame")
+    ReportGame = apps.get_model("analyze_app", "ReportGame")
+    memberships = ReportGame.objects.order_by("game_id", "id").values_list(
+        "game_id", "report_id"
+    )
+    previous = None
+    for game_id, report_id in memberships.iterator():
+        if game_id != previous:
+            ChessGame.objects.filter(pk=game_id).update(report_id=report_id)
+            previous = game_id
+            continue
+        game = ChessGame.objects.select_related("player", "opponent").get(pk=game_id)
+        game.player_id = _copy(game.player)
+        game.opponent_id = _copy(game.opponent)
+        game.pk = None
+        game.report_id = report_id
+        game.save()
+
+
+def _copy(instance: models.Model) -> int:
+    instance.pk = None
+    instance.save()
+    return instance.pk
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analyze_app", "0006_reportstatistics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chessgame",
+            name="engine_depth",
+            field=models.IntegerField(
+                default=10, help_text="Depth the game was analyzed with."
+            ),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name="ReportGame",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "game",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="analyze_app.chessgame",
+                    ),
+                ),
+                (
+                    "report",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="analyze_app.report",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(share_games, unshare_games),
+        migrations.RemoveField(
+            model_name="chessgame",
+            name="report",
+        ),
+        migrations.AddField(
+            model_name="chessgame",
+            name="reports",
+            field=models.ManyToManyField(
+                related_name="games",
+                through="analyze_app.ReportGame",
+                to="analyze_app.report",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="reportgame",
+            constraint=models.UniqueConstraint(
+                fields=("report", "game"), name="unique_report_game"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="chessgame",
+            constraint=models.UniqueConstraint(
+                fields=("url", "username", "engine_depth"), name="unique_game_analysis"
+            ),
+        ),
+    ]
@@ -0,0 +1,162 @@
+# Generated by Django 4.2.5 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+PHASES = ("opening", "middle_game", "end_game")
+MISTAKES = ("inaccuracy", "mistake", "blunder")
+COLUMNS = [f"{phase}_{kind}" for phase in PHASES for kind in MISTAKES] + [
+    f"{phase}_move_time" for phase in PHASES
+]
+BATCH_SIZE = 1000
+
+
+def fill_phase_columns(apps, schema_editor):
+    SingleGamePlayer = apps.get_model("analyze_app", "SingleGamePlayer")
+    batch = []
+    for player in SingleGamePlayer.objects.order_by("id").iterator(BATCH_SIZE):
+        for phase in PHASES:
+            for kind in MISTAKES:
+                setattr(player, f"{phase}_{kind}", player.evaluation[phase][kind])
+            setattr(player, f"{phase}_move_time", player.avg_move_time.get(phase))
+        batch.append(player)
+        if len(batch) >= BATCH_SIZE:
+            SingleGamePlayer.objects.bulk_update(batch, COLUMNS)
+            batch = []
+    SingleGamePlayer.objects.bulk_update(batch, COLUMNS)
+
+
+def fill_json_fields(apps, schema_editor):
+    SingleGamePlayer = apps.get_model("analyze_app", "SingleGamePlayer")
+    batch = []
+    for player in SingleGamePlayer.objects.order_by("id").iterator(BATCH_SIZE):
+        player.evaluation = {
+            phase: {kind: getattr(player, f"{phase}_{kind}") for kind in MISTAKES}
+            for phase in PHASES
+        }
+        player.avg_move_time = {
+            phase: getattr(player, f"{phase}_move_time")
+            for phase in PHASES
+            if getattr(player, f"{phase}_move_time") is not None
+        }
+        batch.append(player)
+        if len(batch) >= BATCH_SIZE:
+            SingleGamePlayer.objects.bulk_update(batch, ["evaluation", "avg_move_time"])
+            batch = []
+    SingleGamePlayer.objects.bulk_update(batch, ["evaluation", "avg_move_time"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analyze_app", "0007_shared_games"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="end_game_blunder",
+            field=models.IntegerField(
+                default=0, help_text="Number of blunders in the end game."
+            ),
+        ),
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="end_game_inaccuracy",
+            field=models.IntegerField(
+                default=0, help_text="Number of inaccuracies in the end game."
+            ),
+        ),
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="end_game_mistake",
+            field=models.IntegerField(
+                default=0, help_text="Number of mistakes in the end game."
+            ),
+        ),
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="end_game_move_time",
+            field=models.FloatField(
+                help_text="Average move time in the end game, if reached.", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="middle_game_blunder",
+            field=models.IntegerField(
+                default=0, help_text="Number of blunders in the middle game."
+            ),
+        ),
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="middle_game_inaccuracy",
+            field=models.IntegerField(
+                default=0, help_text="Number of inaccuracies in the middle game."
+            ),
+        ),
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="middle_game_mistake",
+            field=models.IntegerField(
+                default=0, help_text="Number of mistakes in the middle game."
+            ),
+        ),
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="middle_game_move_time",
+            field=models.FloatField(
+                help_text="Average move time in the middle game, if reached.", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="opening_blunder",
+            field=models.IntegerField(
+                default=0, help_text="Number of blunders in the opening."
+            ),
+        ),
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="opening_inaccuracy",
+            field=models.IntegerField(
+                default=0, help_text="Number of inaccuracies in the opening."
+            ),
+        ),
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="opening_mistake",
+            field=models.IntegerField(
+                default=0, help_text="Number of mistakes in the opening."
+            ),
+        ),
+        migrations.AddField(
+            model_name="singlegameplayer",
+            name="opening_move_time",
+            field=models.FloatField(
+                help_text="Average move time in the opening, if reached.", null=True
+            ),
+        ),
+        # nullable, so the reverse migration can add them back before filling them
+        migrations.AlterField(
+            model_name="singlegameplayer",
+            name="evaluation",
+            field=models.JSONField(
+                null=True, help_text="Evaluation of the player per phase."
+            ),
+        ),
+        migrations.AlterField(
+            model_name="singlegameplayer",
+            name="avg_move_time",
+            field=models.JSONField(
+                null=True, help_text="Average move time of the player per phase."
+            ),
+        ),
+        migrations.RunPython(fill_phase_columns, fill_json_fields),
+        migrations.RemoveField(
+            model_name="singlegameplayer",
+            name="avg_move_time",
+        ),
+        migrations.RemoveField(
+            model_name="singlegameplayer",
+            name="evaluation",
+        ),
+    ]
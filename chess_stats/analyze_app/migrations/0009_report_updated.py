@@ -0,0 +1,20 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analyze_app", "0008_typed_player_phases"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="report",
+            name="updated",
+            field=models.DateTimeField(
+                auto_now=True,
+                help_text="Last time the report was saved, e.g. refreshed.",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analyze_app", "0009_report_updated"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="report",
+            name="pending_chunks",
+            field=models.IntegerField(
+                default=0,
+                editable=False,
+                help_text="Enqueued chunks of games not analyzed yet.",
+            ),
+        ),
+    ]
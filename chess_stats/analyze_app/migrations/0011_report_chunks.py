@@ -0,0 +1,58 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analyze_app", "0010_report_pending_chunks"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="report",
+            name="pending_chunks",
+        ),
+        migrations.CreateModel(
+            name="ReportChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("host", models.CharField(max_length=20)),
+                ("username", models.CharField(max_length=100)),
+                (
+                    "pgns",
+                    models.JSONField(help_text="PGNs of the games, newest first."),
+                ),
+                (
+                    "analyzed",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Leading games of `pgns` already analyzed and saved.",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.IntegerField(
+                        default=0, help_text="Times analysis of the chunk has started."
+                    ),
+                ),
+                (
+                    "report",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunks",
+                        to="analyze_app.report",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analyze_app", "0011_report_chunks"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chessgame",
+            name="evaluated",
+            field=models.BooleanField(
+                default=True,
+                help_text="Mistakes are evaluated by the engine. Games stored by the metadata phase of ingestion are evaluated later.",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="reportchunk",
+            name="analyzed",
+            field=models.IntegerField(
+                default=0,
+                help_text="Leading games of `pgns` already evaluated and saved.",
+            ),
+        ),
+    ]
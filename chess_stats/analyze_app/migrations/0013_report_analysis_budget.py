@@ -0,0 +1,39 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analyze_app", "0012_game_evaluated"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="report",
+            name="analysis_budget",
+            field=models.IntegerField(
+                blank=True,
+                help_text="Seconds since creation within which games should be evaluated, the engine depth is lowered to fit. Empty - no limit.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="report",
+            name="analysis_depth",
+            field=models.IntegerField(
+                blank=True,
+                help_text="Lowest depth games were evaluated with, below `engine_depth` if the analysis budget was short.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="report",
+            name="seconds_per_game",
+            field=models.FloatField(
+                blank=True,
+                help_text="Seconds a qcluster worker takes to evaluate a game at `engine_depth`, estimated from the games evaluated so far.",
+                null=True,
+            ),
+        ),
+    ]
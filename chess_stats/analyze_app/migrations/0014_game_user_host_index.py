@@ -0,0 +1,18 @@
+# Generated by Django 4.2.5 on 2026-10-18 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analyze_app", "0013_report_analysis_budget"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="chessgame",
+            index=models.Index(
+                fields=["username", "host", "engine_depth"], name="game_user_host_idx"
+            ),
+        ),
+    ]
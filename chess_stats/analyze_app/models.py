@@ -1,4 +1,5 @@
 from collections.abc import Iterable
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models, transaction
 
 
@@ -13,34 +14,153 @@ class Result(models.TextChoices):
     BLACK = Color.BLACK
 
 
+PHASES = ("opening", "middle_game", "end_game")
+MISTAKES = ("inaccuracy", "mistake", "blunder")
+
+
 class Report(models.Model):
     created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(
+        auto_now=True, help_text="Last time the report was saved, e.g. refreshed."
+    )
     chess_com_username = models.CharField(max_length=100)
     lichess_username = models.CharField(max_length=100)
     time_class = models.CharField(max_length=20)
     games_num = models.IntegerField()
     analyzed_games = models.IntegerField(default=0, null=True)
     engine_depth = models.IntegerField(default=10)
+    analysis_budget = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Seconds since creation within which games should be evaluated, "
+        "the engine depth is lowered to fit. Empty - no limit.",
+    )
+    analysis_depth = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Lowest depth games were evaluated with, below `engine_depth` "
+        "if the analysis budget was short.",
+    )
+    seconds_per_game = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Seconds a qcluster worker takes to evaluate a game at "
+        "`engine_depth`, estimated from the games evaluated so far.",
+    )
     fail_reason = models.CharField(max_length=100, null=True, blank=True)
     professional = models.BooleanField(blank=True, null=True)
 
+    @property
+    def is_complete(self) -> bool:
+        """
+        All games are analyzed, so the report won't change anymore. Reports ask for
+        at least a game, so one finished with no games has `games_num` set to 0.
+        """
+        return 0 <= self.games_num <= self.analyzed_games
+
     def __str__(self):
         return self.chess_com_username + " " + self.lichess_username
 
 
+class ReportStatistics(models.Model):
+    report = models.OneToOneField(
+        Report, on_delete=models.CASCADE, primary_key=True, related_name="statistics"
+    )
+    analyzed_games = models.IntegerField(
+        help_text="Number of analyzed games the statistics were computed for."
+    )
+    version = models.IntegerField(
+        help_text="`STATISTICS_VERSION` the statistics were computed with."
+    )
+    data = models.JSONField(
+        encoder=DjangoJSONEncoder, help_text="Output of `QueriesMaker.asdict`."
+    )
+
+    def __str__(self):
+        return f"{self.report} v{self.version} ({self.analyzed_games} games)"
+
+
 class SingleGamePlayer(models.Model):
-    evaluation = models.JSONField(help_text="Evaluation of the player per phase.")
+    """
+    Mistakes and move times are stored per phase in typed columns,
+    so statistics can be aggregated by the database.
+    """
+
     elo = models.IntegerField(help_text="ELO rating of the player.")
-    avg_move_time = models.JSONField(
-        help_text="Average move time of the player per phase."
+    opening_inaccuracy = models.IntegerField(
+        default=0, help_text="Number of inaccuracies in the opening."
+    )
+    opening_mistake = models.IntegerField(
+        default=0, help_text="Number of mistakes in the opening."
+    )
+    opening_blunder = models.IntegerField(
+        default=0, help_text="Number of blunders in the opening."
+    )
+    middle_game_inaccuracy = models.IntegerField(
+        default=0, help_text="Number of inaccuracies in the middle game."
+    )
+    middle_game_mistake = models.IntegerField(
+        default=0, help_text="Number of mistakes in the middle game."
+    )
+    middle_game_blunder = models.IntegerField(
+        default=0, help_text="Number of blunders in the middle game."
+    )
+    end_game_inaccuracy = models.IntegerField(
+        default=0, help_text="Number of inaccuracies in the end game."
+    )
+    end_game_mistake = models.IntegerField(
+        default=0, help_text="Number of mistakes in the end game."
     )
+    end_game_blunder = models.IntegerField(
+        default=0, help_text="Number of blunders in the end game."
+    )
+    opening_move_time = models.FloatField(
+        null=True, help_text="Average move time in the opening, if reached."
+    )
+    middle_game_move_time = models.FloatField(
+        null=True, help_text="Average move time in the middle game, if reached."
+    )
+    end_game_move_time = models.FloatField(
+        null=True, help_text="Average move time in the end game, if reached."
+    )
+
+    @property
+    def evaluation(self) -> dict:
+        """Mistakes per phase in the format of `chess_insight`."""
+        return {
+            phase: {kind: getattr(self, f"{phase}_{kind}") for kind in MISTAKES}
+            for phase in PHASES
+        }
+
+    @evaluation.setter
+    def evaluation(self, evaluation: dict) -> None:
+        for phase in PHASES:
+            for kind in MISTAKES:
+                setattr(self, f"{phase}_{kind}", evaluation[phase][kind])
+
+    @property
+    def avg_move_time(self) -> dict:
+        """Move times of reached phases in the format of `chess_insight`."""
+        return {
+            phase: getattr(self, f"{phase}_move_time")
+            for phase in PHASES
+            if getattr(self, f"{phase}_move_time") is not None
+        }
+
+    @avg_move_time.setter
+    def avg_move_time(self, avg_move_time: dict) -> None:
+        for phase in PHASES:
+            setattr(self, f"{phase}_move_time", avg_move_time.get(phase))
 
 
 # Generated basing on chess-insight readme
 class ChessGame(models.Model):
-    report = models.ForeignKey(
-        Report, on_delete=models.CASCADE, related_name="games", null=True
-    )
+    """
+    Game seen by `username`, shared by all reports of that player.
+    It is stored once per engine depth it was analyzed with.
+    """
+
+    reports = models.ManyToManyField(Report, through="ReportGame", related_name="games")
     player = models.ForeignKey(
         SingleGamePlayer,
         on_delete=models.CASCADE,
@@ -81,6 +201,25 @@ class ChessGame(models.Model):
     )
     url = models.URLField(help_text="URL to the game.")
     username = models.CharField(max_length=50, help_text="Username of the player.")
+    engine_depth = models.IntegerField(help_text="Depth the game was analyzed with.")
+    evaluated = models.BooleanField(
+        default=True,
+        help_text="Mistakes are evaluated by the engine. Games stored by the metadata "
+        "phase of ingestion are evaluated later.",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["url", "username", "engine_depth"], name="unique_game_analysis"
+            )
+        ]
+        # games of a user reused by `_update_report`
+        indexes = [
+            models.Index(
+                fields=["username", "host", "engine_depth"], name="game_user_host_idx"
+            )
+        ]
 
     def save(self, *args, **kwargs):
         # Create savepoints before saving objects
@@ -93,3 +232,39 @@ class ChessGame(models.Model):
 
     def __str__(self):
         return f"{self.date} - {self.username} url: {self.url}"
+
+
+class ReportGame(models.Model):
+    """Membership of a shared game in a report."""
+
+    report = models.ForeignKey(Report, on_delete=models.CASCADE)
+    game = models.ForeignKey(ChessGame, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["report", "game"], name="unique_report_game"
+            )
+        ]
+
+
+class ReportChunk(models.Model):
+    """
+    Stored games of a host waiting for engine evaluation. The chunk is deleted once
+    its games are evaluated, so interrupted ingestion resumes without fetching them
+    again. Statistics of the engine are pending while the report has chunks.
+    """
+
+    report = models.ForeignKey(Report, on_delete=models.CASCADE, related_name="chunks")
+    host = models.CharField(max_length=20)
+    username = models.CharField(max_length=100)
+    pgns = models.JSONField(help_text="PGNs of the games, newest first.")
+    analyzed = models.IntegerField(
+        default=0, help_text="Leading games of `pgns` already evaluated and saved."
+    )
+    attempts = models.IntegerField(
+        default=0, help_text="Times analysis of the chunk has started."
+    )
+
+    def __str__(self):
+        return f"{self.report} {self.host} ({self.analyzed}/{len(self.pgns)} games)"
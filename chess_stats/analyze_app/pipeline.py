@@ -0,0 +1,162 @@
+from contextlib import contextmanager
+from queue import Queue
+from threading import Event, Lock, Semaphore, Thread
+from time import perf_counter
+from typing import Callable, Iterable, Iterator
+
+from django.db import connections
+
+from .metrics import PIPELINE_ITEMS, PIPELINE_SECONDS
+
+# marks the end of the source in queues between stages
+_END = object()
+
+
+class _Failure:
+    """Exception raised for an item, passed on to the consumer in its place."""
+
+    def __init__(self, exc: Exception, fatal: bool = False) -> None:
+        self.exc = exc
+        # failures of the source end it, so they can't be skipped
+        self.fatal = fatal
+
+
+class _Countdown:
+    """Workers of a stage still running."""
+
+    def __init__(self, count: int) -> None:
+        self.count = count
+        self._lock = Lock()
+
+    def done(self) -> bool:
+        """Counts a finished worker, true for the last one."""
+        with self._lock:
+            self.count -= 1
+            return not self.count
+
+
+class Stage:
+    """Step of a `Pipeline`, `function` is applied to items by `workers` threads."""
+
+    def __init__(self, name: str, function: Callable, workers: int = 1) -> None:
+        self.name = name
+        self.function = function
+        self.workers = max(1, workers)
+
+
+class Pipeline:
+    """
+    Stages connected by queues, each run by its own threads, so all of them work
+    at once and items flow through as fast as the slowest stage allows.
+    At most `capacity` items are in flight - the source waits for the consumer
+    otherwise, so a fast fetch doesn't pile up games in memory.
+    Results are yielded in order of the source, the first exception raised by the
+    source or a stage is raised to the consumer after the items before it. Items
+    failing in a stage are skipped instead if `errors` is given, their exceptions
+    are appended there, like by `EnginePool.analyze`.
+    Items and busy time of each stage are counted in `PIPELINE_ITEMS` and
+    `PIPELINE_SECONDS`, so their throughput can be compared.
+    """
+
+    def __init__(self, stages: list[Stage], capacity: int = 16) -> None:
+        self.stages = stages
+        self.capacity = max(1, capacity)
+
+    def run(
+        self, source: Iterable, name: str = "source", errors: list = None
+    ) -> Iterator:
+        """Yields results of the last stage for items of `source`, read as `name`."""
+        # queues never block - the semaphore admits at most `capacity` items
+        queues = [Queue(self.capacity + 1) for _ in range(len(self.stages) + 1)]
+        slots = Semaphore(self.capacity)
+        stop = Event()
+        threads = [Thread(target=_read, args=(source, name, queues[0], slots, stop))]
+        for stage, inbox, outbox in zip(self.stages, queues, queues[1:]):
+            alive = _Countdown(stage.workers)
+            threads += [
+                Thread(target=_work, args=(stage, inbox, outbox, alive, stop))
+                for _ in range(stage.workers)
+            ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            yield from _in_order(queues[-1], slots, errors)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+
+@contextmanager
+def measure(stage: str, items: int = 1):
+    """Counts `items` processed by `stage` and the time it was busy with them.
+    Failed items only count as busy time."""
+    start = perf_counter()
+    try:
+        yield
+        PIPELINE_ITEMS.inc(items, stage=stage)
+    finally:
+        PIPELINE_SECONDS.inc(perf_counter() - start, stage=stage)
+
+
+def _read(
+    source: Iterable, name: str, outbox: Queue, slots: Semaphore, stop: Event
+) -> None:
+    iterator = iter(source)
+    number = 0
+    try:
+        while not stop.is_set():
+            # a consumer which stopped early doesn't free slots
+            if not slots.acquire(timeout=0.1):
+                continue
+            try:
+                with measure(name):
+                    item = next(iterator)
+            except StopIteration:
+                break
+            except Exception as exc:  # pylint: disable=broad-except
+                outbox.put((number, _Failure(exc, fatal=True)))
+                break
+            outbox.put((number, item))
+            number += 1
+    finally:
+        if hasattr(iterator, "close"):
+            iterator.close()
+        outbox.put(_END)
+        connections.close_all()
+
+
+def _work(stage: Stage, inbox: Queue, outbox: Queue, alive: _Countdown, stop: Event):
+    try:
+        while (message := inbox.get()) is not _END:
+            number, item = message
+            if not isinstance(item, _Failure) and not stop.is_set():
+                try:
+                    with measure(stage.name):
+                        item = stage.function(item)
+                except Exception as exc:  # pylint: disable=broad-except
+                    item = _Failure(exc)
+            outbox.put((number, item))
+        # the end is passed on by the last worker, after all items of the stage
+        inbox.put(_END)
+        if alive.done():
+            outbox.put(_END)
+    finally:
+        connections.close_all()
+
+
+def _in_order(inbox: Queue, slots: Semaphore, errors: list | None) -> Iterator:
+    pending, number = {}, 0
+    while (message := inbox.get()) is not _END:
+        pending[message[0]] = message[1]
+        while number in pending:
+            item = pending.pop(number)
+            number += 1
+            slots.release()
+            if not isinstance(item, _Failure):
+                yield item
+            elif errors is None or item.fatal:
+                raise item.exc
+            else:
+                errors.append(item.exc)
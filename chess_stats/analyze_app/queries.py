@@ -1,11 +1,172 @@
+import asyncio
 from logging import Logger
 from time import time
 
 from datetime import datetime
-from django.db.models import Count, F, Q
+from itertools import groupby
+from operator import itemgetter
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import Count, F, Max, Min, Q, Sum, Window
+from django.db.models.functions import FirstValue, TruncDay
 from django.db.models.query import QuerySet
+from .frame import GamesFrame
+from .metrics import count_rows, measure_statistic
 from .models import ChessGame as Game
-from .models import Report, Color, Result
+from .models import MISTAKES, PHASES, Report, ReportGame, ReportStatistics
+from .models import Color, Result
+
+# Bump it whenever output of `QueriesMaker` changes, stored statistics are then recomputed.
+STATISTICS_VERSION = 4
+
+
+def get_report_etag(report: Report) -> str:
+    """
+    Version of everything shown for the report. It changes with analyzed games,
+    with refreshes of the report and with `STATISTICS_VERSION`.
+    """
+    updated = int(report.updated.timestamp() * 1000)
+    return f"{report.pk}-{report.analyzed_games}-{STATISTICS_VERSION}-{updated}"
+
+
+def get_report_statistics(report: Report, logger: Logger) -> dict:
+    """
+    Statistics of the report. Complete reports are computed only once, then
+    served from `ReportStatistics` until `STATISTICS_VERSION` changes.
+    """
+    if not report.is_complete:
+        return ColumnarQueriesMaker(report, logger).asdict()
+    data = (
+        ReportStatistics.objects.filter(
+            pk=report.pk,
+            analyzed_games=report.analyzed_games,
+            version=STATISTICS_VERSION,
+        )
+        .values_list("data", flat=True)
+        .first()
+    )
+    if data is None:
+        data = save_report_statistics(report, logger).data
+    return data
+
+
+def save_report_statistics(report: Report, logger: Logger) -> ReportStatistics:
+    statistics, _ = ReportStatistics.objects.update_or_create(
+        report=report,
+        defaults={
+            "analyzed_games": report.analyzed_games,
+            "version": STATISTICS_VERSION,
+            "data": ColumnarQueriesMaker(report, logger).asdict(),
+        },
+    )
+    logger.info(f"Saved statistics of report {report.pk}")
+    return statistics
+
+
+def get_report_statistic(report: Report, name: str, logger: Logger) -> dict:
+    """
+    Single statistic of the report. Complete reports read it from their stored
+    statistics, other ones compute only the matching `QueriesMaker` method.
+    """
+    if not report.is_complete:
+        return QueriesMaker(report, logger).statistic(name)
+    data = (
+        ReportStatistics.objects.filter(
+            pk=report.pk,
+            analyzed_games=report.analyzed_games,
+            version=STATISTICS_VERSION,
+        )
+        .values_list(f"data__{name}", flat=True)
+        .first()
+    )
+    if data is None:
+        data = get_report_statistics(report, logger)[name]
+    return data
+
+
+async def aget_report_statistic(
+    report: Report, name: str, logger: Logger, elo_points: int = None
+) -> dict:
+    """
+    `get_report_statistic` for async views, hosts are computed concurrently.
+    Statistics downsampled to other than the default `elo_points` aren't stored,
+    so they are computed too.
+    """
+    if not report.is_complete or elo_points not in (None, QueriesMaker.elo_points):
+        return await QueriesMaker(report, logger, elo_points).astatistic(name)
+    return await sync_to_async(get_report_statistic)(report, name, logger)
+
+
+def get_report_progress(report: Report) -> dict:
+    """Progress of the analysis of the report, with analyzed games per host."""
+    hosts = (
+        ReportGame.objects.filter(report=report)
+        .values_list("game__host")
+        .annotate(Count("id"))
+    )
+    return {
+        "analyzed_games": report.analyzed_games,
+        "games_num": report.games_num,
+        "fail_reason": report.fail_reason,
+        "hosts": dict(hosts),
+    }
+
+
+def get_report_outline(report: Report, logger: Logger) -> dict:
+    """
+    Everything the report page shows before its charts load their data -
+    progress, usernames and `about` of each statistic. No game is queried.
+    """
+    data = {
+        "Xusername": {
+            "chess_com": report.chess_com_username,
+            "lichess_org": report.lichess_username,
+        },
+        "Xanalyzed_games": {"total": report.analyzed_games},
+        "Xgames_num": {"total": report.games_num},
+        "Xprofessional": {"total": report.professional},
+        "Xfail_reason": report.fail_reason,
+    }
+    # statistics of reports still being analyzed would be outdated right away
+    if report.is_complete:
+        maker = QueriesMaker(report, logger)
+        for method in maker.get_methods:
+            name = method.split("get_")[1]
+            if not name.startswith("X"):
+                data[name] = {"about": getattr(maker, method).__doc__}
+    return data
+
+
+def lttb(points: list[dict], budget: int) -> list[dict]:
+    """
+    Largest-Triangle-Three-Buckets downsampling of points ordered by `x` to `budget`
+    points. The first and the last point are kept, every bucket between them keeps
+    the point forming the largest triangle with the point kept before it and the
+    average of the next bucket - so peaks and trends of the series stay visible.
+    """
+    if len(points) <= budget or budget < 3:
+        return points
+    xs = [point["x"].timestamp() for point in points]
+    ys = [point["y"] for point in points]
+    size = (len(points) - 2) / (budget - 2)
+    sampled, kept = [points[0]], 0
+    for bucket in range(budget - 2):
+        start = int(bucket * size) + 1
+        end = int((bucket + 1) * size) + 1
+        next_end = min(int((bucket + 2) * size) + 1, len(points))
+        avg_x = sum(xs[end:next_end]) / (next_end - end)
+        avg_y = sum(ys[end:next_end]) / (next_end - end)
+        kept = max(
+            range(start, end),
+            key=lambda i: abs(
+                (xs[kept] - avg_x) * (ys[i] - ys[kept])
+                - (xs[kept] - xs[i]) * (avg_y - ys[kept])
+            ),
+        )
+        sampled.append(points[kept])
+    sampled.append(points[-1])
+    return sampled
 
 
 class QueriesMaker:
@@ -15,9 +176,20 @@ class QueriesMaker:
     To add a new query, add a method that starts with "get_" and returns the data.
     """
 
-    def __init__(self, report: Report, logger: Logger) -> None:
+    # points of elo over time per host, days are downsampled beyond it
+    elo_points = 200
+    # most points of elo over time per host a client may ask for
+    max_elo_points = 2000
+    # statistics of engine evaluations, pending while games wait for evaluation
+    engine_methods = ("get_mistakes_per_phase",)
+    # series drawn per host, their `total` would only repeat points of the hosts
+    host_series_methods = ("get_player_elo_over_time",)
+
+    def __init__(self, report: Report, logger: Logger, elo_points: int = None) -> None:
         self.report = report
         self.logger = logger
+        if elo_points:
+            self.elo_points = elo_points
         self.get_methods = [
             method
             for method in dir(self)
@@ -33,31 +205,93 @@ class QueriesMaker:
         eg.
         get_username -> username: "miskibin"
         """
-        games_per_hosts: [str, QuerySet[Game]] = {
-            host["host"].replace(".", "_"): Game.objects.filter(
-                report=self.report, host=host["host"]
-            )
-            for host in Game.objects.filter(report=self.report)
-            .values("host")
-            .distinct()
-        }
-        games_per_hosts["total"] = Game.objects.filter(report=self.report)
+        games_per_hosts = self._games_per_hosts()
         data = {}
         for method in self.get_methods:
             start = time()
-            data[str(method.split("get_")[1])] = {
-                host_name: getattr(self, method)(games)
-                for host_name, games in games_per_hosts.items()
-            }
-            data[str(method.split("get_")[1])]["about"] = getattr(self, method).__doc__
+            data[str(method.split("get_")[1])] = self._query(method, games_per_hosts)
             self.logger.debug(f"Query {method:40} {time() - start:.3f}s")
 
         self.logger.debug(f"{data.keys()}")
 
         return data
 
+    def statistic(self, name: str) -> dict:
+        """Single entry of `asdict` - data of `get_<name>` per host and its `about`."""
+        return self._query(f"get_{name}", self._games_per_hosts())
+
+    async def astatistic(self, name: str) -> dict:
+        """
+        `statistic` for async views. Hosts are computed concurrently, each in its
+        own thread with its own database connection.
+        """
+        method = f"get_{name}"
+        games = Game.objects.filter(reports=self.report)
+        hosts = [host async for host in games.values_list("host", flat=True).distinct()]
+        games_per_hosts = {
+            host.replace(".", "_"): games.filter(host=host) for host in hosts
+        }
+        if method not in self.host_series_methods:
+            games_per_hosts["total"] = games
+        if (
+            method in self.engine_methods
+            and await games.filter(evaluated=False).aexists()
+        ):
+            return self._pending(method)
+        results = await asyncio.gather(
+            *(
+                sync_to_async(self._query_host_connection, thread_sensitive=False)(
+                    method, host_name, games
+                )
+                for host_name, games in games_per_hosts.items()
+            )
+        )
+        data = dict(zip(games_per_hosts, results))
+        data["about"] = getattr(self, method).__doc__
+        return data
+
+    def _query_host(self, method: str, host_name: str, games: QuerySet[Game]):
+        with measure_statistic(method, host_name):
+            return getattr(self, method)(games)
+
+    def _query_host_connection(self, method: str, host_name: str, games):
+        try:
+            return self._query_host(method, host_name, games)
+        finally:
+            connections.close_all()
+
+    def _games_per_hosts(self) -> dict[str, QuerySet[Game]]:
+        games_per_hosts = {
+            host["host"].replace(".", "_"): Game.objects.filter(
+                reports=self.report, host=host["host"]
+            )
+            for host in Game.objects.filter(reports=self.report)
+            .values("host")
+            .distinct()
+        }
+        games_per_hosts["total"] = Game.objects.filter(reports=self.report)
+        return games_per_hosts
+
+    def _query(self, method: str, games_per_hosts: dict[str, QuerySet[Game]]) -> dict:
+        if (
+            method in self.engine_methods
+            and games_per_hosts["total"].filter(evaluated=False).exists()
+        ):
+            return self._pending(method)
+        data = {
+            host_name: self._query_host(method, host_name, games)
+            for host_name, games in games_per_hosts.items()
+            if host_name != "total" or method not in self.host_series_methods
+        }
+        data["about"] = getattr(self, method).__doc__
+        return data
+
+    def _pending(self, method: str) -> dict:
+        """Entry of a statistic which can't be computed until games are evaluated."""
+        return {"pending": True, "about": getattr(self, method).__doc__}
+
     def get_Xanalyzed_games(self, games: QuerySet[Game]) -> int:
-        return games.filter(report=self.report).count()
+        return games.count()
 
     def get_Xprofessional(self, games: QuerySet[Game]) -> int:
         return self.report.professional
@@ -96,11 +330,15 @@ class QueriesMaker:
             "higher_ratio": game_results(higher_games),
         }
 
-    def get_Xusername(self, games: QuerySet[Game]) -> str:
-        if games[0].host == "lichess.org":
-            return games[0].report.lichess_username
-        if games[0].host == "chess.com":
-            return games[0].report.chess_com_username
+    def get_Xusername(self, games: QuerySet[Game]) -> str | None:
+        game = games.first()
+        if game is None:
+            return None
+        count_rows(1)
+        if game.host == "lichess.org":
+            return self.report.lichess_username
+        if game.host == "chess.com":
+            return self.report.chess_com_username
 
     def get_avg_time_per_move(self, games: QuerySet[Game]) -> list:
         """
@@ -120,25 +358,34 @@ class QueriesMaker:
         maybe you should you should play more bullet games.</li>
         </ul>
         """
-        avg_time = {
-            "player": {"opening": 0, "middle_game": 0, "end_game": 0},
-            "opponent": {"opening": 0, "middle_game": 0, "end_game": 0},
+        aggregates = {"games": Count("id")}
+        # a game is summed up to the first phase missing for any side
+        reached = None
+        for phase in PHASES:
+            player_known = Q(**{f"player__{phase}_move_time__isnull": False})
+            opponent_known = Q(**{f"opponent__{phase}_move_time__isnull": False})
+            aggregates[f"player_{phase}"] = Sum(
+                f"player__{phase}_move_time", filter=reached, default=0
+            )
+            aggregates[f"opponent_{phase}"] = Sum(
+                f"opponent__{phase}_move_time",
+                filter=player_known if reached is None else reached & player_known,
+                default=0,
+            )
+            known = player_known & opponent_known
+            reached = known if reached is None else reached & known
+        aggregates["incomplete"] = Count("id", filter=~reached)
+        sums = games.aggregate(**aggregates)
+        if not sums["games"]:
+            return {}
+        if sums["incomplete"]:
+            self.logger.error(
+                f"No move times for {sums['incomplete']} games in get_avg_time_per_move"
+            )
+        return {
+            side: {phase: sums[f"{side}_{phase}"] / sums["games"] for phase in PHASES}
+            for side in ("player", "opponent")
         }
-        for game in games:
-            for phase in ["opening", "middle_game", "end_game"]:
-                try:
-                    avg_time["player"][phase] += game.player.avg_move_time[phase]
-                    avg_time["opponent"][phase] += game.opponent.avg_move_time[phase]
-                except KeyError:
-                    self.logger.error(
-                        f"No {phase} in get_avg_time_per_move for game {game.id}"
-                    )
-                    break
-
-        for phase in ["opening", "middle_game", "end_game"]:
-            avg_time["player"][phase] /= games.count()
-            avg_time["opponent"][phase] /= games.count()
-        return avg_time
 
     def get_win_ratio_per_color(self, games: QuerySet[Game]) -> list:
         """
@@ -165,17 +412,11 @@ class QueriesMaker:
 
     def __get_win_ratio(self, color, games: QuerySet[Game]) -> int:
         opponent_color = Color.BLACK if color == Color.WHITE else Color.WHITE
-        win = games.filter(
-            report=self.report, player_color=color, result=F("player_color")
-        ).count()
-        lost = games.filter(
-            report=self.report,
-            player_color=color,
-            result=opponent_color,
-        ).count()
-        draws = (
-            games.filter(report=self.report, player_color=color).count() - win - lost
-        )
+        # `games` are already filtered by the report, filtering by it again would
+        # join the membership table once more
+        win = games.filter(player_color=color, result=F("player_color")).count()
+        lost = games.filter(player_color=color, result=opponent_color).count()
+        draws = games.filter(player_color=color).count() - win - lost
         return [win, draws, lost]
 
     def get_win_ratio_per_opening_as_white(self, games: QuerySet[Game]) -> dict:
@@ -214,14 +455,13 @@ class QueriesMaker:
         # field name end_reason
         end_reasons = {}
         end_reasons["win"] = list(
-            games.filter(report=self.report, result=F("player_color"))
+            games.filter(result=F("player_color"))
             .exclude(end_reason="unknown")
             .values("end_reason")
             .annotate(count=Count("end_reason"))
         )
         end_reasons["loss"] = list(
-            games.filter(report=self.report)
-            .exclude(
+            games.exclude(
                 Q(result=F("player_color"))
                 | Q(result=Result.DRAW)
                 | Q(end_reason="unknown")
@@ -229,6 +469,7 @@ class QueriesMaker:
             .values("end_reason")
             .annotate(count=Count("end_reason"))
         )
+        count_rows(len(end_reasons["win"]) + len(end_reasons["loss"]))
         return end_reasons
 
     def __get_win_ratio_per_opening_for_color(
@@ -244,6 +485,7 @@ class QueriesMaker:
             .annotate(count=Count(field_name))
         )
         openings = sorted(openings, key=lambda x: x["count"], reverse=True)
+        count_rows(len(openings))
         openings = openings[:max_oppenings]
 
         for opening in openings:
@@ -259,9 +501,7 @@ class QueriesMaker:
                 ).count()
         return openings
 
-    def get_player_elo_over_time(
-        self, games: QuerySet[Game]
-    ) -> list:  # TODO REfactor this method it retrurns 3 times the same data !!!
+    def get_player_elo_over_time(self, games: QuerySet[Game]) -> list:
         """
         You can see how your elo changed over time. <br/>
         For most active players Lichess rating is about 200 points higher than chess.com rating.
@@ -275,13 +515,45 @@ class QueriesMaker:
         <li><code>Stable elo</code>: You are probably rated correctly. Keep playing and your elo will stabilize.</li>
 
         """
-        games = games.annotate(count=Count("host")).order_by("-date")
+        partition = [F("host"), TruncDay("date")]
+        days = (
+            games.annotate(
+                day=TruncDay("date"),
+                open=Window(
+                    FirstValue("player__elo"),
+                    partition_by=partition,
+                    order_by=[F("date").asc(), F("id").asc()],
+                ),
+                close=Window(
+                    FirstValue("player__elo"),
+                    partition_by=partition,
+                    order_by=[F("date").desc(), F("id").desc()],
+                ),
+                low=Window(Min("player__elo"), partition_by=partition),
+                high=Window(Max("player__elo"), partition_by=partition),
+                games_count=Window(Count("id"), partition_by=partition),
+            )
+            .values("host", "day", "open", "close", "low", "high", "games_count")
+            .distinct()
+            .order_by("host", "day")
+        )
         data = []
-        day = -1
-        for game in games:
-            if game.date.date() != day:
-                day = game.date.date()
-                data.append({"x": game.date, "y": game.player.elo, "host": game.host})
+        days = list(days)
+        count_rows(len(days))
+        for host, points in groupby(days, key=itemgetter("host")):
+            points = [
+                {
+                    "x": day["day"],
+                    "y": day["close"],
+                    "open": day["open"],
+                    "low": day["low"],
+                    "high": day["high"],
+                    "games": day["games_count"],
+                    "host": host,
+                }
+                for day in points
+            ]
+            data += lttb(points, self.elo_points)
         return data
 
     def get_mistakes_per_phase(self, games: QuerySet[Game]):
@@ -300,19 +572,284 @@ class QueriesMaker:
         </ul>
         """
 
+        sums = games.aggregate(
+            games=Count("id"),
+            **{
+                f"{phase}_{kind}": Sum(f"player__{phase}_{kind}")
+                for phase in PHASES
+                for kind in MISTAKES
+            },
+        )
+        if not sums["games"]:
+            return {}
+        return {
+            phase: [sums[f"{phase}_{kind}"] / sums["games"] for kind in MISTAKES]
+            for phase in PHASES
+        }
+
+
+class ColumnarQueriesMaker(QueriesMaker):
+    """
+    Computes the same data as `QueriesMaker.asdict`, but loads the games only once
+    into a `GamesFrame` and calculates every statistic with numpy for all hosts at once.
+    Docstrings (`about`) are taken from the `get_` methods of `QueriesMaker`.
+    """
+
+    def asdict(self) -> dict:
+        with measure_statistic("frame", "all"):
+            frame = GamesFrame.from_report(self.report)
+            count_rows(frame.size)
+        evaluating = not frame.evaluated.all()
+        data = {}
+        for method in self.get_methods:
+            start = time()
+            name = str(method.split("get_")[1])
+            if evaluating and method in self.engine_methods:
+                data[name] = self._pending(method)
+                continue
+            with measure_statistic(method, "all"):
+                data[name] = getattr(self, f"_frame_{name}")(frame)
+            data[name]["about"] = getattr(self, method).__doc__
+            self.logger.debug(f"Query {method:40} {time() - start:.3f}s")
+
+        self.logger.debug(f"{data.keys()}")
+
+        return data
+
+    def _frame_Xanalyzed_games(self, frame: GamesFrame) -> dict:
+        return frame.group_count()
+
+    def _frame_Xprofessional(self, frame: GamesFrame) -> dict:
+        return dict.fromkeys(frame.host_keys, self.report.professional)
+
+    def _frame_Xgames_num(self, frame: GamesFrame) -> dict:
+        return dict.fromkeys(frame.host_keys, self.report.games_num)
+
+    def _frame_Xusername(self, frame: GamesFrame) -> dict:
+        usernames = {
+            "lichess.org": self.report.lichess_username,
+            "chess.com": self.report.chess_com_username,
+        }
+        return {
+            host_key: usernames.get(str(frame.host[mask][0])) if mask.any() else None
+            for host_key, mask in frame.partitions()
+        }
+
+    def _frame_win_per_opponent_rating(self, frame: GamesFrame) -> dict:
+        won = frame.result == frame.player_color
+        drawn = frame.result == Result.DRAW
+        ranges = {
+            "lower_ratio": frame.opponent_elo < frame.player_elo - 10,
+            "similar_ratio": (frame.opponent_elo >= frame.player_elo - 10)
+            & (frame.opponent_elo <= frame.player_elo + 10),
+            "higher_ratio": frame.opponent_elo > frame.player_elo + 10,
+        }
+        counts = {
+            name: (
+                frame.group_count(mask),
+                frame.group_count(mask & won),
+                frame.group_count(mask & drawn),
+            )
+            for name, mask in ranges.items()
+        }
+        return {
+            host_key: {
+                name: [
+                    win[host_key],
+                    draw[host_key],
+                    total[host_key] - win[host_key] - draw[host_key],
+                ]
+                for name, (total, win, draw) in counts.items()
+            }
+            for host_key in frame.host_keys
+        }
+
+    def _frame_avg_time_per_move(self, frame: GamesFrame) -> dict:
+        # `QueriesMaker` stops summing a game at the first phase missing for any side
+        player_known = ~np.isnan(frame.player_move_time)
+        both_known = player_known & ~np.isnan(frame.opponent_move_time)
+        reached = np.ones_like(both_known)
+        reached[:, 1:] = np.cumprod(both_known, axis=1)[:, :-1].astype(bool)
+        incomplete = frame.group_count(~both_known.all(axis=1))
+        if incomplete["total"]:
+            self.logger.error(
+                f"No move times for {incomplete['total']} games in get_avg_time_per_move"
+            )
+
+        games_count = frame.group_count()
+        sums = {
+            side: {
+                phase: frame.group_sum(times[:, i], reached[:, i] & known[:, i])
+                for i, phase in enumerate(PHASES)
+            }
+            for side, times, known in (
+                ("player", frame.player_move_time, player_known),
+                ("opponent", frame.opponent_move_time, both_known),
+            )
+        }
+        return {
+            host_key: {
+                side: {
+                    phase: sums[side][phase][host_key] / games_count[host_key]
+                    for phase in PHASES
+                }
+                for side in sums
+            }
+            if games_count[host_key]
+            else {}
+            for host_key in frame.host_keys
+        }
+
+    def _frame_win_ratio_per_color(self, frame: GamesFrame) -> dict:
+        results = {}
+        for color in (Color.WHITE, Color.BLACK):
+            opponent_color = Color.BLACK if color == Color.WHITE else Color.WHITE
+            played = frame.player_color == color
+            results[str(color)] = (
+                frame.group_count(played),
+                frame.group_count(played & (frame.result == color)),
+                frame.group_count(played & (frame.result == opponent_color)),
+            )
+        return {
+            host_key: {
+                color: [
+                    win[host_key],
+                    total[host_key] - win[host_key] - lost[host_key],
+                    lost[host_key],
+                ]
+                for color, (total, win, lost) in results.items()
+            }
+            for host_key in frame.host_keys
+        }
+
+    def _frame_win_ratio_per_opening_as_white(self, frame: GamesFrame) -> dict:
+        return self._frame_win_ratio_per_opening_for_color(frame, Color.WHITE)
+
+    def _frame_win_ratio_per_opening_as_black(self, frame: GamesFrame) -> dict:
+        return self._frame_win_ratio_per_opening_for_color(frame, Color.BLACK)
+
+    def _frame_win_ratio_per_opening_for_color(
+        self, frame: GamesFrame, color: Color, max_oppenings=5
+    ) -> dict:
+        win = Color.WHITE if color == Color.WHITE else Color.BLACK
+        loss = Color.BLACK if color == Color.WHITE else Color.WHITE
+        played = frame.player_color == color
         data = {}
-        for phase_name in ["opening", "middle_game", "end_game"]:
-            blunders, mistakes, inaccuracies = 0, 0, 0
-            games_count = games.count()
-            if games_count == 0:
+        for host_key, mask in frame.partitions():
+            names, counts = np.unique(
+                frame.opening_short[mask & played], return_counts=True
+            )
+            order = np.argsort(-counts, kind="stable")[:max_oppenings]
+            openings = []
+            for name, count in zip(names[order].tolist(), counts[order].tolist()):
+                opening = {"count": count, "opening": name}
+                same_opening = mask & played & frame.opening_contains(name)
+                for res, result in (
+                    ("win", win),
+                    ("loss", loss),
+                    ("draw", Result.DRAW),
+                ):
+                    opening[res] = int(
+                        np.count_nonzero(same_opening & (frame.result == result))
+                    )
+                openings.append(opening)
+            data[host_key] = openings
+        return data
+
+    def _frame_end_reasons(self, frame: GamesFrame) -> dict:
+        known = frame.end_reason != "unknown"
+        won = frame.result == frame.player_color
+        lost = ~won & (frame.result != Result.DRAW)
+        data = {}
+        for host_key, mask in frame.partitions():
+            data[host_key] = {
+                name: [
+                    {"end_reason": reason, "count": count}
+                    for reason, count in zip(
+                        *(
+                            values.tolist()
+                            for values in np.unique(
+                                frame.end_reason[mask & known & outcome],
+                                return_counts=True,
+                            )
+                        )
+                    )
+                ]
+                for name, outcome in (("win", won), ("loss", lost))
+            }
+        return data
+
+    def _frame_player_elo_over_time(self, frame: GamesFrame) -> dict:
+        names, host_order = np.unique(frame.host, return_inverse=True)
+        host_order = host_order.reshape(-1)
+        # by host name, then oldest first, games from the same moment by id
+        order = np.lexsort((frame.id, frame.date.astype(np.int64), host_order))
+        days = frame.date.astype("datetime64[D]")
+        data = {}
+        for host_key, mask in frame.partitions():
+            if host_key == "total":
+                continue  # see `host_series_methods`
+            rows = order[mask[order]]
+            if not len(rows):
+                data[host_key] = []
                 continue
-            for game in games:
-                inaccuracies += game.player.evaluation[phase_name]["inaccuracy"]
-                mistakes += game.player.evaluation[phase_name]["mistake"]
-                blunders += game.player.evaluation[phase_name]["blunder"]
-            data[phase_name] = [
-                inaccuracies / games_count,
-                mistakes / games_count,
-                blunders / games_count,
+            row_hosts, row_days = host_order[rows], days[rows]
+            starts = np.flatnonzero(
+                np.r_[
+                    True,
+                    (row_hosts[1:] != row_hosts[:-1]) | (row_days[1:] != row_days[:-1]),
+                ]
+            )
+            ends = np.r_[starts[1:], len(rows)]
+            elo = frame.player_elo[rows]
+            series = {}
+            for host, day, start, end, low, high in zip(
+                names[row_hosts[starts]].tolist(),
+                row_days[starts].astype("datetime64[us]").astype(object),
+                starts.tolist(),
+                ends.tolist(),
+                np.minimum.reduceat(elo, starts).tolist(),
+                np.maximum.reduceat(elo, starts).tolist(),
+            ):
+                series.setdefault(host, []).append(
+                    {
+                        "x": day,
+                        "y": int(elo[end - 1]),
+                        "open": int(elo[start]),
+                        "low": low,
+                        "high": high,
+                        "games": end - start,
+                        "host": host,
+                    }
+                )
+            data[host_key] = [
+                point
+                for points in series.values()
+                for point in lttb(points, self.elo_points)
             ]
         return data
+
+    def _frame_mistakes_per_phase(self, frame: GamesFrame) -> dict:
+        games_count = frame.group_count()
+        sums = [
+            [frame.group_sum(frame.evaluation[:, i, j]) for j in range(len(MISTAKES))]
+            for i in range(len(PHASES))
+        ]
+        return {
+            host_key: {
+                phase: [
+                    mistakes[host_key] / games_count[host_key] for mistakes in sums[i]
+                ]
+                for i, phase in enumerate(PHASES)
+                if games_count[host_key]
+            }
+            for host_key in frame.host_keys
+        }
+
+
+# names of statistics, `get_<name>` methods of `QueriesMaker` meant to be visualized
+STATISTIC_NAMES = [
+    method.split("get_")[1]
+    for method in dir(QueriesMaker)
+    if method.startswith("get_") and not method.startswith("get_X")
+]
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import zlib
+from pathlib import Path
+from threading import Lock, get_ident
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+try:
+    import zstandard
+
+    SUFFIX = ".zst"
+
+    def _compress(data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+
+    def _decompress(data: bytes) -> bytes:
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    ERRORS = (OSError, ValueError, zlib.error, zstandard.ZstdError)
+
+except ImportError:
+    # entries of the other codec are ignored thanks to the suffix
+    SUFFIX = ".zlib"
+    _compress = zlib.compress
+    _decompress = zlib.decompress
+    ERRORS = (OSError, ValueError, zlib.error)
+
+
+class ResponseCache:
+    """
+    Raw responses of host APIs stored on disk, compressed with zstd (zlib if
+    `zstandard` is not installed). Entries are named by a hash of their key, e.g.
+    host, username and archive month, and keep validators of the response.
+    Least recently used entries are evicted once the cache exceeds `max_bytes`.
+    """
+
+    def __init__(self, path: Path, max_bytes: int) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+
+    def get(self, *key: str) -> dict | None:
+        """
+        Entry with `body`, `complete` and validators `etag` and `last_modified`.
+        Reading marks the entry as recently used.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                entry = json.loads(_decompress(file.read()))
+            os.utime(path)
+        except ERRORS:
+            return None
+        return entry
+
+    def set(
+        self,
+        *key: str,
+        body: str,
+        complete: bool = False,
+        etag: str = None,
+        last_modified: str = None,
+    ) -> None:
+        """
+        Stores the response, replacing the entry atomically. A `complete` entry
+        won't change anymore, so it is used without asking the host.
+        """
+        entry = {
+            "body": body,
+            "complete": complete,
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(_compress(json.dumps(entry).encode()))
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def size(self) -> int:
+        return sum(file.stat().st_size for file in self._files())
+
+    def _path(self, key: tuple[str, ...]) -> Path:
+        digest = hashlib.sha256("\0".join(key).encode()).hexdigest()
+        # entries are spread over subdirectories, so none grows too big
+        return self.path / digest[:2] / f"{digest}{SUFFIX}"
+
+    def _files(self) -> list[Path]:
+        return [path for path in self.path.glob(f"*/*{SUFFIX}") if path.is_file()]
+
+    def _evict(self) -> None:
+        with self._lock:
+            files = []
+            for path in self._files():
+                try:
+                    files.append((path.stat(), path))
+                except OSError:
+                    continue  # evicted by another process
+            size = sum(stat.st_size for stat, _ in files)
+            for stat, path in sorted(files, key=lambda file: file[0].st_mtime):
+                if size <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                size -= stat.st_size
+
+
+_CACHE = None
+_CACHE_LOCK = Lock()
+
+
+def get_response_cache() -> ResponseCache | None:
+    """
+    Cache configured by `RESPONSE_CACHE_DIR` and `RESPONSE_CACHE_MAX_BYTES`,
+    `None` if it is disabled.
+    """
+    global _CACHE  # pylint: disable=global-statement
+    if not settings.RESPONSE_CACHE_DIR:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResponseCache(
+                settings.RESPONSE_CACHE_DIR, settings.RESPONSE_CACHE_MAX_BYTES
+            )
+        return _CACHE
+
+
+@receiver(setting_changed)
+def _reset_cache(setting: str, **kwargs) -> None:
+    global _CACHE  # pylint: disable=global-statement
+    if setting in ("RESPONSE_CACHE_DIR", "RESPONSE_CACHE_MAX_BYTES"):
+        with _CACHE_LOCK:
+            _CACHE = None
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Least
+
+from . import models
+
+
+def plan_depth(
+    remaining_games: int,
+    remaining_seconds: float,
+    seconds_per_game: float | None,
+    max_depth: int,
+    min_depth: int = 1,
+    growth: float = 1.5,
+    parallelism: int = 1,
+) -> int:
+    """
+    Deepest depth up to `max_depth` at which `parallelism` workers evaluate
+    `remaining_games` within `remaining_seconds`. `seconds_per_game` is the cost
+    of a game at `max_depth`, each ply shallower divides it by `growth`.
+    Until the cost is measured, games are evaluated at `max_depth`.
+    """
+    if seconds_per_game is None or remaining_games <= 0:
+        return max_depth
+    min_depth = min(min_depth, max_depth)
+    for depth in range(max_depth, min_depth, -1):
+        cost = seconds_per_game / growth ** (max_depth - depth)
+        if remaining_games * cost / parallelism <= remaining_seconds:
+            return depth
+    return min_depth
+
+
+class AnalysisScheduler:
+    """
+    Adapts the engine depth of a report, so all its games are evaluated within
+    `Report.analysis_budget`. Games are evaluated in blocks, the cost of each block
+    is measured and shared with other workers through the report, then the depth
+    of the next block is planned for the games left and the time left.
+    Reports without a budget are evaluated at `engine_depth` in a single block.
+    """
+
+    def __init__(self, report: models.Report) -> None:
+        self.report = report
+        self.growth = settings.ENGINE_DEPTH_GROWTH
+        self.block_size = 2 * settings.ENGINE_POOL_SIZE
+
+    def blocks(self, pgns: list[str]) -> Iterator[list[str]]:
+        if self.report.analysis_budget is None:
+            yield pgns
+            return
+        for start in range(0, len(pgns), self.block_size):
+            yield pgns[start : start + self.block_size]
+
+    def next_depth(self) -> int:
+        report = self.report
+        if report.analysis_budget is None:
+            return report.engine_depth
+        report.refresh_from_db(fields=["seconds_per_game"])
+        deadline = report.created + timedelta(seconds=report.analysis_budget)
+        return plan_depth(
+            remaining_games=models.ChessGame.objects.filter(
+                reports=report, evaluated=False
+            ).count(),
+            remaining_seconds=(deadline - datetime.now()).total_seconds(),
+            seconds_per_game=report.seconds_per_game,
+            max_depth=report.engine_depth,
+            min_depth=settings.ENGINE_MIN_DEPTH,
+            growth=self.growth,
+            parallelism=settings.Q_CLUSTER.get("workers", 1),
+        )
+
+    def decisive_depth(self, depth: int) -> int | None:
+        """
+        Depth of positions after a decisive evaluation, searched shallower only once
+        the budget lowered `depth` - mistakes are counted from swings of evaluations,
+        which mixed depths within a game add.
+        """
+        if depth < self.report.engine_depth:
+            return settings.ENGINE_DECISIVE_DEPTH
+        return None
+
+    def record(self, depth: int, games: int, seconds: float) -> None:
+        """
+        Stores the cost of `games` evaluated at `depth` in `seconds` and the lowest
+        depth used. The cost is averaged with blocks measured before, also by
+        other workers.
+        """
+        if not games:
+            return
+        # the cost is kept at `engine_depth`, so blocks of any depth are comparable
+        cost = seconds / games * self.growth ** (self.report.engine_depth - depth)
+        models.Report.objects.filter(pk=self.report.pk).update(
+            seconds_per_game=(Coalesce(F("seconds_per_game"), Value(cost)) + cost) / 2,
+            analysis_depth=Least(Coalesce(F("analysis_depth"), Value(depth)), depth),
+        )
@@ -25,28 +25,28 @@ describe("EloOverTimeChart", () => {
   test("updates chart data based on hostName", () => {
     chart.updateChart("lichess.org");
     expect(chart.chart.data.datasets[0].data).toEqual([
-      { x: 1, y: 1 },
-      { x: 2, y: 2 },
+      { host: "lichess.org", x: 1, y: 1 },
+      { host: "lichess.org", x: 2, y: 2 },
     ]);
     expect(chart.chart.data.datasets[1].data).toEqual([]);
 
     chart.updateChart("chess.com");
     expect(chart.chart.data.datasets[0].data).toEqual([]);
     expect(chart.chart.data.datasets[1].data).toEqual([
-      { x: 3, y: 3 },
-      { x: 4, y: 4 },
+      { host: "chess.com", x: 3, y: 3 },
+      { host: "chess.com", x: 4, y: 4 },
     ]);
   });
 
   test('combines data from all sources when hostName is "all"', () => {
     chart.updateChart("all");
     expect(chart.chart.data.datasets[0].data).toEqual([
-      { x: 1, y: 1 },
-      { x: 2, y: 2 },
+      { host: "lichess.org", x: 1, y: 1 },
+      { host: "lichess.org", x: 2, y: 2 },
     ]);
     expect(chart.chart.data.datasets[1].data).toEqual([
-      { x: 3, y: 3 },
-      { x: 4, y: 4 },
+      { host: "chess.com", x: 3, y: 3 },
+      { host: "chess.com", x: 4, y: 4 },
     ]);
   });
 });
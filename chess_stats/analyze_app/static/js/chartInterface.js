@@ -15,20 +15,66 @@ class ChartInterface {
   static hosts = ["total", "chess_com", "lichess_org"];
 
   constructor(fieldName) {
-    this.data = JSON.parse($("#data").text())[fieldName];
-
+    this.fieldName = fieldName;
     this.chartId = `#${fieldName}${this.chartSuffix}`;
-    if (!this.data) {
+    const canvas = $(this.chartId)[0];
+    if (!canvas) {
       console.log("No data provided for chart initialization");
       return;
     }
-    this.chart = this.createChart(this.data["total"]);
+    // data of the chart is fetched once its canvas is scrolled into view
+    observeFirstView(canvas, () => this.load(canvas.dataset.url));
+  }
+
+  /**
+   * @static
+   * @property {number} pendingRetry - Milliseconds between loads of a statistic
+   * waiting for engine evaluation of games.
+   */
+  static pendingRetry = 10000;
+
+  async load(url, options = {}) {
+    const response = await fetch(url, options);
+    if (!response.ok) {
+      console.log(`Failed to load ${this.fieldName}: ${response.status}`);
+      return;
+    }
+    this.data = await response.json();
+    const canvas = $(this.chartId);
+    canvas.siblings(".pending").remove();
+    if (this.data.pending) {
+      canvas.before(
+        '<p class="pending text-muted">Waiting for engine analysis of games...</p>'
+      );
+      // the cached response is revalidated, it changes once games are evaluated
+      setTimeout(
+        () => this.load(url, { cache: "no-cache" }),
+        ChartInterface.pendingRetry
+      );
+      return;
+    }
+    this.init();
+  }
+
+  /**
+   * Data of the statistic for `hostName`. Series drawn per host have no `total`,
+   * it is combined from the series of all hosts.
+   */
+  hostData(hostName) {
+    if (hostName in this.data) {
+      return this.data[hostName];
+    }
+    return Object.values(this.data).filter(Array.isArray).flat();
+  }
+
+  init() {
+    this.chart = this.createChart(this.hostData("total"));
     /**
      * @property {Object} buttons - A dictionary of button names associated with hosts.
      */
     this.buttons = {};
     for (const host of ChartInterface.hosts) {
-      this.buttons[host] = `#${fieldName}_${host}`;
+      this.buttons[host] = `#${this.fieldName}_${host}`;
     }
     ChartInterface.hosts.forEach((host) => {
       $(this.buttons[host]).click(() => this.updateChart(host));
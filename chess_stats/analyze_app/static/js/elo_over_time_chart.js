@@ -5,6 +5,17 @@ class EloOverTimeChart extends ChartInterface {
     super("player_elo_over_time");
   }
 
+  load(url, options = {}) {
+    // about a point per 4 pixels of the chart, the server caps the budget
+    const width = $(this.chartId)[0].clientWidth;
+    // pending statistics are loaded again with the same url
+    if (width && !url.includes("points=")) {
+      const points = Math.max(3, Math.round(width / 4));
+      url += `${url.includes("?") ? "&" : "?"}points=${points}`;
+    }
+    return super.load(url, options);
+  }
+
   createChart(data) {
     const lichessData = data.filter((record) => record.host == "lichess.org");
     const chessComData = data.filter((record) => record.host == "chess.com");
@@ -15,14 +26,14 @@ class EloOverTimeChart extends ChartInterface {
         datasets: [
           {
             label: "Lichess elo",
-            data: lichessData.map((entry) => ({ x: entry.x, y: entry.y })),
+            data: lichessData,
             pointRadius: 2,
             tension: 0.2,
             fill: false,
           },
           {
             label: "Chess.com elo",
-            data: chessComData.map((entry) => ({ x: entry.x, y: entry.y })),
+            data: chessComData,
             pointRadius: 2,
             tension: 0.2,
             fill: false,
@@ -32,6 +43,17 @@ class EloOverTimeChart extends ChartInterface {
       options: {
         maintainAspectRatio: false,
         aspectRatio: 0.7,
+        plugins: {
+          tooltip: {
+            callbacks: {
+              // points are days, elo at the end of the day is plotted
+              afterLabel: (context) => {
+                const day = context.raw;
+                return `${day.games} games, ${day.low} - ${day.high}`;
+              },
+            },
+          },
+        },
         scales: {
           x: {
             type: "time",
@@ -52,18 +74,12 @@ class EloOverTimeChart extends ChartInterface {
   }
 
   updateChart(hostName) {
-    const data = this.data[hostName];
+    const data = this.hostData(hostName);
     const lichessData = data.filter((record) => record.host == "lichess.org");
     const chessComData = data.filter((record) => record.host == "chess.com");
 
-    this.chart.data.datasets[0].data = lichessData.map((entry) => ({
-      x: entry.x,
-      y: entry.y,
-    }));
-    this.chart.data.datasets[1].data = chessComData.map((entry) => ({
-      x: entry.x,
-      y: entry.y,
-    }));
+    this.chart.data.datasets[0].data = lichessData;
+    this.chart.data.datasets[1].data = chessComData;
 
     this.chart.update();
   }
@@ -0,0 +1,27 @@
+// follows analysis of the report, the page is reloaded with its charts once it's done
+const progress = document.getElementById("progress");
+
+if (progress) {
+  const source = new EventSource(progress.dataset.url);
+
+  source.onmessage = (event) => {
+    const data = JSON.parse(event.data);
+    if (!data.analyzed_games) {
+      return;
+    }
+    const hosts = Object.entries(data.hosts)
+      .map(([host, games]) => `${host}: ${games}`)
+      .join(", ");
+    $(progress)
+      .find(".alert")
+      .text(
+        `❗We are still analizing games please wait. ` +
+          `( ${data.analyzed_games} / ${data.games_num} )❗ ${hosts}`
+      );
+  };
+
+  source.addEventListener("done", () => {
+    source.close();
+    window.location.reload();
+  });
+}
@@ -1,5 +1,16 @@
+// callbacks run once, when their element is scrolled into view for the first time
+const onFirstView = new Map();
+
 const observer = new IntersectionObserver((entries) => {
   entries.forEach((entry) => {
+    const callback = onFirstView.get(entry.target);
+    if (entry.isIntersecting && callback) {
+      onFirstView.delete(entry.target);
+      callback();
+    }
+    if (!entry.target.classList.contains("hidden")) {
+      return;
+    }
     if (entry.isIntersecting) {
       entry.target.classList.add("show");
     } else {
@@ -8,5 +19,10 @@ const observer = new IntersectionObserver((entries) => {
   });
 });
 
+function observeFirstView(element, callback) {
+  onFirstView.set(element, callback);
+  observer.observe(element);
+}
+
 const hiddenElements = document.querySelectorAll(".hidden");
 hiddenElements.forEach((el) => observer.observe(el));
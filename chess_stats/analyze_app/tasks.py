@@ -1,71 +1,888 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from functools import partial
+from datetime import datetime
 from logging import Logger
+from threading import Lock
+from pathlib import Path
+from time import monotonic, perf_counter, time
+from typing import Callable, Iterator
 
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F, Max
+from django_q.tasks import async_task
 from easy_logs import get_logger
-import chess_insight
-from chess_insight.api_communicator import ApiCommunicator
+from chess_insight import Game
 from . import models
+from .communicators import ArchiveCommunicator, get_communicator, pgn_host, pgn_url
+from .engine_pool import get_engine_pool
+from .evaluation_cache import get_evaluation_cache
+from .imports import batched, matching_pgns, read_pgns
+from .metrics import INGEST_SECONDS, INGESTED_GAMES, save_metrics
+from .pipeline import Pipeline, Stage, measure
+from .queries import save_report_statistics
+from .scheduler import AnalysisScheduler
+
+# SQLite allows a single writer, hosts fetched concurrently take turns to save games.
+_WRITE_LOCK = Lock()
+
+
+def _begin_immediate(execute, sql, params, many, context):
+    # a deferred transaction which read before writing fails with "database is
+    # locked" instead of waiting, if a worker in another process wrote meanwhile
+    if sql == "BEGIN":
+        sql = "BEGIN IMMEDIATE"
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def _write_transaction():
+    """
+    `transaction.atomic` taking the write lock of SQLite when it starts, so writers
+    of all qcluster workers wait for each other for the busy timeout.
+    Threads of this process take turns on `_WRITE_LOCK` before that.
+    """
+    connection = transaction.get_connection()
+    with _WRITE_LOCK, connection.execute_wrapper(_begin_immediate):
+        with transaction.atomic():
+            yield
 
 
 def get_games(
     report: models.Report, logger: Logger = get_logger(lvl=10), *args, **kwargs
 ) -> None:
-    games_num_per_host = report.games_num // sum(
-        1 if host else 0
-        for host in [report.chess_com_username, report.lichess_username]
+    """
+    Ingests games in two phases. Games of all hosts are fetched and stored right
+    away with their results, openings, ratings and move times, so the report is
+    complete without the engine. Then they are evaluated in chunks of
+    `INGEST_CHUNK_SIZE` games by `analyze_chunk` tasks spread across qcluster
+    workers, statistics of the engine are pending until the last chunk.
+    Once games are stored, a retried task only enqueues the chunks left.
+    """
+    if models.ReportChunk.objects.filter(report=report).exists():
+        _enqueue_chunks(report, logger)
+        return
+    hosts = _get_report_hosts(report)
+    games_num_per_host = report.games_num // len(hosts)
+    stored, failures = _get_hosts_games(
+        report,
+        logger,
+        {
+            host: (username, games_num_per_host, None)
+            for host, username in hosts.items()
+        },
+        analyze=False,
+    )
+    _drop_stored_games(report, list(failures))
+    report.refresh_from_db()
+    report.fail_reason = _format_failures(failures) if failures else None
+    if len(failures) == len(hosts):
+        report.analyzed_games = -1
+        report.save()
+        _save_metrics(logger)
+        raise next(iter(failures.values()))
+    pgns = {}
+    for host, (host_pgns, errors) in stored.items():
+        pgns[host] = host_pgns
+        if errors:
+            failures[host] = errors[0]
+            report.fail_reason = _format_failures(failures)
+    with _write_transaction():
+        _create_chunks(report, hosts, pgns)
+        # games reused by an interrupted attempt were counted twice
+        report.analyzed_games = models.ReportGame.objects.filter(report=report).count()
+        report.save()
+    finish_report(report, logger)
+    _enqueue_chunks(report, logger)
+    _save_metrics(logger)
+
+
+def resume_report(
+    report: models.Report, logger: Logger = get_logger(lvl=10), *args, **kwargs
+) -> None:
+    """
+    Continues ingestion interrupted e.g. by a restart of qcluster workers.
+    Chunks left get new attempts, a report without chunks is fetched again.
+    """
+    models.ReportChunk.objects.filter(report=report).update(attempts=0)
+    get_games(report, logger)
+
+
+def analyze_chunk(
+    chunk_id: int, logger: Logger = get_logger(lvl=10), *args, **kwargs
+) -> None:
+    """
+    Evaluates games of a chunk stored by `get_games`, after games evaluated by
+    earlier attempts, at depths planned by `AnalysisScheduler` to fit the analysis
+    budget of the report. Failed attempts are retried by qcluster up to
+    `max_attempts` times, the last failure is kept in the report and its games
+    stay unevaluated.
+    """
+    try:
+        chunk = models.ReportChunk.objects.select_related("report").get(pk=chunk_id)
+    except models.ReportChunk.DoesNotExist:
+        logger.info(f"Chunk {chunk_id} is already analyzed")
+        return
+    models.ReportChunk.objects.filter(pk=chunk_id).update(attempts=F("attempts") + 1)
+    chunk.attempts += 1
+    failure = None
+    scheduler = AnalysisScheduler(chunk.report)
+    try:
+        for pgns in scheduler.blocks(chunk.pgns[chunk.analyzed :]):
+            depth = scheduler.next_depth()
+            start = monotonic()
+            _analyze_games(
+                chunk.report,
+                logger,
+                chunk.username,
+                pgns,
+                chunk,
+                save=partial(_save_evaluations, depth=depth),
+                depth=depth,
+                decisive_depth=scheduler.decisive_depth(depth),
+            )
+            scheduler.record(depth, len(pgns), monotonic() - start)
+    except Exception as exc:
+        logger.error(f"Failed to evaluate games from {chunk.host}: {exc}")
+        max_attempts = settings.Q_CLUSTER.get("max_attempts", 0)
+        if not max_attempts or chunk.attempts < max_attempts:
+            _save_metrics(logger)
+            raise exc
+        failure = exc
+    with _write_transaction():
+        # writers wait for each other, so the chunk is finished by a single task -
+        # a duplicate one of a resumed report deletes nothing - and only the task of
+        # the last chunk sees no chunks left
+        finished, _ = models.ReportChunk.objects.filter(pk=chunk.pk).delete()
+        if finished and failure:
+            # the first failure is kept, like failures of hosts
+            models.Report.objects.filter(pk=chunk.report_id, fail_reason=None).update(
+                fail_reason=_format_failures({chunk.host: failure})
+            )
+            _drop_unevaluated_games(chunk)
+        pending = models.ReportChunk.objects.filter(report_id=chunk.report_id).exists()
+    if not finished:
+        logger.info(f"Chunk {chunk_id} was finished by another task")
+    elif not pending:
+        finish_report(chunk.report, logger)
+    _save_evaluation_cache(logger)
+    _save_metrics(logger)
+    if failure and finished:
+        raise failure
+
+
+def _drop_stored_games(report: models.Report, hosts: list[str]) -> None:
+    """
+    Removes games stored before fetching games of `hosts` failed from the report,
+    they have no chunks to evaluate them. The games stay stored for other reports.
+    The progress is rolled back in the same transaction, so it never counts them.
+    """
+    if hosts:
+        with _write_transaction():
+            dropped, _ = models.ReportGame.objects.filter(
+                report=report, game__host__in=hosts, game__evaluated=False
+            ).delete()
+            models.Report.objects.filter(pk=report.pk).update(
+                analyzed_games=F("analyzed_games") - dropped
+            )
+
+
+def _drop_unevaluated_games(chunk: models.ReportChunk) -> None:
+    """
+    Removes games the chunk failed to evaluate from its report, so statistics of
+    the engine aren't pending forever. The games stay stored for other reports.
+    """
+    dropped, _ = models.ReportGame.objects.filter(
+        report_id=chunk.report_id,
+        game__url__in=[pgn_url(pgn) for pgn in chunk.pgns],
+        game__username=chunk.username,
+        game__evaluated=False,
+    ).delete()
+    models.Report.objects.filter(pk=chunk.report_id).update(
+        analyzed_games=F("analyzed_games") - dropped
     )
-    hosts = {
-        "chess.com": report.chess_com_username,
-        "lichess.org": report.lichess_username,
+
+
+def _games_at_depth(
+    report: models.Report, stored: list[tuple], username: str, depth: int
+) -> list[tuple]:
+    """
+    Links the report to games stored at `depth` instead of the `stored` rows, so a
+    shallower evaluation neither overwrites rows other reports share nor is reused
+    as evaluated deeper. Games not stored at that depth yet are copied to it.
+    Returns rows `(id, url, player_id, opponent_id)` of the games to evaluate.
+    """
+    existing = {
+        row[1]: row
+        for row in models.ChessGame.objects.filter(
+            url__in=[row[1] for row in stored], username=username, engine_depth=depth
+        ).values_list("id", "url", "player_id", "opponent_id")
     }
+    copies = {}
+    for game in models.ChessGame.objects.filter(
+        id__in=[row[0] for row in stored if row[1] not in existing]
+    ).select_related("player", "opponent"):
+        original = game.pk
+        for player in (game.player, game.opponent):
+            player.pk = None
+        game.pk, game.engine_depth, game.evaluated = None, depth, False
+        copies[original] = game
+    models.SingleGamePlayer.objects.bulk_create(
+        [player for game in copies.values() for player in (game.player, game.opponent)]
+    )
+    for game in copies.values():
+        # ids of the players are set once they are created
+        game.player, game.opponent = game.player, game.opponent
+    models.ChessGame.objects.bulk_create(copies.values())
+    for game in copies.values():
+        existing[game.url] = (game.pk, game.url, game.player_id, game.opponent_id)
+    for game_id, url, _, _ in stored:
+        models.ReportGame.objects.filter(report=report, game_id=game_id).update(
+            game_id=existing[url][0]
+        )
+    return [existing[row[1]] for row in stored]
 
-    for host, username in hosts.items():
-        if username:
-            communicator = chess_insight.get_communicator(
-                host,
-                report.engine_depth,
-                "./stockfish.exe",
+
+def _create_chunks(
+    report: models.Report, usernames: dict[str, str], pgns: dict[str, list[str]]
+) -> list[int]:
+    """
+    Splits `pgns` of games stored without the engine, per host, into chunks of
+    `INGEST_CHUNK_SIZE` games evaluated by `analyze_chunk` tasks.
+    `usernames` are per host. Returns ids of the chunks.
+    """
+    size = settings.INGEST_CHUNK_SIZE
+    chunks = models.ReportChunk.objects.bulk_create(
+        [
+            models.ReportChunk(
+                report=report,
+                host=host,
+                username=usernames[host],
+                pgns=host_pgns[start : start + size],
             )
-            # valid_name = communicator.get_valid_username(username) # TODO uncomment
-            valid_name = username
-            if not valid_name:
-                report.fail_reason = f"Connection issues or user {username} is invalid"
-                report.analyzed_games = -1
-                report.save()
-                return
-            username = valid_name
-            report.save()
-            logger.info(f"User {username} is valid. Getting games from {host}")
-            try:
-                _update_report(
-                    report, logger, username, communicator, games_num_per_host
-                )
-            except Exception as exc:
-                logger.error(exc)
-                report.analyzed_games = -1
-                report.fail_reason = str(exc)
-                report.save()
-                raise exc
+            for host, host_pgns in pgns.items()
+            for start in range(0, len(host_pgns), size)
+        ]
+    )
+    return [chunk.pk for chunk in chunks]
+
+
+def _enqueue_chunks(
+    report: models.Report, logger: Logger, chunks: list[int] = None
+) -> None:
+    """Enqueues `chunks` of the report, all of them by default."""
+    if chunks is None:
+        chunks = list(
+            models.ReportChunk.objects.filter(report=report).values_list(
+                "pk", flat=True
+            )
+        )
+    logger.info(f"Evaluation of report {report.pk} is split into {len(chunks)} chunks")
+    for chunk_id in chunks:
+        async_task(analyze_chunk, chunk_id, group=f"report-{report.pk}")
+
+
+def finish_report(report: models.Report, logger: Logger = get_logger(lvl=10)) -> None:
+    """
+    Sets the number of games to the analyzed ones, the report is then complete.
+    Called again once its games are evaluated, to update statistics of the engine.
+    """
+    report.refresh_from_db()
+    if not report.analyzed_games and report.fail_reason:
+        report.analyzed_games = -1
+        report.save()
+        logger.error(f"Report {report.pk} failed: {report.fail_reason}")
+        return
     logger.info(f"Analyzed {report.analyzed_games} games. Report is ready 😍 ")
     report.games_num = report.analyzed_games
+    report.save()
+    if report.is_complete:
+        save_report_statistics(report, logger)
+
+
+def refresh_report(
+    report: models.Report, logger: Logger = get_logger(lvl=10), *args, **kwargs
+) -> None:
+    """
+    Appends games played after the newest stored game of each host, then drops
+    the oldest games, so each host keeps as many games as before.
+    Hosts without stored games are fetched like in `get_games`. New games are
+    stored without the engine and evaluated by `analyze_chunk` tasks, within the
+    analysis budget of the report, however long the report wasn't refreshed.
+    """
+    hosts = _get_report_hosts(report)
+    stored = {
+        row["host"]: row
+        for row in models.ChessGame.objects.filter(reports=report)
+        .values("host")
+        .annotate(count=Count("id"), newest=Max("date"))
+    }
+    limits = {
+        host: stored[host]["count"]
+        if host in stored
+        else report.games_num // len(hosts)
+        for host in hosts
+    }
+    # the number of games may not change, so the snapshot can't be validated by it
+    models.ReportStatistics.objects.filter(report=report).delete()
+    new, failures = _get_hosts_games(
+        report,
+        logger,
+        {
+            host: (username, limits[host], stored.get(host, {}).get("newest"))
+            for host, username in hosts.items()
+        },
+        analyze=False,
+    )
+    _drop_stored_games(report, list(failures))
+    for host, limit in limits.items():
+        _trim_games(report, host, limit)
+    report.refresh_from_db()
+    failed = len(failures) == len(hosts)
+    pgns = {}
+    for host, (host_pgns, errors) in new.items():
+        pgns[host] = host_pgns
+        if errors:
+            failures[host] = errors[0]
+    report.fail_reason = _format_failures(failures) if failures else None
+    with _write_transaction():
+        chunks = _create_chunks(report, hosts, pgns)
+        report.analyzed_games = models.ReportGame.objects.filter(report=report).count()
+        report.save()
+    finish_report(report, logger)
+    _enqueue_chunks(report, logger, chunks)
+    _save_metrics(logger)
+    if failed:
+        raise next(iter(failures.values()))
+    logger.info(f"Refreshed report {report.pk}, it has {report.analyzed_games} games")
+
+
+def import_games(
+    report: models.Report,
+    path: str,
+    username: str = None,
+    logger: Logger = get_logger(lvl=10),
+    limit: int = None,
+    delete: bool = False,
+    *args,
+    **kwargs,
+) -> None:
+    """
+    Adds games of `username` from a PGN file or a lichess NDJSON export to the
+    report, up to `limit` standard games of its time class in file order.
+    Without `username` games of each host are of the username of the report on it,
+    e.g. for an upload, whose form has usernames of both hosts filled in.
+    The file is streamed twice, once to count the games, then in blocks of
+    `IMPORT_BLOCK_SIZE` games, so files of any size fit in memory.
+    Like `get_games`, games are stored without the engine, so the report is
+    complete right away, then evaluated by `analyze_chunk` tasks.
+    Games which can't be read are skipped and counted in `fail_reason`.
+    `delete` removes the file afterwards, e.g. an uploaded one, a failed import
+    then fails the report, as retried tasks can't read the file again.
+    """
+    try:
+        if username:
+            usernames = dict.fromkeys(["chess.com", "lichess.org"], username)
+        else:
+            usernames = _get_report_hosts(report)
+        _import_games(report, path, usernames, logger, limit)
+    except Exception as exc:
+        if delete:
+            models.Report.objects.filter(pk=report.pk).update(
+                analyzed_games=-1, fail_reason=f"Failed to import games: {exc}"
+            )
+        raise exc
+    finally:
+        if delete:
+            Path(path).unlink(missing_ok=True)
+        _save_metrics(logger)
+
+
+def _import_games(
+    report: models.Report,
+    path: str,
+    usernames: dict[str, str],
+    logger: Logger,
+    limit: int,
+) -> None:
+    hosts, total = set(), 0
+    for pgn in matching_pgns(read_pgns(path), report.time_class, limit):
+        hosts.add(pgn_host(pgn))
+        total += 1
+    logger.info(f"Importing {total} games from {path}")
+    report.refresh_from_db()
+    report.games_num = max(report.analyzed_games, 0) + total
+    report.save()
+    errors, chunks = [], []
+    try:
+        pgns = matching_pgns(read_pgns(path), report.time_class, limit)
+        for block in batched(pgns, settings.IMPORT_BLOCK_SIZE):
+            chunks += _store_games(report, logger, usernames, block, errors)
+    except Exception as exc:
+        # games of a failed import aren't evaluated
+        models.ReportChunk.objects.filter(pk__in=chunks).delete()
+        raise exc
+    for error in errors:
+        logger.error(f"Skipped a game which failed to be read: {error}")
+    report.refresh_from_db()
+    # a game exported twice is counted once
+    report.analyzed_games = models.ReportGame.objects.filter(report=report).count()
+    if "chess.com" in hosts and not report.chess_com_username:
+        report.chess_com_username = usernames.get("chess.com", "")
+    if "lichess.org" in hosts and not report.lichess_username:
+        report.lichess_username = usernames.get("lichess.org", "")
+    if errors:
+        report.fail_reason = f"Skipped {len(errors)} games which failed to import"
+    if not report.analyzed_games:
+        report.fail_reason = report.fail_reason or "No games to import"
+    report.save()
+    finish_report(report, logger)
+    if report.analyzed_games > 0:
+        _enqueue_chunks(report, logger, chunks)
+
+
+def _store_games(
+    report: models.Report,
+    logger: Logger,
+    usernames: dict[str, str],
+    pgns: list[str],
+    errors: list,
+) -> list[int]:
+    """
+    Stores a block of imported games without the engine, in batches of
+    `INGEST_BATCH_SIZE`, and splits them into chunks for `analyze_chunk`.
+    Games are read as played by the username of their host in `usernames`.
+    Games analyzed for other reports are added to the report instead, games
+    failing to be read or of hosts without a username are skipped and collected
+    in `errors`. Returns ids of the chunks.
+    """
+    hosts = {}
+    for pgn in pgns:
+        hosts.setdefault(pgn_host(pgn), []).append(pgn)
+    stored = {}
+    for host, host_pgns in hosts.items():
+        username = usernames.get(host)
+        if not username:
+            errors.extend(ValueError(f"No username for {host}") for _ in host_pgns)
+            continue
+        analyzed = _find_analyzed_games(username, report.engine_depth, host_pgns)
+        if analyzed:
+            _link_games(report, list(analyzed.values()))
+            logger.info(f"Reused {len(analyzed)} games analyzed for other reports")
+        host_pgns = [pgn for pgn in host_pgns if pgn_url(pgn) not in analyzed]
+        for batch in batched(host_pgns, settings.INGEST_BATCH_SIZE):
+            games = []
+            for pgn in batch:
+                try:
+                    with INGEST_SECONDS.time(stage="metadata"):
+                        games.append(Game(pgn, username))
+                except Exception as exc:  # pylint: disable=broad-except
+                    errors.append(exc)
+                    continue
+                stored.setdefault(host, []).append(pgn)
+            if games:
+                _save_games(report, games, evaluated=False)
+    with _write_transaction():
+        return _create_chunks(report, usernames, stored)
+
+
+def _get_report_hosts(report: models.Report) -> dict[str, str]:
+    return {
+        host: username
+        for host, username in {
+            "chess.com": report.chess_com_username,
+            "lichess.org": report.lichess_username,
+        }.items()
+        if username
+    }
+
+
+def _get_hosts_games(
+    report: models.Report,
+    logger: Logger,
+    jobs: dict[str, tuple[str, int, datetime | None]],
+    analyze: bool = True,
+) -> tuple[dict[str, tuple[list[str], list[Exception]]], dict[str, Exception]]:
+    """
+    Fetches and analyzes games of all hosts concurrently.
+    `jobs` maps hosts to `(username, games_num, since)`, failures are returned per host.
+    Without `analyze` games are stored for `analyze_chunk`, their PGNs and errors
+    of skipped games are returned per host, see `_update_report`.
+    """
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = {
+            host: executor.submit(
+                _get_host_games, report.pk, logger, host, *job, analyze=analyze
+            )
+            for host, job in jobs.items()
+        }
+    pgns = {
+        host: future.result()
+        for host, future in futures.items()
+        if not future.exception()
+    }
+    failures = {
+        host: future.exception()
+        for host, future in futures.items()
+        if future.exception()
+    }
+    return pgns, failures
+
+
+def _format_failures(failures: dict[str, Exception]) -> str:
+    return "; ".join(f"{host}: {exc}" for host, exc in failures.items())
+
+
+def _trim_games(report: models.Report, host: str, limit: int) -> None:
+    """
+    Removes games of `host` older than the newest `limit` ones from the report.
+    The games stay stored for other reports.
+    """
+    outdated = list(
+        models.ReportGame.objects.filter(report=report, game__host=host)
+        .order_by("-game__date", "-game_id")
+        .values_list("id", flat=True)[limit:]
+    )
+    if outdated:
+        with _WRITE_LOCK:
+            models.ReportGame.objects.filter(id__in=outdated).delete()
+
+
+def _save_evaluation_cache(logger: Logger) -> None:
+    cache = get_evaluation_cache(logger)
+    logger.info(f"Evaluation cache: {cache.stats()}")
+    try:
+        cache.save()
+    except OSError as exc:
+        logger.error(f"Failed to save evaluations: {exc}")
+
+
+def _save_metrics(logger: Logger) -> None:
+    try:
+        save_metrics()
+    except OSError as exc:
+        logger.error(f"Failed to save metrics: {exc}")
+
+
+def _get_host_games(
+    report_id: int,
+    logger: Logger,
+    host: str,
+    username: str,
+    games_num: int,
+    since: datetime = None,
+    analyze: bool = True,
+) -> tuple[list[str], list[Exception]]:
+    """
+    Runs in its own thread, so it uses its own report instance and database connection.
+    """
+    try:
+        report = models.Report.objects.get(pk=report_id)
+        communicator = get_communicator(host)
+        # valid_name = communicator.get_valid_username(username) # TODO uncomment
+        valid_name = username
+        if not valid_name:
+            raise ValueError(f"Connection issues or user {username} is invalid")
+        logger.info(f"User {valid_name} is valid. Getting games from {host}")
+        return _update_report(
+            report, logger, valid_name, communicator, games_num, since, analyze
+        )
+    except Exception as exc:
+        logger.error(f"Failed to get games from {host}: {exc}")
+        raise exc
+    finally:
+        connections.close_all()
 
 
 def _update_report(
     report: models.Report,
     logger: Logger,
     username: str,
-    communicator: ApiCommunicator,
+    communicator: ArchiveCommunicator,
     games_num: int,
+    since: datetime = None,
+    analyze: bool = True,
+) -> tuple[list[str], list[Exception]]:
+    """
+    Adds the newest `games_num` games of `username`, played after `since`.
+    Games are fetched, parsed and analyzed by stages of a `Pipeline` working at
+    once, while this thread saves them in batches, so the progress is visible.
+    Games analyzed for other reports are added to the report instead.
+    Without `analyze` games are stored without the engine for `analyze_chunk`,
+    games failing to be read are skipped. Returns PGNs of the games stored that
+    way and errors of the skipped ones.
+    """
+    analyzed = _find_analyzed_games(
+        username, report.engine_depth, host=communicator.HOST
+    )
+    pool = get_engine_pool() if analyze else None
+
+    def parse(pgn: str) -> tuple[str, int | None]:
+        return pgn, analyzed.get(pgn_url(pgn))
+
+    def read(item: tuple[str, int | None]) -> tuple[str, Game | int]:
+        pgn, game_id = item
+        if game_id:
+            return item
+        if analyze:
+            return pgn, pool.analyze_game(pgn, username, report.engine_depth)
+        with INGEST_SECONDS.time(stage="metadata"):
+            return pgn, Game(pgn, username)
+
+    stage = "analysis" if analyze else "metadata"
+    workers = settings.INGEST_WORKERS
+    pipeline = Pipeline(
+        [
+            Stage("parse", parse, workers.get("parse", 1)),
+            Stage(stage, read, workers.get(stage, settings.ENGINE_POOL_SIZE)),
+        ],
+        capacity=settings.INGEST_QUEUE_SIZE,
+    )
+    save = _save_games if analyze else partial(_save_games, evaluated=False)
+    errors = None if analyze else []
+    stored, batch, reused = [], [], []
+    last_save = time()
+    pgns = _fetched(
+        communicator.iter_pgns(username, games_num, report.time_class, since)
+    )
+    with closing(pipeline.run(pgns, "fetch", errors)) as games:
+        for pgn, game in games:
+            if isinstance(game, int):
+                reused.append(game)
+            else:
+                batch.append(game)
+                stored.append(pgn)
+            if (
+                len(batch) + len(reused) >= settings.INGEST_BATCH_SIZE
+                or time() - last_save >= settings.INGEST_PROGRESS_INTERVAL
+            ):
+                _write_games(report, logger, communicator.HOST, batch, reused, save)
+                batch, reused = [], []
+                last_save = time()
+    _write_games(report, logger, communicator.HOST, batch, reused, save)
+    for error in errors or []:
+        logger.error(f"Skipped a game which failed to be read: {error}")
+    if not analyze:
+        logger.info(f"Stored {len(stored)} games of {username}, evaluating them next")
+    return stored, errors or []
+
+
+def _fetched(pgns: Iterator[str]) -> Iterator[str]:
+    """`pgns`, the time spent downloading them is observed as the fetch stage."""
+    seconds = 0
+    try:
+        while True:
+            start = perf_counter()
+            try:
+                pgn = next(pgns)
+            except StopIteration:
+                return
+            finally:
+                seconds += perf_counter() - start
+            yield pgn
+    finally:
+        INGEST_SECONDS.observe(seconds, stage="fetch")
+
+
+def _write_games(
+    report: models.Report,
+    logger: Logger,
+    host: str,
+    games: list[Game],
+    reused: list[int],
+    save: Callable,
+) -> None:
+    """Persist stage of `_update_report`, saves a batch of games and links reused ones."""
+    with measure("write", len(games) + len(reused)):
+        if reused:
+            _link_games(report, reused)
+            INGESTED_GAMES.inc(len(reused), host=host, source="reused")
+            logger.info(f"Reused {len(reused)} games analyzed for other reports")
+        if games:
+            save(report, games)
+    if games or reused:
+        logger.debug(f"Analyzed {report.analyzed_games} games")
+
+
+def _analyze_games(
+    report: models.Report,
+    logger: Logger,
+    username: str,
+    pgns: list[str],
+    chunk: models.ReportChunk = None,
+    errors: list = None,
+    save: Callable = None,
+    depth: int = None,
+    decisive_depth: int = None,
 ) -> None:
-    for game in communicator.games_generator(username, games_num, report.time_class):
-        opponent = models.SingleGamePlayer(**game.opponent.asdict())
-        player = models.SingleGamePlayer(**game.player.asdict())
-        game_dict = game.asdict()  # remove player and opponent from game_dict
-        del game_dict["player"]
-        del game_dict["opponent"]
-        obj = models.ChessGame(
-            **game_dict, report=report, player=player, opponent=opponent
+    """
+    Analyzes games `depth` deep (`engine_depth` of the report by default) and saves
+    them in batches, so the progress is visible. Positions after a decisive
+    evaluation are searched `decisive_depth` deep, see `EnginePool.analyze`.
+    Saved games are counted as analyzed by the `chunk` they come from.
+    Games failing to be analyzed raise, unless they are collected in `errors`.
+    `save` is `_save_games` by default, `_save_evaluations` for stored games.
+    """
+    save = save or _save_games
+    depth = depth or report.engine_depth
+    batch = []
+    last_save = time()
+    pool = get_engine_pool()
+    if errors is None:
+        games = pool.analyze(pgns, username, depth, decisive_depth=decisive_depth)
+    else:
+        games = pool.analyze(
+            pgns, username, depth, errors=errors, decisive_depth=decisive_depth
         )
-        report.analyzed_games += 1
-        report.save()
-        obj.save()
+    for game in games:
+        batch.append(game)
+        if (
+            len(batch) >= settings.INGEST_BATCH_SIZE
+            or time() - last_save >= settings.INGEST_PROGRESS_INTERVAL
+        ):
+            save(report, batch, chunk)
+            batch = []
+            last_save = time()
+            logger.debug(f"Analyzed {report.analyzed_games} games")
+    if batch:
+        save(report, batch, chunk)
         logger.debug(f"Analyzed {report.analyzed_games} games")
+
+
+def _find_analyzed_games(
+    username: str, depth: int, pgns: list[str] = None, host: str = None
+) -> dict[str, int]:
+    """
+    Ids of stored games of `username` evaluated at least `depth` deep, the deepest
+    per url. Only games of `pgns`, or all games from `host`, so games can be
+    matched while they are fetched - both are looked up by an index.
+    Games still waiting for evaluation are evaluated again by each report.
+    """
+    games = models.ChessGame.objects.filter(
+        username=username, engine_depth__gte=depth, evaluated=True
+    )
+    if pgns is not None:
+        games = games.filter(url__in={pgn_url(pgn) for pgn in pgns})
+    if host:
+        games = games.filter(host=host)
+    return dict(games.order_by("engine_depth").values_list("url", "id"))
+
+
+def _link_games(report: models.Report, game_ids: list[int]) -> None:
+    """Adds stored games to the report and counts them as analyzed."""
+    with _write_transaction():
+        models.ReportGame.objects.bulk_create(
+            [models.ReportGame(report_id=report.pk, game_id=id) for id in game_ids],
+            ignore_conflicts=True,
+        )
+        models.Report.objects.filter(pk=report.pk).update(
+            analyzed_games=F("analyzed_games") + len(game_ids)
+        )
+    report.analyzed_games += len(game_ids)
+
+
+def _save_games(
+    report: models.Report,
+    games: list[Game],
+    chunk: models.ReportChunk = None,
+    evaluated: bool = True,
+) -> None:
+    """
+    Writes analyzed games with their players and updates the report progress
+    in one transaction - a few queries per batch instead of per game.
+    Games stored meanwhile by another report are linked instead.
+    Games read without the engine are saved as not `evaluated`.
+    """
+    objs = {}
+    for game in games:
+        game_dict = game.asdict()
+        player = models.SingleGamePlayer(**game_dict.pop("player"))
+        opponent = models.SingleGamePlayer(**game_dict.pop("opponent"))
+        objs[game_dict["url"]] = models.ChessGame(
+            **game_dict,
+            engine_depth=report.engine_depth,
+            evaluated=evaluated,
+            player=player,
+            opponent=opponent,
+        )
+    start = perf_counter()
+    with _write_transaction():
+        stored = dict(
+            models.ChessGame.objects.filter(
+                url__in=objs,
+                username=game_dict["username"],
+                engine_depth=report.engine_depth,
+            ).values_list("url", "id")
+        )
+        new = [obj for url, obj in objs.items() if url not in stored]
+        models.SingleGamePlayer.objects.bulk_create(
+            [player for obj in new for player in (obj.player, obj.opponent)]
+        )
+        models.ChessGame.objects.bulk_create(new)
+        models.ReportGame.objects.bulk_create(
+            [
+                models.ReportGame(report_id=report.pk, game_id=game_id)
+                for game_id in [*stored.values(), *(obj.pk for obj in new)]
+            ],
+            # e.g. a game exported twice to an imported file
+            ignore_conflicts=True,
+        )
+        models.Report.objects.filter(pk=report.pk).update(
+            analyzed_games=F("analyzed_games") + len(objs)
+        )
+        if chunk:
+            models.ReportChunk.objects.filter(pk=chunk.pk).update(
+                analyzed=F("analyzed") + len(objs)
+            )
+    # waiting for the lock is part of writing
+    INGEST_SECONDS.observe(
+        (perf_counter() - start) / len(objs), count=len(objs), stage="write"
+    )
+    INGESTED_GAMES.inc(len(objs), host=game_dict["host"], source="analyzed")
+    report.analyzed_games += len(objs)
+
+
+def _save_evaluations(
+    report: models.Report,
+    games: list[Game],
+    chunk: models.ReportChunk,
+    depth: int = None,
+) -> None:
+    """
+    Writes mistakes of games evaluated by the engine to the games stored by the
+    metadata phase, and moves the cursor of the `chunk` in the same transaction.
+    Games evaluated shallower than `engine_depth` are stored as their own rows at
+    the `depth` used, see `_games_at_depth`.
+    """
+    evaluations = {game.url: game.asdict() for game in games}
+    start = perf_counter()
+    with _write_transaction():
+        stored = list(
+            models.ChessGame.objects.filter(
+                url__in=evaluations,
+                username=chunk.username,
+                engine_depth=report.engine_depth,
+            ).values_list("id", "url", "player_id", "opponent_id")
+        )
+        if depth and depth < report.engine_depth:
+            stored = _games_at_depth(report, stored, chunk.username, depth)
+        players = []
+        for _, url, player_id, opponent_id in stored:
+            for pk, side in ((player_id, "player"), (opponent_id, "opponent")):
+                player = models.SingleGamePlayer(pk=pk)
+                player.evaluation = evaluations[url][side]["evaluation"]
+                players.append(player)
+        models.SingleGamePlayer.objects.bulk_update(
+            players,
+            [f"{phase}_{kind}" for phase in models.PHASES for kind in models.MISTAKES],
+        )
+        models.ChessGame.objects.filter(id__in=[row[0] for row in stored]).update(
+            evaluated=True
+        )
+        models.ReportChunk.objects.filter(pk=chunk.pk).update(
+            analyzed=F("analyzed") + len(games)
+        )
+    INGEST_SECONDS.observe(
+        (perf_counter() - start) / len(games), count=len(games), stage="write"
+    )
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tiny UCI engine speaking just enough of the protocol for the `stockfish` package.
+Evaluation is the material balance. Every search sleeps `FAKE_UCI_ENGINE_DELAY`
+seconds to simulate the time a real engine spends on it.
+"""
+import os
+import sys
+import time
+
+import chess
+
+VALUES = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 300, chess.ROOK: 500}
+VALUES[chess.QUEEN] = 900
+DELAY = float(os.environ.get("FAKE_UCI_ENGINE_DELAY", 0))
+
+
+def send(*lines: str) -> None:
+    sys.stdout.write("".join(line + "\n" for line in lines))
+    sys.stdout.flush()
+
+
+def set_position(args: list[str]) -> chess.Board:
+    moves = args.index("moves") if "moves" in args else len(args)
+    board = chess.Board(" ".join(args[1:moves])) if args[0] == "fen" else chess.Board()
+    for move in args[moves + 1 :]:
+        board.push_uci(move)
+    return board
+
+
+def go(board: chess.Board, args: list[str]) -> None:
+    if "searchmoves" in args:
+        move = args[args.index("searchmoves") + 1]
+        legal = move in {m.uci() for m in board.legal_moves}
+        send(f"bestmove {move if legal else '(none)'}")
+        return
+    time.sleep(DELAY)
+    score = sum(
+        VALUES.get(piece.piece_type, 0) * (1 if piece.color == board.turn else -1)
+        for piece in board.piece_map().values()
+    )
+    best = next(iter(board.legal_moves), None)
+    depth = args[args.index("depth") + 1] if "depth" in args else "1"
+    send(
+        f"info depth {depth} score cp {score} nodes 1",
+        f"bestmove {best.uci() if best else '(none)'}",
+    )
+
+
+def main() -> None:
+    board = chess.Board()
+    send("Stockfish 16 by the fake engine authors")
+    for line in sys.stdin:
+        command, *args = line.split() or [""]
+        if command == "uci":
+            send("id name Stockfish 16", "option name Hash type spin", "uciok")
+        elif command == "isready":
+            send("readyok")
+        elif command == "ucinewgame":
+            board = chess.Board()
+        elif command == "position" and args and args[0] in ("fen", "startpos"):
+            board = set_position(args)
+        elif command == "d":
+            send(f"Fen: {board.fen()}", "Key: 0", "Checkers: ")
+        elif command == "go":
+            go(board, args)
+        elif command == "quit":
+            return
+
+
+if __name__ == "__main__":
+    main()
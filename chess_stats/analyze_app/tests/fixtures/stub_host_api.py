@@ -0,0 +1,82 @@
+"""
+Local HTTP server standing in for host APIs, so fetching is tested offline.
+Routes map paths to responses, a list of responses is answered one by one.
+"""
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import monotonic, sleep
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubResponse:
+    def __init__(
+        self, body: str | dict = "", status: int = 200, headers: dict = None, delay=0
+    ) -> None:
+        self.body = json.dumps(body) if isinstance(body, dict) else body
+        self.status = status
+        self.headers = headers or {}
+        self.delay = delay
+
+
+class StubHostApi:
+    """
+    Serves `routes` on localhost while used as a context manager. Requests are
+    recorded as `(path, query, time)` and their headers in `headers`, `active`
+    counts requests being answered.
+    """
+
+    def __init__(self, routes: dict[str, StubResponse | list[StubResponse]]) -> None:
+        self.routes = routes
+        self.requests = []
+        self.headers = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self) -> "StubHostApi":
+        Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _respond(self, path: str) -> StubResponse:
+        with self._lock:
+            response = self.routes.get(path, StubResponse(status=404))
+            if isinstance(response, list):
+                response = response.pop(0) if len(response) > 1 else response[0]
+            return response
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=invalid-name
+                url = urlsplit(self.path)
+                with stub._lock:
+                    stub.requests.append((url.path, parse_qs(url.query), monotonic()))
+                    stub.headers.append(dict(self.headers))
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                response = stub._respond(url.path)
+                sleep(response.delay)
+                # the client may start its next request as soon as it reads the
+                # body, so the request stops being active before it is sent
+                with stub._lock:
+                    stub.active -= 1
+                body = response.body.encode()
+                self.send_response(response.status)
+                for name, value in response.headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
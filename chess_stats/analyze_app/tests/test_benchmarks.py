@@ -0,0 +1,67 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from easy_logs import get_logger
+from ..benchmarks.reports import synthetic_report
+from ..benchmarks.statistics import benchmark_statistics, compare
+from ..models import ChessGame, Report
+from ..queries import QueriesMaker
+
+
+class StatisticsBenchmarkTest(TestCase):
+    def test_synthetic_report_mixes_games(self):
+        report = synthetic_report(300, seed=1)
+        games = ChessGame.objects.filter(reports=report)
+        self.assertEqual(games.count(), 300)
+        self.assertTrue(report.is_complete)
+        for field in ["host", "player_color", "result", "end_reason", "opening"]:
+            self.assertGreater(games.values(field).distinct().count(), 1, field)
+        dates = [game.date for game in games.order_by("date")]
+        self.assertGreater((dates[-1] - dates[0]).days, 700)
+
+    def test_every_statistic_is_measured(self):
+        report = synthetic_report(50)
+        results = benchmark_statistics(report, get_logger(lvl=50), repeat=1)
+        methods = QueriesMaker(report, get_logger(lvl=50)).get_methods
+        self.assertEqual(set(results), {*methods, "asdict", "columnar_asdict"})
+        self.assertEqual(results["columnar_asdict"]["queries"], 1)
+        for result in results.values():
+            self.assertEqual(set(result), {"seconds", "queries", "peak_kib"})
+
+    def test_regressions_are_compared_with_baseline(self):
+        baseline = {"100": {"asdict": {"seconds": 0.1, "queries": 10}}}
+        same = {"100": {"asdict": {"seconds": 0.11, "queries": 10}}}
+        slower = {"100": {"asdict": {"seconds": 0.2, "queries": 11}}}
+        self.assertEqual(compare(same, baseline, threshold=0.25, noise=0.01), [])
+        self.assertEqual(len(compare(slower, baseline, threshold=0.25, noise=0.01)), 2)
+        self.assertEqual(compare(slower, {}, threshold=0.25, noise=0.01), [])
+
+    def test_benchmark_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "results.json"
+            call_command(
+                "benchmark_statistics",
+                games=[20],
+                repeat=1,
+                output=str(output),
+                stdout=StringIO(),
+            )
+            results = json.loads(output.read_text())["results"]
+            self.assertIn("asdict", results["20"])
+            # generated games are rolled back
+            self.assertFalse(Report.objects.exists())
+
+            results["20"]["asdict"]["queries"] = 0
+            output.write_text(json.dumps({"results": results}))
+            with self.assertRaisesMessage(CommandError, "asdict (20 games)"):
+                call_command(
+                    "benchmark_statistics",
+                    games=[20],
+                    repeat=1,
+                    baseline=str(output),
+                    stdout=StringIO(),
+                )
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from chess_insight import Game
+from django.test import SimpleTestCase
+from easy_logs import get_logger
+from stockfish import Stockfish
+
+from ..benchmarks.pgn import synthetic_pgns
+from ..engine_pool import EnginePool
+
+FAKE_ENGINE = Path(__file__).parent / "fixtures" / "fake_uci_engine.py"
+LOGGER = get_logger(lvl=40)
+
+
+class EnginePoolTest(SimpleTestCase):
+    def setUp(self):
+        self.pgns = synthetic_pgns("testuser", count=5, plies=12)
+
+    def test_games_are_analyzed_in_order(self):
+        pool = EnginePool(FAKE_ENGINE, size=3, logger=LOGGER)
+        try:
+            games = list(pool.analyze(self.pgns, "testuser", depth=2))
+        finally:
+            pool.close()
+        engine = Stockfish(str(FAKE_ENGINE), depth=2)
+        expected = [Game(pgn, "testuser", stockfish=engine) for pgn in self.pgns]
+        self.assertEqual(
+            [game.asdict() for game in games], [game.asdict() for game in expected]
+        )
+
+    def test_engines_are_reused(self):
+        pool = EnginePool(FAKE_ENGINE, size=2, logger=LOGGER)
+        try:
+            engines = list(pool._engines.queue)
+            list(pool.analyze(self.pgns, "testuser", depth=1))
+            list(pool.analyze(self.pgns[:2], "testuser", depth=3))
+            self.assertCountEqual(list(pool._engines.queue), engines)
+            self.assertEqual({engine.depth for engine in engines}, {"3"})
+        finally:
+            pool.close()
+
+    def test_games_are_analyzed_without_engine(self):
+        pool = EnginePool(Path("missing.exe"), size=2, logger=LOGGER)
+        try:
+            games = list(pool.analyze(self.pgns, "testuser", depth=5))
+        finally:
+            pool.close()
+        self.assertEqual(
+            [game.url for game in games],
+            [Game(pgn, "testuser").url for pgn in self.pgns],
+        )
@@ -0,0 +1,117 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from chess_insight import Game
+from django.test import SimpleTestCase
+from stockfish import Stockfish
+
+from ..benchmarks.pgn import synthetic_pgns
+from ..evaluation_cache import CachedEngine, EvaluationCache
+from .test_engine_pool import FAKE_ENGINE
+
+START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -"
+E4 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq -"
+
+
+class EvaluationCacheTest(SimpleTestCase):
+    def test_deeper_evaluation_is_used_for_shallower_lookup(self):
+        cache = EvaluationCache(max_size=10)
+        cache.set(START, 12, {"type": "cp", "value": 30})
+        self.assertEqual(cache.get(START, 8), {"type": "cp", "value": 30})
+        self.assertIsNone(cache.get(START, 15))
+        cache.set(START, 6, {"type": "cp", "value": 10})
+        self.assertEqual(cache.get(START, 12), {"type": "cp", "value": 30})
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_least_recently_used_position_is_evicted(self):
+        cache = EvaluationCache(max_size=2)
+        cache.set(START, 5, {"type": "cp", "value": 0})
+        cache.set(E4, 5, {"type": "cp", "value": 30})
+        cache.get(START, 5)
+        cache.set("8/8/8/8/8/8/8/K6k w - -", 5, {"type": "cp", "value": 0})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(E4, 1))
+        self.assertIsNotNone(cache.get(START, 1))
+
+    def test_cache_is_saved_and_loaded(self):
+        with TemporaryDirectory() as directory:
+            path = Path(directory) / "evaluations.json"
+            cache = EvaluationCache(max_size=10, path=path)
+            cache.set(START, 5, {"type": "cp", "value": 0})
+            cache.set(E4, 7, {"type": "mate", "value": 3})
+            cache.save()
+            loaded = EvaluationCache(max_size=1, path=path)
+            loaded.load()
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual(loaded.get(E4, 7), {"type": "mate", "value": 3})
+
+    def test_saves_of_other_processes_are_merged(self):
+        with TemporaryDirectory() as directory:
+            path = Path(directory) / "evaluations.json"
+            other = EvaluationCache(max_size=10, path=path)
+            other.set(START, 9, {"type": "cp", "value": 20})
+            other.save()
+            cache = EvaluationCache(max_size=10, path=path)
+            cache.set(START, 5, {"type": "cp", "value": 0})
+            cache.set(E4, 7, {"type": "mate", "value": 3})
+            cache.save()
+            loaded = EvaluationCache(max_size=10, path=path)
+            loaded.load()
+            # nothing changed since the last save, the file isn't written again
+            path.unlink()
+            cache.save()
+            self.assertEqual(list(Path(directory).iterdir()), [])
+        # the deeper evaluation of the other process is kept
+        self.assertEqual(loaded.get(START, 9), {"type": "cp", "value": 20})
+        self.assertEqual(loaded.get(E4, 7), {"type": "mate", "value": 3})
+
+
+class CachedEngineTest(SimpleTestCase):
+    def test_repeated_positions_are_not_searched(self):
+        engine = Stockfish(str(FAKE_ENGINE), depth=2)
+        cache = EvaluationCache(max_size=1000)
+        pgn = synthetic_pgns("testuser", count=1, plies=12)[0]
+
+        expected = Game(pgn, "testuser", stockfish=engine).asdict()
+        first = Game(pgn, "testuser", CachedEngine(engine, cache, 2)).asdict()
+        searches = cache.misses
+        second = Game(pgn, "testuser", CachedEngine(engine, cache, 2)).asdict()
+
+        self.assertEqual(first, expected)
+        self.assertEqual(second, expected)
+        self.assertEqual(searches, 12)
+        self.assertEqual(cache.misses, searches)
+        self.assertEqual(cache.hits, 12)
+
+    def test_positions_after_decisive_evaluations_are_searched_shallower(self):
+        evaluations = [
+            {"type": "cp", "value": 50},
+            {"type": "mate", "value": 2},
+            {"type": "cp", "value": -1200},
+            {"type": "cp", "value": 0},
+            {"type": "cp", "value": 10},
+        ]
+        engine = ScriptedEngine(evaluations)
+        cached = CachedEngine(engine, EvaluationCache(max_size=10), 10, 3)
+        cached.set_position()
+        for move in ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4"]:
+            cached.make_moves_from_current_position([move])
+            cached.get_evaluation()
+        self.assertEqual(engine.depths, [10, 10, 3, 3, 10])
+
+
+class ScriptedEngine:
+    """Answers `evaluations` in order and records depths it was asked to search."""
+
+    def __init__(self, evaluations: list[dict]) -> None:
+        self.evaluations = evaluations
+        self.depths = []
+
+    def set_depth(self, depth: int) -> None:
+        self.depths.append(depth)
+
+    def set_fen_position(self, fen: str, send_ucinewgame_token: bool = True) -> None:
+        pass
+
+    def get_evaluation(self) -> dict:
+        return self.evaluations.pop(0)
@@ -0,0 +1,209 @@
+from datetime import datetime, timezone
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import httpx
+from django.test import SimpleTestCase, override_settings
+
+from ..benchmarks.pgn import synthetic_pgns
+from ..communicators import get_communicator
+from ..fetch import HostFetcher, close_fetchers, get_fetcher
+from .fixtures.stub_host_api import StubHostApi, StubResponse
+
+ARCHIVES = "/pub/player/testuser/games/archives"
+
+
+def chess_com_routes(pgns: list[str], months: list[tuple[int, int]], delay=0):
+    """`pgns` (newest first) spread evenly over `months` (newest first)."""
+    per_month = len(pgns) // len(months)
+    routes = {
+        ARCHIVES: StubResponse(
+            {
+                "archives": [
+                    f"https://api.chess.com/pub/player/testuser/games/{y}/{m:02d}"
+                    for y, m in reversed(months)
+                ]
+            }
+        )
+    }
+    for number, (year, month) in enumerate(months):
+        games = pgns[number * per_month : (number + 1) * per_month]
+        routes[f"{ARCHIVES[:-9]}/{year}/{month:02d}/pgn"] = StubResponse(
+            # archives are in chronological order
+            "\n\n\n".join(reversed(games)),
+            delay=delay,
+        )
+    return routes
+
+
+class HostFetcherTest(SimpleTestCase):
+    def test_rate_limited_requests_wait_for_retry_after(self):
+        routes = {
+            "/games": [
+                StubResponse(status=429, headers={"Retry-After": "0.2"}),
+                StubResponse("games"),
+            ]
+        }
+        with StubHostApi(routes) as api:
+            fetcher = HostFetcher("test", api.url)
+            response = fetcher.get("/games")
+        self.assertEqual(response.text, "games")
+        (_, _, first), (_, _, second) = api.requests
+        self.assertGreaterEqual(second - first, 0.2)
+
+    def test_errors_are_raised_after_retries(self):
+        with StubHostApi({"/games": StubResponse(status=503)}) as api:
+            fetcher = HostFetcher("test", api.url, retries=2, backoff=0)
+            with self.assertRaises(httpx.HTTPStatusError):
+                fetcher.get("/games")
+        self.assertEqual(len(api.requests), 3)
+
+    def test_concurrency_is_limited(self):
+        routes = {
+            f"/{number}": StubResponse(str(number), delay=0.1) for number in range(6)
+        }
+        with StubHostApi(routes) as api:
+            fetcher = HostFetcher("test", api.url, concurrency=2)
+            results = list(
+                fetcher.map(lambda number: fetcher.get(f"/{number}").text, range(6))
+            )
+        self.assertEqual(results, [str(number) for number in range(6)])
+        self.assertEqual(api.max_active, 2)
+
+
+@override_settings(RESPONSE_CACHE_DIR=None)
+class CommunicatorsTest(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(close_fetchers)
+
+    def test_chess_com_months_are_fetched_concurrently(self):
+        pgns = synthetic_pgns("testuser", count=8, plies=4)
+        months = [(2023, 10), (2023, 9), (2023, 7), (2023, 6)]
+        with StubHostApi(chess_com_routes(pgns, months, delay=0.1)) as api:
+            apis = {"chess.com": {"base_url": api.url, "concurrency": 4}}
+            with override_settings(HOST_APIS=apis):
+                games = list(
+                    get_communicator("chess.com").iter_pgns("TestUser", 5, "blitz")
+                )
+        self.assertEqual(games, pgns[:5])
+        self.assertEqual(api.requests[0][0], ARCHIVES)
+        # archives of all months are downloaded at once
+        self.assertEqual(api.max_active, 4)
+
+    def test_games_are_yielded_before_older_months_are_fetched(self):
+        pgns = synthetic_pgns("testuser", count=6, plies=4)
+        months = [(2023, 10), (2023, 9), (2023, 8)]
+        with StubHostApi(chess_com_routes(pgns, months)) as api:
+            apis = {"chess.com": {"base_url": api.url, "concurrency": 1}}
+            with override_settings(HOST_APIS=apis):
+                games = get_communicator("chess.com").iter_pgns("testuser", 6, "blitz")
+                self.assertEqual(next(games), pgns[0])
+                # archives and the newest month
+                self.assertEqual(len(api.requests), 2)
+                self.assertEqual(list(games), pgns[1:])
+        self.assertEqual(len(api.requests), 4)
+
+    def test_chess_com_archives_before_since_are_skipped(self):
+        pgns = synthetic_pgns("testuser", count=8, plies=4)
+        months = [(2023, 10), (2023, 9), (2023, 7), (2023, 6)]
+        with StubHostApi(chess_com_routes(pgns, months)) as api:
+            apis = {"chess.com": {"base_url": api.url, "concurrency": 1}}
+            with override_settings(HOST_APIS=apis):
+                games = list(
+                    get_communicator("chess.com").iter_pgns(
+                        "testuser", 10, "blitz", datetime(2023, 9, 1)
+                    )
+                )
+        self.assertEqual(games, pgns[:4])
+        self.assertEqual(len(api.requests), 3)
+
+    def test_lichess_games_are_exported_by_one_request(self):
+        pgns = synthetic_pgns("testuser", "lichess.org", count=3, plies=4)
+        routes = {"/api/games/user/testuser": StubResponse("\n\n\n".join(pgns))}
+        with StubHostApi(routes) as api, override_settings(
+            HOST_APIS={"lichess.org": {"base_url": api.url}}
+        ):
+            games = list(
+                get_communicator("lichess.org").iter_pgns("testuser", 3, "blitz")
+            )
+        self.assertEqual(games, pgns)
+        self.assertEqual(len(api.requests), 1)
+        query = api.requests[0][1]
+        self.assertEqual((query["perfType"], query["max"]), (["blitz"], ["3"]))
+        self.assertNotIn("since", query)
+
+    def test_lichess_months_are_read_from_cache(self):
+        pgns = synthetic_pgns("testuser", "lichess.org", count=4, plies=4)
+        routes = {
+            "/api/games/user/testuser": [
+                StubResponse("\n\n\n".join(pgns)),
+                # no games this month
+                StubResponse(""),
+            ]
+        }
+        with StubHostApi(routes) as api, TemporaryDirectory() as path:
+            apis = {"lichess.org": {"base_url": api.url}}
+            with override_settings(HOST_APIS=apis, RESPONSE_CACHE_DIR=path):
+                communicator = get_communicator("lichess.org")
+                # all games of the user are exported, months till now are cached
+                self.assertEqual(
+                    list(communicator.iter_pgns("testuser", 10, "blitz")), pgns
+                )
+                self.assertEqual(
+                    list(communicator.iter_pgns("testuser", 3, "blitz")), pgns[:3]
+                )
+        # the second report exports only the current month
+        self.assertEqual(len(api.requests), 2)
+        since = datetime.fromtimestamp(
+            int(api.requests[1][1]["since"][0]) / 1000, timezone.utc
+        )
+        now = datetime.now(timezone.utc)
+        self.assertEqual((since.year, since.month, since.day), (now.year, now.month, 1))
+
+    def test_past_months_are_read_from_cache(self):
+        pgns = synthetic_pgns("testuser", count=4, plies=4)
+        routes = chess_com_routes(pgns, [(2023, 10), (2023, 9)])
+        with StubHostApi(routes) as api, TemporaryDirectory() as path:
+            apis = {"chess.com": {"base_url": api.url}}
+            with override_settings(HOST_APIS=apis, RESPONSE_CACHE_DIR=path):
+                communicator = get_communicator("chess.com")
+                self.assertEqual(
+                    list(communicator.iter_pgns("testuser", 4, "blitz")), pgns
+                )
+                self.assertEqual(
+                    list(communicator.iter_pgns("testuser", 4, "rapid")), []
+                )
+        # the second report only lists archives
+        self.assertEqual([path for path, _, _ in api.requests].count(ARCHIVES), 2)
+        self.assertEqual(len(api.requests), 4)
+
+    def test_current_month_is_revalidated(self):
+        pgns = synthetic_pgns("testuser", count=2, plies=4)
+        now = datetime.utcnow()
+        routes = chess_com_routes(pgns, [(now.year, now.month)])
+        month = f"{ARCHIVES[:-9]}/{now.year}/{now.month:02d}/pgn"
+        routes[month] = [
+            StubResponse(routes[month].body, headers={"ETag": '"v1"'}),
+            StubResponse(status=304),
+        ]
+        with StubHostApi(routes) as api, TemporaryDirectory() as path:
+            apis = {"chess.com": {"base_url": api.url}}
+            with override_settings(HOST_APIS=apis, RESPONSE_CACHE_DIR=path):
+                communicator = get_communicator("chess.com")
+                list(communicator.iter_pgns("testuser", 2, "blitz"))
+                games = list(communicator.iter_pgns("testuser", 2, "blitz"))
+        self.assertEqual(games, pgns)
+        self.assertEqual(api.headers[-1]["If-None-Match"], '"v1"')
+
+    def test_unknown_user_is_reported(self):
+        with StubHostApi({}) as api, override_settings(
+            HOST_APIS={"lichess.org": {"base_url": api.url}}
+        ), self.assertRaisesMessage(ValueError, "doesn't exist on lichess.org"):
+            list(get_communicator("lichess.org").iter_pgns("nobody", 3, "blitz"))
+
+    def test_fetchers_are_shared(self):
+        with override_settings(HOST_APIS={"lichess.org": {"base_url": "http://x"}}):
+            self.assertIs(get_fetcher("lichess.org"), get_fetcher("lichess.org"))
+            with patch.object(HostFetcher, "close") as close:
+                close_fetchers()
+            close.assert_called_once()
@@ -0,0 +1,210 @@
+import json
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import chess.pgn
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ..benchmarks.pgn import synthetic_pgns
+from ..communicators import pgn_url
+from ..imports import iter_ndjson_pgns, iter_pgns, matching_pgns
+from ..models import ChessGame, Report, ReportChunk
+from ..tasks import analyze_chunk, import_games
+
+
+def lichess_json(pgn: str) -> dict:
+    """`pgn` as exported by lichess to NDJSON with `clocks`."""
+    game = chess.pgn.read_game(StringIO(pgn))
+    clocks = [round(node.clock() * 100) for node in game.mainline()]
+    initial, increment = game.headers["TimeControl"].split("+")
+    return {
+        "id": game.headers["Site"].rsplit("/", 1)[-1],
+        "speed": "blitz",
+        "variant": "standard",
+        "status": "resign",
+        "winner": "white",
+        "createdAt": 1696161600000,
+        "players": {
+            "white": {"user": {"name": game.headers["White"]}, "rating": 1500},
+            "black": {"user": {"name": game.headers["Black"]}, "rating": 1500},
+        },
+        "moves": " ".join(
+            node.parent.board().san(node.move) for node in game.mainline()
+        ),
+        "clocks": clocks,
+        "clock": {"initial": int(initial), "increment": int(increment)},
+    }
+
+
+class ReadPgnsTest(SimpleTestCase):
+    def test_pgn_files_are_split_into_games(self):
+        pgns = synthetic_pgns("testuser", count=3, plies=6)
+        lines = StringIO("\n\n".join(pgns))
+        self.assertEqual(list(iter_pgns(lines)), [pgn.strip() + "\n" for pgn in pgns])
+
+    def test_ndjson_games_are_converted(self):
+        pgns = synthetic_pgns("testuser", "lichess.org", count=2, plies=6)
+        unclocked = lichess_json(pgns[1])
+        del unclocked["clocks"]
+        lines = [
+            json.dumps({"pgn": pgns[0]}),
+            "",
+            json.dumps(lichess_json(pgns[1])),
+            json.dumps(unclocked),
+        ]
+        games = list(iter_ndjson_pgns(lines))
+        self.assertEqual(games[0], pgns[0])
+        self.assertEqual(len(games), 2)
+        converted = chess.pgn.read_game(StringIO(games[1]))
+        expected = chess.pgn.read_game(StringIO(pgns[1]))
+        self.assertEqual(
+            [node.move for node in converted.mainline()],
+            [node.move for node in expected.mainline()],
+        )
+        self.assertEqual(converted.headers["Site"], expected.headers["Site"])
+        # the converted game is imported like a PGN
+        self.assertEqual(list(matching_pgns(games, "blitz")), games)
+
+    def test_games_of_other_time_classes_are_skipped(self):
+        pgns = synthetic_pgns("testuser", count=2, plies=6)
+        rapid = synthetic_pgns("testuser", count=1, plies=6, time_control="600+0")
+        self.assertEqual(list(matching_pgns([*rapid, *pgns], "blitz", 1)), pgns[:1])
+
+
+def create_report() -> Report:
+    return Report.objects.create(
+        chess_com_username="testuser",
+        lichess_username="",
+        time_class="blitz",
+        games_num=0,
+        engine_depth=1,
+    )
+
+
+@override_settings(INGEST_BATCH_SIZE=2, METRICS_DIR=None, IMPORT_BLOCK_SIZE=3)
+class ImportGamesTest(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "games.pgn"
+        self.pgns = synthetic_pgns("testuser", count=5, plies=12)
+        self.path.write_text("\n\n".join([*self.pgns, "[Event broken]\n\n1. e4 *"]))
+        patcher = patch("analyze_app.tasks.async_task")
+        self.async_task = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_games_are_imported_into_new_report(self):
+        out = StringIO()
+        call_command("import_games", self.path, username="testuser", stdout=out)
+        report = Report.objects.get()
+        self.assertIn(f"Imported 5 games into report {report.pk}", out.getvalue())
+        self.assertEqual((report.analyzed_games, report.games_num), (5, 5))
+        self.assertEqual(report.chess_com_username, "testuser")
+        self.assertEqual(report.time_class, "blitz")
+        self.assertTrue(hasattr(report, "statistics"))
+        # importing the file again doesn't duplicate games
+        call_command(
+            "import_games", self.path, username="testuser", report=report.pk, stdout=out
+        )
+        report.refresh_from_db()
+        self.assertEqual((report.analyzed_games, report.games_num), (5, 5))
+        self.assertEqual(ChessGame.objects.count(), 5)
+
+    def test_limit_applies_in_file_order(self):
+        report = create_report()
+        import_games(report, self.path, "testuser", limit=2, delete=True)
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 2)
+        self.assertCountEqual(
+            ChessGame.objects.filter(reports=report).values_list("url", flat=True),
+            [pgn_url(pgn) for pgn in self.pgns[:2]],
+        )
+        self.assertFalse(self.path.exists())
+
+    @override_settings(INGEST_CHUNK_SIZE=2)
+    def test_imported_games_are_evaluated_in_chunks(self):
+        report = create_report()
+        import_games(report, self.path, "testuser")
+        report.refresh_from_db()
+        self.assertTrue(report.is_complete)
+        self.assertEqual(report.analyzed_games, 5)
+        self.assertEqual(ChessGame.objects.filter(evaluated=False).count(), 5)
+        self.assertTrue(report.statistics.data["mistakes_per_phase"]["pending"])
+        # 5 games in blocks of 3 and 2, split into chunks of 2
+        self.assertEqual(
+            [call.args[0] for call in self.async_task.call_args_list],
+            [analyze_chunk] * 3,
+        )
+        for call in self.async_task.call_args_list:
+            analyze_chunk(call.args[1])
+        self.assertFalse(ReportChunk.objects.exists())
+        self.assertFalse(ChessGame.objects.filter(evaluated=False).exists())
+        report.refresh_from_db()
+        self.assertNotIn("pending", report.statistics.data["mistakes_per_phase"])
+
+    def test_games_are_read_as_username_of_their_host(self):
+        pgns = synthetic_pgns("testuser", "lichess.org", count=2, plies=6)
+        self.path.write_text("\n\n".join(pgns))
+        # the chess.com username is left as prefilled by the form
+        report = create_report()
+        report.chess_com_username, report.lichess_username = "Hikaru", "testuser"
+        report.save()
+        import_games(report, self.path)
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 2)
+        self.assertIsNone(report.fail_reason)
+        self.assertEqual(
+            set(ChessGame.objects.values_list("username", flat=True)), {"testuser"}
+        )
+
+        # games of a host without a username are skipped
+        other = create_report()
+        import_games(other, self.path)
+        other.refresh_from_db()
+        self.assertEqual(other.analyzed_games, -1)
+        self.assertEqual(other.fail_reason, "Skipped 2 games which failed to import")
+
+    def test_failed_upload_fails_report(self):
+        report = create_report()
+        with patch(
+            "analyze_app.tasks._save_games", side_effect=OSError("disk is full")
+        ), self.assertRaises(OSError):
+            import_games(report, self.path, "testuser", delete=True)
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, -1)
+        self.assertEqual(report.fail_reason, "Failed to import games: disk is full")
+        self.assertFalse(ReportChunk.objects.exists())
+        self.assertFalse(self.path.exists())
+        self.async_task.assert_not_called()
+
+
+class ReportUploadTest(TestCase):
+    def test_uploaded_games_are_imported(self):
+        pgns = synthetic_pgns("testuser", count=2, plies=6)
+        upload = SimpleUploadedFile("games.pgn", "\n\n".join(pgns).encode())
+        with TemporaryDirectory() as directory, override_settings(
+            IMPORT_DIR=directory
+        ), patch("analyze_app.views.async_task") as async_task:
+            response = self.client.post(
+                reverse("report:report-create"),
+                {
+                    "chess_com_username": "testuser",
+                    "lichess_username": "",
+                    "time_class": "blitz",
+                    "games_num": 10,
+                    "engine_depth": 1,
+                    "games_file": upload,
+                },
+            )
+            report = Report.objects.get()
+            path = Path(directory) / f"{report.pk}.pgn"
+            self.assertEqual(path.read_text(), "\n\n".join(pgns))
+        self.assertEqual(response.status_code, 302)
+        async_task.assert_called_once_with(
+            import_games, report, str(path), limit=10, delete=True
+        )
@@ -0,0 +1,130 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from easy_logs import get_logger
+from ..metrics import (
+    INGEST_SECONDS,
+    INGESTED_GAMES,
+    STATISTIC_QUERIES,
+    STATISTIC_ROWS,
+    STATISTIC_SECONDS,
+    render_metrics,
+    save_metrics,
+)
+from ..queries import ColumnarQueriesMaker, QueriesMaker
+from ..tasks import _update_report
+from .test_tasks import FakeCommunicator, create_report
+
+LOGGER = get_logger(lvl=50)
+
+
+def count(metric, **labels) -> int:
+    """Number of observations of a histogram, value of a counter."""
+    values = metric.samples.get(tuple(labels[label] for label in metric.labels))
+    return values[-1] if values else 0
+
+
+def total(metric, **labels) -> float:
+    """Sum of observations of a histogram."""
+    values = metric.samples.get(tuple(labels[label] for label in metric.labels))
+    return values[-2] if values else 0
+
+
+class MetricsTest(TestCase):
+    def test_statistics_are_measured_per_host(self):
+        report = create_report()
+        _update_report(report, LOGGER, "testuser", FakeCommunicator(), 3)
+        labels = {"statistic": "get_end_reasons", "host": "chess_com"}
+        before = count(STATISTIC_SECONDS, **labels)
+        observed = count(STATISTIC_ROWS, **labels)
+        elo = {"statistic": "get_player_elo_over_time", "host": "chess_com"}
+        rows = total(STATISTIC_ROWS, **elo)
+        QueriesMaker(report, LOGGER).asdict()
+        self.assertEqual(count(STATISTIC_SECONDS, **labels), before + 1)
+        self.assertEqual(count(STATISTIC_ROWS, **labels), observed + 1)
+        # days of the elo chart are iterated in Python
+        self.assertGreater(total(STATISTIC_ROWS, **elo), rows)
+        queries = STATISTIC_QUERIES.samples[("get_end_reasons", "chess_com")]
+        # every observation ran two queries
+        self.assertEqual(queries[1], queries[-1])
+
+        before = count(STATISTIC_QUERIES, statistic="frame", host="all")
+        rows = total(STATISTIC_ROWS, statistic="frame", host="all")
+        ColumnarQueriesMaker(report, LOGGER).asdict()
+        self.assertEqual(
+            count(STATISTIC_QUERIES, statistic="frame", host="all"), before + 1
+        )
+        self.assertEqual(total(STATISTIC_ROWS, statistic="frame", host="all"), rows + 3)
+        self.assertIn(
+            'chess_stats_statistic_rows_bucket{statistic="frame",host="all",le="5"}',
+            render_metrics(),
+        )
+
+    def test_ingestion_stages_are_measured(self):
+        before = {
+            stage: count(INGEST_SECONDS, stage=stage)
+            for stage in ["fetch", "analysis", "write"]
+        }
+        analyzed = count(INGESTED_GAMES, host="chess.com", source="analyzed")
+        reused = count(INGESTED_GAMES, host="chess.com", source="reused")
+        _update_report(create_report(), LOGGER, "testuser", FakeCommunicator(), 3)
+        _update_report(create_report(), LOGGER, "testuser", FakeCommunicator(), 4)
+        self.assertEqual(count(INGEST_SECONDS, stage="fetch"), before["fetch"] + 2)
+        self.assertEqual(
+            count(INGEST_SECONDS, stage="analysis"), before["analysis"] + 4
+        )
+        self.assertEqual(count(INGEST_SECONDS, stage="write"), before["write"] + 4)
+        self.assertEqual(
+            count(INGESTED_GAMES, host="chess.com", source="analyzed"), analyzed + 4
+        )
+        self.assertEqual(
+            count(INGESTED_GAMES, host="chess.com", source="reused"), reused + 3
+        )
+
+    def test_metrics_of_other_processes_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            METRICS_DIR=Path(directory)
+        ):
+            INGESTED_GAMES.inc(host="lichess.org", source="analyzed")
+            save_metrics()
+            ours = Path(directory) / f"{os.getpid()}.json"
+            saved = json.loads(ours.read_text())
+            # another running worker analyzed 10 games
+            saved["chess_stats_ingested_games_total"] = [
+                [["lichess.org", "analyzed"], [10]]
+            ]
+            (Path(directory) / f"{os.getppid()}.json").write_text(json.dumps(saved))
+            total = count(INGESTED_GAMES, host="lichess.org", source="analyzed")
+            self.assertIn(
+                "chess_stats_ingested_games_total"
+                f'{{host="lichess.org",source="analyzed"}} {total + 10}',
+                render_metrics(),
+            )
+
+    def test_metrics_of_ended_processes_are_removed(self):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            METRICS_DIR=Path(directory)
+        ):
+            save_metrics()
+            saved = Path(directory) / f"{os.getpid()}.json"
+            path = Path(directory) / f"{process.pid}.json"
+            path.write_text(saved.read_text())
+            render_metrics()
+            self.assertFalse(path.exists())
+            self.assertTrue(saved.exists())
+
+    def test_metrics_are_served_locally(self):
+        response = self.client.get(reverse("report:metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertContains(response, "# TYPE chess_stats_ingest_seconds histogram")
+        response = self.client.get(reverse("report:metrics"), REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,99 @@
+from contextlib import closing
+from itertools import count
+from threading import Event
+from time import sleep
+
+from django.test import SimpleTestCase
+
+from ..metrics import PIPELINE_ITEMS
+from ..pipeline import Pipeline, Stage
+
+
+def shuffled_delay(number: int) -> int:
+    """Later items finish first, so workers complete them out of order."""
+    sleep((5 - number % 5) * 0.01)
+    return number
+
+
+class PipelineTest(SimpleTestCase):
+    def test_results_keep_order_of_source(self):
+        pipeline = Pipeline(
+            [
+                Stage("delay", shuffled_delay, workers=4),
+                Stage("double", lambda x: 2 * x),
+            ]
+        )
+        self.assertEqual(list(pipeline.run(range(20))), [2 * x for x in range(20)])
+
+    def test_stages_work_at_once(self):
+        analyzed = Event()
+
+        def source():
+            yield 0
+            # a serial loop would wait here forever
+            self.assertTrue(analyzed.wait(timeout=5))
+            yield 1
+
+        def analyze(item: int) -> int:
+            analyzed.set()
+            return item
+
+        pipeline = Pipeline([Stage("analyze", analyze)])
+        self.assertEqual(list(pipeline.run(source())), [0, 1])
+
+    def test_source_waits_for_consumer(self):
+        fetched = []
+
+        def source():
+            for number in count():
+                fetched.append(number)
+                yield number
+
+        pipeline = Pipeline([Stage("parse", lambda x: x, workers=2)], capacity=3)
+        with closing(pipeline.run(source())) as results:
+            self.assertEqual(next(results), 0)
+            sleep(0.3)
+            # the first item left, 3 more are in flight
+            self.assertEqual(len(fetched), 4)
+        # stopping early ends the source
+        stopped = len(fetched)
+        sleep(0.2)
+        self.assertEqual(len(fetched), stopped)
+
+    def test_failures_are_raised_in_order(self):
+        def parse(item: int) -> int:
+            if item == 2:
+                raise ValueError("broken game")
+            return item
+
+        pipeline = Pipeline([Stage("parse", parse, workers=3)])
+        results = []
+        with self.assertRaisesMessage(ValueError, "broken game"):
+            for item in pipeline.run(range(5)):
+                results.append(item)
+        self.assertEqual(results, [0, 1])
+
+        errors = []
+        self.assertEqual(list(pipeline.run(range(5), errors=errors)), [0, 1, 3, 4])
+        self.assertEqual([str(error) for error in errors], ["broken game"])
+
+    def test_failed_source_is_raised_after_its_items(self):
+        def source():
+            yield from range(3)
+            raise ConnectionError("host is down")
+
+        results = []
+        with self.assertRaises(ConnectionError):
+            for item in Pipeline([Stage("parse", str)]).run(source(), errors=[]):
+                results.append(item)
+        self.assertEqual(results, ["0", "1", "2"])
+
+    def test_items_are_counted_per_stage(self):
+        before = {
+            stage: PIPELINE_ITEMS.samples.get((stage,), [0])[0]
+            for stage in ("test-fetch", "test-parse")
+        }
+        pipeline = Pipeline([Stage("test-parse", str, workers=2)])
+        list(pipeline.run(range(7), "test-fetch"))
+        for stage in ("test-fetch", "test-parse"):
+            self.assertEqual(PIPELINE_ITEMS.samples[(stage,)][0], before[stage] + 7)
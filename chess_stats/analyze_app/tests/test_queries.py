@@ -1,6 +1,11 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.test import TestCase
 from ..models import ChessGame, Report, SingleGamePlayer, Color, Result
-from ..queries import QueriesMaker
+from ..queries import ColumnarQueriesMaker, QueriesMaker, lttb
 from django.utils import timezone
 from easy_logs import get_logger
 
@@ -24,7 +29,6 @@ class QueryTest(TestCase):
             avg_move_time={"opening": 10, "middle_game": 10, "end_game": 10},
         )
         self.game1 = ChessGame.objects.create(
-            report=self.report,
             host="lichess.org",
             player=self.player,
             opponent=self.player,
@@ -39,9 +43,9 @@ class QueryTest(TestCase):
             time_control="300+5",
             url="http://example.com/game1",
             username="testuser",
+            engine_depth=10,
         )
         self.game2 = ChessGame.objects.create(
-            report=self.report,
             host="chess.com",
             player=self.player,
             opponent=self.player,
@@ -56,16 +60,19 @@ class QueryTest(TestCase):
             time_control="300+5",
             url="http://example.com/game2",
             username="testuser",
+            engine_depth=10,
         )
+        self.report.games.add(self.game1, self.game2)
 
         self.query = QueriesMaker(self.report, logger=get_logger(lvl=40))
 
     def test_FR9_query_data_by_host(self):
         data: dict = self.query.asdict()
-        for stat in data.values():
+        for name, stat in data.items():
             self.assertIn("lichess_org", stat.keys())
             self.assertIn("chess_com", stat.keys())
-            self.assertIn("total", stat.keys())
+            if f"get_{name}" not in QueriesMaker.host_series_methods:
+                self.assertIn("total", stat.keys())
 
     def test_FR8_count_number_of_stats(self):
         data: dict = self.query.asdict()
@@ -76,3 +83,277 @@ class QueryTest(TestCase):
         data: dict = self.query.asdict()
         for stat in data.values():
             self.assertIn("about", stat.keys())
+
+
+class ColumnarQueryTest(TestCase):
+    OPENINGS = (
+        ("Sicilian Defense", "Sicilian Defense: Alapin Variation"),
+        ("Sicilian Defense", "Sicilian Defense"),
+        ("French Defense", "French Defense: Advance Variation"),
+        ("Queen's Gambit", "Queen's Gambit Declined"),
+        ("Caro-Kann Defense", "Caro-Kann Defense"),
+        ("King's Pawn Game", "king's pawn game: Wayward Queen Attack"),
+        ("Italian Game", "Italian Game: Giuoco Piano"),
+        ("Scandinavian Defense", "Scandinavian Defense"),
+    )
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.report = Report.objects.create(
+            chess_com_username="testuser",
+            lichess_username="lichessuser",
+            time_class="blitz",
+            games_num=120,
+            engine_depth=10,
+        )
+        start = datetime(2023, 1, 1, 12, 0, 0)
+        for i in range(120):
+            opening_short, opening = rng.choice(self.OPENINGS)
+            game = ChessGame.objects.create(
+                host=rng.choice(["chess.com", "lichess.org"]),
+                player=self._player(rng),
+                opponent=self._player(rng),
+                # some games share the exact same moment and many share a day
+                date=start + timedelta(hours=rng.randint(0, 24 * 20)),
+                opening=opening,
+                opening_short=opening_short,
+                phases={"opening": 10, "middle_game": 20, "end_game": 30},
+                player_color=rng.choice([Color.WHITE, Color.BLACK]),
+                result=rng.choice([Result.WHITE, Result.DRAW, Result.BLACK]),
+                end_reason=rng.choice(["resign", "timeout", "mate", "unknown"]),
+                time_class="blitz",
+                time_control="180+0",
+                url=f"http://example.com/game{i}",
+                username="testuser",
+                engine_depth=10,
+            )
+            game.reports.add(self.report)
+
+    def _player(self, rng: random.Random) -> SingleGamePlayer:
+        move_time = {
+            phase: round(rng.uniform(0.1, 20), 4)
+            for phase in ["opening", "middle_game", "end_game"]
+        }
+        if rng.random() < 0.1:
+            move_time = {}
+        return SingleGamePlayer.objects.create(
+            evaluation={
+                phase: {
+                    "inaccuracy": rng.randint(0, 4),
+                    "mistake": rng.randint(0, 3),
+                    "blunder": rng.randint(0, 2),
+                }
+                for phase in ["opening", "middle_game", "end_game"]
+            },
+            elo=rng.randint(1100, 1300),
+            avg_move_time=move_time,
+        )
+
+    def test_columnar_data_is_identical(self):
+        logger = get_logger(lvl=50)
+        expected = QueriesMaker(self.report, logger).asdict()
+        with self.assertNumQueries(1):
+            data = ColumnarQueriesMaker(self.report, logger).asdict()
+        self.assertEqual(
+            json.dumps(data, cls=DjangoJSONEncoder),
+            json.dumps(expected, cls=DjangoJSONEncoder),
+        )
+
+    def test_downsampled_elo_is_identical(self):
+        logger = get_logger(lvl=50)
+        maker = QueriesMaker(self.report, logger)
+        columnar = ColumnarQueriesMaker(self.report, logger)
+        maker.elo_points = columnar.elo_points = 8
+        expected = maker.statistic("player_elo_over_time")
+        data = columnar.asdict()["player_elo_over_time"]
+        self.assertEqual(
+            json.dumps(data, cls=DjangoJSONEncoder),
+            json.dumps(expected, cls=DjangoJSONEncoder),
+        )
+        self.assertEqual(len(data["chess_com"]), 8)
+        # hosts are drawn as separate series, a total would repeat their points
+        self.assertNotIn("total", data)
+
+
+class EloOverTimeTest(TestCase):
+    def setUp(self):
+        self.report = Report.objects.create(
+            chess_com_username="testuser",
+            lichess_username="testuser",
+            time_class="blitz",
+            games_num=5,
+            engine_depth=10,
+        )
+        for number, (host, hour, elo) in enumerate(
+            [
+                ("chess.com", 9, 1200),
+                ("chess.com", 12, 1180),
+                ("chess.com", 20, 1210),
+                ("lichess.org", 10, 1500),
+                ("chess.com", 24 + 8, 1220),
+            ]
+        ):
+            game = ChessGame.objects.create(
+                host=host,
+                player=SingleGamePlayer.objects.create(elo=elo),
+                opponent=SingleGamePlayer.objects.create(elo=1200),
+                date=datetime(2023, 1, 1) + timedelta(hours=hour),
+                opening="C20 King's Pawn Game",
+                opening_short="C20",
+                phases={"opening": 10, "middle_game": 20, "end_game": 30},
+                player_color=Color.WHITE,
+                result=Result.WHITE,
+                end_reason="resign",
+                time_class="blitz",
+                time_control="180+0",
+                url=f"http://example.com/game{number}",
+                username="testuser",
+                engine_depth=10,
+            )
+            game.reports.add(self.report)
+
+    def test_elo_is_aggregated_per_host_and_day(self):
+        logger = get_logger(lvl=50)
+        with self.assertNumQueries(1):
+            data = QueriesMaker(self.report, logger).get_player_elo_over_time(
+                ChessGame.objects.filter(reports=self.report)
+            )
+        self.assertEqual(
+            data,
+            [
+                {
+                    "x": datetime(2023, 1, 1),
+                    "y": 1210,
+                    "open": 1200,
+                    "low": 1180,
+                    "high": 1210,
+                    "games": 3,
+                    "host": "chess.com",
+                },
+                {
+                    "x": datetime(2023, 1, 2),
+                    "y": 1220,
+                    "open": 1220,
+                    "low": 1220,
+                    "high": 1220,
+                    "games": 1,
+                    "host": "chess.com",
+                },
+                {
+                    "x": datetime(2023, 1, 1),
+                    "y": 1500,
+                    "open": 1500,
+                    "low": 1500,
+                    "high": 1500,
+                    "games": 1,
+                    "host": "lichess.org",
+                },
+            ],
+        )
+        columnar = ColumnarQueriesMaker(self.report, logger).asdict()
+        elo = columnar["player_elo_over_time"]
+        self.assertEqual(elo["chess_com"] + elo["lichess_org"], data)
+
+    def test_lttb_keeps_shape_within_budget(self):
+        start = datetime(2020, 1, 1)
+        points = [
+            {"x": start + timedelta(days=day), "y": 1200 + day % 7}
+            for day in range(1000)
+        ]
+        points[500]["y"] = 2000
+        sampled = lttb(points, 50)
+        self.assertEqual(len(sampled), 50)
+        self.assertEqual(sampled[0], points[0])
+        self.assertEqual(sampled[-1], points[-1])
+        self.assertIn(points[500], sampled)
+        self.assertEqual(lttb(points[:10], 50), points[:10])
+
+
+class PhaseAggregatesTest(TestCase):
+    def setUp(self):
+        self.report = Report.objects.create(
+            chess_com_username="testuser",
+            lichess_username="",
+            time_class="blitz",
+            games_num=2,
+            engine_depth=10,
+        )
+        # the opponent resigned before the end game
+        self._game(
+            1,
+            {"opening": {"inaccuracy": 1, "mistake": 0, "blunder": 0}},
+            {"opening": 2, "middle_game": 4, "end_game": 6},
+            {"opening": 1, "middle_game": 3},
+        )
+        # no move times of the player
+        self._game(
+            2,
+            {"opening": {"inaccuracy": 1, "mistake": 2, "blunder": 0}},
+            {},
+            {"opening": 1, "middle_game": 1, "end_game": 1},
+        )
+        self.query = QueriesMaker(self.report, logger=get_logger(lvl=50))
+        self.games = ChessGame.objects.filter(reports=self.report)
+
+    def _game(self, number: int, mistakes: dict, player: dict, opponent: dict):
+        evaluation = {
+            phase: mistakes.get(phase, {"inaccuracy": 0, "mistake": 0, "blunder": 0})
+            for phase in ["opening", "middle_game", "end_game"]
+        }
+        game = ChessGame.objects.create(
+            host="chess.com",
+            player=SingleGamePlayer.objects.create(
+                evaluation=evaluation, elo=1200, avg_move_time=player
+            ),
+            opponent=SingleGamePlayer.objects.create(
+                evaluation=evaluation, elo=1200, avg_move_time=opponent
+            ),
+            date=datetime(2023, 1, number),
+            opening="C20 King's Pawn Game",
+            opening_short="C20",
+            phases={"opening": 10, "middle_game": 20, "end_game": 30},
+            player_color=Color.WHITE,
+            result=Result.WHITE,
+            end_reason="resign",
+            time_class="blitz",
+            time_control="180+0",
+            url=f"http://example.com/game{number}",
+            username="testuser",
+            engine_depth=10,
+        )
+        game.reports.add(self.report)
+
+    def test_avg_time_per_move_is_single_query(self):
+        with self.assertNumQueries(1):
+            data = self.query.get_avg_time_per_move(self.games)
+        self.assertEqual(
+            data,
+            {
+                "player": {"opening": 1, "middle_game": 2, "end_game": 3},
+                "opponent": {"opening": 0.5, "middle_game": 1.5, "end_game": 0},
+            },
+        )
+        self.assertEqual(
+            ColumnarQueriesMaker(self.report, get_logger(lvl=50)).asdict()[
+                "avg_time_per_move"
+            ]["total"],
+            data,
+        )
+
+    def test_mistakes_per_phase_is_single_query(self):
+        with self.assertNumQueries(1):
+            data = self.query.get_mistakes_per_phase(self.games)
+        self.assertEqual(
+            data,
+            {
+                "opening": [1, 1, 0],
+                "middle_game": [0, 0, 0],
+                "end_game": [0, 0, 0],
+            },
+        )
+        self.assertEqual(
+            ColumnarQueriesMaker(self.report, get_logger(lvl=50)).asdict()[
+                "mistakes_per_phase"
+            ]["total"],
+            data,
+        )
@@ -0,0 +1,114 @@
+import random
+from datetime import datetime, timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from easy_logs import get_logger
+from ..frame import GamesFrame
+from ..models import ChessGame, Color, Report, ReportGame, Result, SingleGamePlayer
+from ..queries import QueriesMaker, get_report_progress, get_report_statistics
+from ..tasks import _find_analyzed_games
+
+LOGGER = get_logger(lvl=50)
+
+
+class QueryPlanTest(TestCase):
+    """
+    Statistics must read only games of the report, so none of their queries may
+    scan a whole table. Tables are analyzed, so the planner sees a store shared
+    by many reports.
+    """
+
+    REPORTS = 10
+    GAMES = 2000
+
+    def setUp(self):
+        rng = random.Random(3)
+        self.reports = [
+            Report.objects.create(
+                chess_com_username=f"user{i}",
+                lichess_username=f"user{i}",
+                time_class="blitz",
+                games_num=self.GAMES // self.REPORTS,
+                analyzed_games=self.GAMES // self.REPORTS,
+                engine_depth=10,
+            )
+            for i in range(self.REPORTS)
+        ]
+        players = SingleGamePlayer.objects.bulk_create(
+            SingleGamePlayer(
+                elo=rng.randint(1000, 2000),
+                opening_inaccuracy=rng.randint(0, 3),
+                opening_move_time=rng.uniform(1, 10),
+            )
+            for _ in range(2 * self.GAMES)
+        )
+        games = ChessGame.objects.bulk_create(
+            ChessGame(
+                host=rng.choice(["chess.com", "lichess.org"]),
+                player=players[2 * i],
+                opponent=players[2 * i + 1],
+                date=datetime(2023, 1, 1) + timedelta(hours=i),
+                opening=f"Opening {i % 40}",
+                opening_short=f"O{i % 40}",
+                phases={"opening": 10, "middle_game": 20, "end_game": 30},
+                player_color=rng.choice([Color.WHITE, Color.BLACK]),
+                result=rng.choice([Result.WHITE, Result.DRAW, Result.BLACK]),
+                end_reason=rng.choice(["resign", "timeout", "mate"]),
+                time_class="blitz",
+                time_control="180+0",
+                url=f"https://example.com/game{i}",
+                username=f"user{i % self.REPORTS}",
+                engine_depth=10,
+            )
+            for i in range(self.GAMES)
+        )
+        ReportGame.objects.bulk_create(
+            ReportGame(report=self.reports[i % self.REPORTS], game=game)
+            for i, game in enumerate(games)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.report = self.reports[3]
+
+    def assertNoScans(self, queries: list[dict], label: str):
+        for query in queries:
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                plan = [row[-1] for row in cursor.fetchall()]
+            # subqueries of window functions hold only rows of the report
+            scans = [
+                step
+                for step in plan
+                if step.startswith("SCAN ") and not step.startswith("SCAN (subquery")
+            ]
+            self.assertFalse(scans, f"{label}: {scans} in {query['sql']}")
+
+    def test_statistics_queries_use_indexes(self):
+        maker = QueriesMaker(self.report, LOGGER)
+        for host in [None, "chess.com", "lichess.org"]:
+            games = ChessGame.objects.filter(reports=self.report)
+            if host:
+                games = games.filter(host=host)
+            for method in maker.get_methods:
+                with self.subTest(method=method, host=host):
+                    with CaptureQueriesContext(connection) as context:
+                        getattr(maker, method)(games)
+                    self.assertNoScans(context.captured_queries, method)
+
+    def test_report_queries_use_indexes(self):
+        with CaptureQueriesContext(connection) as context:
+            GamesFrame.from_report(self.report)
+            get_report_statistics(self.report, LOGGER)
+            get_report_statistics(self.report, LOGGER)
+            get_report_progress(self.report)
+        self.assertNoScans(context.captured_queries, "report statistics")
+
+    def test_stored_games_lookup_uses_index(self):
+        pgns = [f'[Site "https://example.com/game{i}"]\n\n1. e4 *' for i in range(50)]
+        with CaptureQueriesContext(connection) as context:
+            _find_analyzed_games("user3", 10, pgns)
+            _find_analyzed_games("user3", 10, host="chess.com")
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertNoScans(context.captured_queries, "_find_analyzed_games")
@@ -0,0 +1,124 @@
+import json
+from unittest.mock import patch
+
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from ..models import ChessGame, Color, Report, Result, SingleGamePlayer
+
+
+class ReportProgressTest(TestCase):
+    def setUp(self):
+        self.report = Report.objects.create(
+            chess_com_username="testuser",
+            lichess_username="",
+            time_class="blitz",
+            games_num=2,
+            analyzed_games=1,
+            engine_depth=10,
+        )
+        player = SingleGamePlayer.objects.create(elo=1200)
+        game = ChessGame.objects.create(
+            host="chess.com",
+            player=player,
+            opponent=player,
+            date=timezone.now().replace(tzinfo=None),
+            opening="C20 King's Pawn Game",
+            opening_short="C20",
+            phases={"opening": 10, "middle_game": 20, "end_game": 30},
+            player_color=Color.WHITE,
+            result=Result.WHITE,
+            end_reason="mate",
+            time_class="blitz",
+            time_control="300+5",
+            url="http://example.com/game1",
+            username="testuser",
+            engine_depth=10,
+        )
+        game.reports.add(self.report)
+        self.url = reverse("report:report-progress", kwargs={"id": self.report.id})
+
+    def events(self, response) -> list[tuple[str, dict]]:
+        stream = b"".join(response.streaming_content).decode()
+        events = []
+        for message in filter(None, stream.split("\n\n")):
+            fields = dict(line.split(": ", 1) for line in message.split("\n"))
+            events.append((fields.get("event", "message"), json.loads(fields["data"])))
+        return events
+
+    def test_progress_is_streamed_until_report_is_complete(self):
+        def analyze(seconds):
+            Report.objects.filter(pk=self.report.pk).update(analyzed_games=2)
+
+        with patch("analyze_app.views.sleep", side_effect=analyze) as sleep:
+            response = self.client.get(self.url)
+            events = self.events(response)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(
+            events,
+            [
+                (
+                    "message",
+                    {
+                        "analyzed_games": 1,
+                        "games_num": 2,
+                        "fail_reason": None,
+                        "hosts": {"chess.com": 1},
+                    },
+                ),
+                (
+                    "message",
+                    {
+                        "analyzed_games": 2,
+                        "games_num": 2,
+                        "fail_reason": None,
+                        "hosts": {"chess.com": 1},
+                    },
+                ),
+                ("done", {}),
+            ],
+        )
+
+    async def test_progress_is_streamed_to_asgi_servers(self):
+        async def analyze(seconds):
+            await Report.objects.filter(pk=self.report.pk).aupdate(analyzed_games=2)
+
+        with patch("analyze_app.views.asyncio.sleep", side_effect=analyze) as sleep:
+            response = await AsyncClient().get(self.url)
+            stream = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(sleep.call_count, 1)
+        messages = stream.decode().split("\n\n")
+        self.assertEqual(
+            [json.loads(message[6:])["analyzed_games"] for message in messages[:2]],
+            [1, 2],
+        )
+        self.assertEqual(messages[2], "event: done\ndata: {}")
+
+    def test_unchanged_progress_is_not_sent_again(self):
+        with patch("analyze_app.views.sleep"), patch(
+            "analyze_app.views.monotonic", side_effect=[0, 0, 0, 100]
+        ):
+            events = self.events(self.client.get(self.url))
+        self.assertEqual([name for name, _ in events], ["message"])
+
+    def test_failed_report_ends_stream(self):
+        Report.objects.filter(pk=self.report.pk).update(
+            analyzed_games=-1, fail_reason="chess.com is down"
+        )
+        events = self.events(self.client.get(self.url))
+        self.assertEqual(events[0][1]["fail_reason"], "chess.com is down")
+        self.assertEqual(events[-1], ("done", {}))
+
+    def test_report_finished_without_games_ends_stream(self):
+        Report.objects.filter(pk=self.report.pk).update(analyzed_games=0, games_num=0)
+        with patch("analyze_app.views.sleep") as sleep:
+            events = self.events(self.client.get(self.url))
+        sleep.assert_not_called()
+        self.assertEqual(events[-1], ("done", {}))
+
+    def test_page_of_incomplete_report_follows_progress(self):
+        url = reverse("report:report-visualized", kwargs={"id": self.report.id})
+        response = self.client.get(url)
+        self.assertContains(response, f'data-url="{self.url}"')
+        self.assertNotContains(response, "<canvas")
@@ -0,0 +1,190 @@
+import gzip
+from datetime import datetime
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from ..models import ChessGame, Report, ReportStatistics, SingleGamePlayer, Color
+from ..queries import STATISTIC_NAMES, STATISTICS_VERSION, QueriesMaker
+
+
+# hosts of incomplete reports are computed with their own database connections
+class ReportStatisticsTest(TransactionTestCase):
+    def setUp(self):
+        self.report = Report.objects.create(
+            chess_com_username="testuser",
+            lichess_username="",
+            time_class="blitz",
+            games_num=1,
+            analyzed_games=1,
+            engine_depth=10,
+        )
+        player = SingleGamePlayer.objects.create(
+            evaluation={
+                phase: {"inaccuracy": 1, "mistake": 0, "blunder": 0}
+                for phase in ["opening", "middle_game", "end_game"]
+            },
+            elo=1200,
+            avg_move_time={"opening": 1, "middle_game": 2, "end_game": 3},
+        )
+        game = ChessGame.objects.create(
+            host="chess.com",
+            player=player,
+            opponent=player,
+            date=timezone.now().replace(tzinfo=None),
+            opening="C20 King's Pawn Game",
+            opening_short="C20",
+            phases={"opening": 10, "middle_game": 20, "end_game": 30},
+            player_color=Color.WHITE,
+            result=Color.WHITE,
+            end_reason="mate",
+            time_class="blitz",
+            time_control="300+5",
+            url="http://example.com/game1",
+            username="testuser",
+            engine_depth=10,
+        )
+        game.reports.add(self.report)
+        self.url = reverse(
+            "report:report-statistic",
+            kwargs={"id": self.report.id, "name": "win_ratio_per_color"},
+        )
+
+    def test_statistics_are_stored_on_first_view(self):
+        first = self.client.get(self.url)
+        statistics = ReportStatistics.objects.get(pk=self.report.pk)
+        self.assertEqual(statistics.analyzed_games, 1)
+        self.assertEqual(statistics.version, STATISTICS_VERSION)
+        with self.assertNumQueries(2):  # report and its statistic
+            second = self.client.get(self.url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second.json(), statistics.data["win_ratio_per_color"])
+
+    def test_outdated_statistics_are_recomputed(self):
+        ReportStatistics.objects.create(
+            report=self.report,
+            analyzed_games=1,
+            version=STATISTICS_VERSION - 1,
+            data={"stale": {"total": 0}},
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(set(response.json()), {"chess_com", "total", "about"})
+        statistics = ReportStatistics.objects.get(pk=self.report.pk)
+        self.assertEqual(statistics.version, STATISTICS_VERSION)
+        self.assertNotIn("stale", statistics.data)
+
+    def test_incomplete_report_is_not_stored(self):
+        Report.objects.filter(pk=self.report.pk).update(games_num=10)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("total", response.json())
+        self.assertFalse(ReportStatistics.objects.exists())
+
+    def test_unknown_statistic_is_not_found(self):
+        for name in ["unknown", "asdict", "Xusername", "Xanalyzed_games"]:
+            url = reverse(
+                "report:report-statistic", kwargs={"id": self.report.id, "name": name}
+            )
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_report_without_games_has_empty_statistics(self):
+        report = Report.objects.create(
+            chess_com_username="nobody",
+            lichess_username="",
+            time_class="blitz",
+            games_num=5,
+            analyzed_games=0,
+            engine_depth=10,
+        )
+        # still being fetched, then finished without games
+        for games_num in [5, 0]:
+            Report.objects.filter(pk=report.pk).update(games_num=games_num)
+            for name in STATISTIC_NAMES:
+                url = reverse(
+                    "report:report-statistic", kwargs={"id": report.id, "name": name}
+                )
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, name)
+                self.assertIn("about", response.json())
+
+    def test_elo_is_downsampled_to_requested_points(self):
+        game = ChessGame.objects.get()
+        for day in range(1, 10):
+            game.pk = None
+            game.url = f"http://example.com/day{day}"
+            game.date = datetime(2023, 1, day)
+            game.save()
+            game.reports.add(self.report)
+        Report.objects.filter(pk=self.report.pk).update(games_num=10, analyzed_games=10)
+        url = reverse(
+            "report:report-statistic",
+            kwargs={"id": self.report.id, "name": "player_elo_over_time"},
+        )
+        data = self.client.get(url).json()
+        self.assertEqual(len(data["chess_com"]), 10)
+        self.assertNotIn("total", data)
+        self.assertEqual(
+            len(self.client.get(url, {"points": 4}).json()["chess_com"]), 4
+        )
+        with patch.object(QueriesMaker, "max_elo_points", 5):
+            response = self.client.get(url, {"points": 8})
+        self.assertEqual(len(response.json()["chess_com"]), 5)
+        for points in ["2", "many", "-5"]:
+            response = self.client.get(url, {"points": points})
+            self.assertEqual(response.status_code, 400)
+
+    def test_page_does_not_query_games(self):
+        url = reverse("report:report-visualized", kwargs={"id": self.report.id})
+        with self.assertNumQueries(1):  # only the report
+            response = self.client.get(url)
+        self.assertContains(response, f'data-url="{self.url}?v=')
+        self.assertFalse(ReportStatistics.objects.exists())
+
+    def test_unchanged_report_is_not_modified(self):
+        page = reverse("report:report-visualized", kwargs={"id": self.report.id})
+        for url in [page, self.url]:
+            response = self.client.get(url)
+            with self.assertNumQueries(1):  # only the report
+                cached = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached.content, b"")
+
+    def test_refreshed_report_is_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+        # refresh may keep the number of games
+        Report.objects.filter(pk=self.report.pk).update(updated=datetime(2030, 1, 1))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_complete_report_is_cached(self):
+        response = self.client.get(self.url)
+        self.assertIn("max-age=31536000", response["Cache-Control"])
+        Report.objects.filter(pk=self.report.pk).update(games_num=10)
+        response = self.client.get(self.url)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_responses_are_compressed(self):
+        page = reverse("report:report-visualized", kwargs={"id": self.report.id})
+        for url in [page, self.url]:
+            plain = self.client.get(url)
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_rebuild_statistics_command(self):
+        ReportStatistics.objects.create(
+            report=self.report, analyzed_games=0, version=0, data={}
+        )
+        out = StringIO()
+        call_command("rebuild_statistics", stdout=out)
+        self.assertIn("Rebuilt statistics of 1 reports", out.getvalue())
+        statistics = ReportStatistics.objects.get(pk=self.report.pk)
+        self.assertEqual(statistics.analyzed_games, 1)
+        self.assertIn("win_ratio_per_color", statistics.data)
+
+        call_command("rebuild_statistics", stdout=out)
+        self.assertIn("Rebuilt statistics of 0 reports", out.getvalue())
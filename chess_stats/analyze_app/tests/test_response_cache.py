@@ -0,0 +1,44 @@
+import os
+from tempfile import TemporaryDirectory
+
+from django.test import SimpleTestCase
+
+from ..response_cache import ResponseCache
+
+
+class ResponseCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = ResponseCache(directory.name, max_bytes=10_000)
+
+    def test_entries_are_compressed(self):
+        body = "1. e4 e5 2. Nf3 Nc6\n\n\n" * 1000
+        self.cache.set("chess.com", "testuser", "2023-10", body=body, etag='"v1"')
+        entry = self.cache.get("chess.com", "testuser", "2023-10")
+        self.assertEqual(entry["body"], body)
+        self.assertEqual(entry["etag"], '"v1"')
+        self.assertFalse(entry["complete"])
+        self.assertLess(self.cache.size(), len(body) // 10)
+        self.assertIsNone(self.cache.get("chess.com", "testuser", "2023-09"))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        bodies = {month: os.urandom(2000).hex() for month in "123"}
+        for age, month in enumerate("12"):
+            self.cache.set("lichess.org", "testuser", month, body=bodies[month])
+            path = self.cache._path(("lichess.org", "testuser", month))
+            os.utime(path, (1000 + age, 1000 + age))
+        # a third entry of the same size doesn't fit
+        self.cache.max_bytes = self.cache.size() + 100
+        # reading the oldest entry keeps it
+        self.cache.get("lichess.org", "testuser", "1")
+        self.cache.set("lichess.org", "testuser", "3", body=bodies["3"])
+        self.assertLessEqual(self.cache.size(), self.cache.max_bytes)
+        self.assertIsNotNone(self.cache.get("lichess.org", "testuser", "1"))
+        self.assertIsNone(self.cache.get("lichess.org", "testuser", "2"))
+        self.assertIsNotNone(self.cache.get("lichess.org", "testuser", "3"))
+
+    def test_corrupted_entry_is_a_miss(self):
+        self.cache.set("chess.com", "testuser", "2023-10", body="games")
+        self.cache._path(("chess.com", "testuser", "2023-10")).write_bytes(b"broken")
+        self.assertIsNone(self.cache.get("chess.com", "testuser", "2023-10"))
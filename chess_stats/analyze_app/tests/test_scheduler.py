@@ -0,0 +1,92 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from ..models import ChessGame, Report, ReportGame
+from ..scheduler import AnalysisScheduler, plan_depth
+from ..tasks import get_games
+from .test_tasks import LOGGER, FakeCommunicator, create_report, run_task
+
+
+class PlanDepthTest(SimpleTestCase):
+    def test_requested_depth_is_kept_within_budget(self):
+        self.assertEqual(plan_depth(100, 100, 1, max_depth=10, parallelism=2), 10)
+
+    def test_depth_is_lowered_to_fit_budget(self):
+        # 100 games at depth 10 take 100 s, each ply shallower is twice cheaper
+        depth = plan_depth(100, 30, 1, max_depth=10, growth=2)
+        self.assertEqual(depth, 8)
+
+    def test_depth_does_not_drop_below_minimum(self):
+        self.assertEqual(plan_depth(100, 0, 1, max_depth=10, min_depth=3), 3)
+        self.assertEqual(plan_depth(100, 0, 1, max_depth=2, min_depth=3), 2)
+
+    def test_games_are_measured_at_requested_depth(self):
+        self.assertEqual(plan_depth(100, 0, None, max_depth=10), 10)
+
+    @override_settings(ENGINE_DECISIVE_DEPTH=4)
+    def test_decisive_positions_are_searched_shallower_only_at_lowered_depth(self):
+        scheduler = AnalysisScheduler(Report(engine_depth=10, analysis_budget=60))
+        self.assertIsNone(scheduler.decisive_depth(10))
+        self.assertEqual(scheduler.decisive_depth(8), 4)
+
+
+@override_settings(
+    ENGINE_POOL_SIZE=1, ENGINE_MIN_DEPTH=2, INGEST_BATCH_SIZE=2, METRICS_DIR=None
+)
+class AnalysisBudgetTest(TransactionTestCase):
+    def get_games(self, report: Report) -> None:
+        with patch(
+            "analyze_app.tasks.get_communicator", return_value=FakeCommunicator()
+        ), patch("analyze_app.tasks.async_task", side_effect=run_task):
+            get_games(report, LOGGER)
+
+    def test_depth_is_lowered_when_budget_is_exceeded(self):
+        # games evaluated at depth 2 by another report replace shallower ones
+        self.get_games(create_report(engine_depth=2))
+        report = create_report(engine_depth=4, analysis_budget=0)
+        self.get_games(report)
+        report.refresh_from_db()
+        # the first block is measured at the requested depth, the rest is lowered
+        self.assertEqual(report.analysis_depth, 2)
+        self.assertIsNotNone(report.seconds_per_game)
+        self.assertEqual(report.analyzed_games, 5)
+        depths = ChessGame.objects.filter(reports=report).values_list(
+            "engine_depth", flat=True
+        )
+        self.assertEqual(sorted(depths), [2, 2, 2, 4, 4])
+        self.assertEqual(ReportGame.objects.filter(report=report).count(), 5)
+        self.assertNotIn("pending", report.statistics.data["mistakes_per_phase"])
+
+    def test_lowered_depth_keeps_games_of_other_reports(self):
+        other = create_report(engine_depth=4)
+        with patch(
+            "analyze_app.tasks.get_communicator", return_value=FakeCommunicator()
+        ), patch("analyze_app.tasks.async_task") as async_task:
+            get_games(other, LOGGER)
+        # games of the other report are shared until it evaluates them
+        report = create_report(engine_depth=4, analysis_budget=0)
+        self.get_games(report)
+        depths = ChessGame.objects.filter(reports=report).values_list(
+            "engine_depth", flat=True
+        )
+        self.assertEqual(sorted(depths), [2, 2, 2, 4, 4])
+        for call in async_task.call_args_list:
+            run_task(*call.args)
+        games = ChessGame.objects.filter(reports=other)
+        self.assertEqual(
+            list(games.values_list("engine_depth", "evaluated")), [(4, True)] * 5
+        )
+        self.assertEqual(ChessGame.objects.count(), 8)
+        other.refresh_from_db()
+        self.assertEqual(other.analysis_depth, 4)
+        self.assertNotIn("pending", other.statistics.data["mistakes_per_phase"])
+
+    def test_reports_without_budget_keep_their_depth(self):
+        report = create_report(engine_depth=3)
+        self.get_games(report)
+        report.refresh_from_db()
+        self.assertEqual(report.analysis_depth, 3)
+        self.assertEqual(
+            set(ChessGame.objects.values_list("engine_depth", flat=True)), {3}
+        )
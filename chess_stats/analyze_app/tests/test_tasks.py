@@ -0,0 +1,534 @@
+from datetime import datetime
+from io import StringIO
+from threading import Barrier
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from easy_logs import get_logger
+from ..benchmarks.pgn import seed_id, synthetic_pgns
+from ..communicators import pgn_date
+from ..models import (
+    ChessGame,
+    Report,
+    ReportChunk,
+    ReportStatistics,
+    SingleGamePlayer,
+)
+from .. import tasks
+from ..engine_pool import get_engine_pool
+from ..queries import QueriesMaker
+from ..tasks import (
+    _drop_stored_games,
+    _update_report,
+    analyze_chunk,
+    get_games,
+    refresh_report,
+    resume_report,
+)
+
+LOGGER = get_logger(lvl=40)
+
+
+class FakeCommunicator:
+    """
+    Returns synthetic games instead of downloading them.
+    The newest `unplayed` games are hidden until it is set to 0.
+    Streamed games stop with an error after `fail_after` of them.
+    """
+
+    HOST = "chess.com"
+
+    def __init__(
+        self,
+        host: str = "chess.com",
+        fail: bool = False,
+        broken_after: int = None,
+        barrier: Barrier = None,
+        unplayed: int = 0,
+        fail_after: int = None,
+    ) -> None:
+        self.HOST = host
+        self.fail = fail
+        self.fail_after = fail_after
+        self.broken_after = broken_after
+        self.barrier = barrier
+        self.unplayed = unplayed
+        self.requests = []
+
+    def iter_pgns(
+        self, username: str, count: int, time_class: str, since: datetime = None
+    ):
+        self.requests.append((count, since))
+        if self.barrier:
+            self.barrier.wait(timeout=5)
+        if self.fail:
+            raise ConnectionError(f"{self.HOST} is down")
+        pgns = synthetic_pgns(username, self.HOST, self.unplayed + count, plies=20)
+        pgns = pgns[self.unplayed :]
+        if since is not None:
+            pgns = [pgn for pgn in pgns if pgn_date(pgn) > since]
+        if self.broken_after is not None:
+            pgns[self.broken_after] = "not a pgn"
+        yield from pgns[: self.fail_after]
+        if self.fail_after is not None:
+            raise ConnectionError(f"{self.HOST} is down")
+
+
+class FailingEnginePool:
+    """Analyzes `fail_after` games with the engine pool, then the engine crashes."""
+
+    def __init__(self, fail_after: int) -> None:
+        self.fail_after = fail_after
+
+    def analyze(
+        self, pgns: list[str], username: str, depth: int, decisive_depth: int = None
+    ):
+        games = get_engine_pool().analyze(
+            pgns, username, depth, decisive_depth=decisive_depth
+        )
+        for number, game in enumerate(games):
+            if number == self.fail_after:
+                raise KeyError("engine crashed")
+            yield game
+
+
+def run_task(func, *args, **kwargs) -> None:
+    """Runs an enqueued task right away, failed tasks are kept by django_q."""
+    try:
+        func(*args)
+    except Exception:
+        pass
+
+
+def create_report(**kwargs) -> Report:
+    fields = {
+        "chess_com_username": "testuser",
+        "lichess_username": "",
+        "time_class": "blitz",
+        "games_num": 5,
+        "engine_depth": 1,
+    }
+    fields.update(kwargs)
+    return Report.objects.create(**fields)
+
+
+class UpdateReportTest(TestCase):
+    @override_settings(INGEST_BATCH_SIZE=2, INGEST_PROGRESS_INTERVAL=60)
+    def test_games_are_saved_in_batches(self):
+        report = create_report()
+        # lookup of analyzed games and 3 batches (2 + 2 + 1), each: savepoint,
+        # stored games, players, games, memberships, progress, release
+        with self.assertNumQueries(1 + 3 * 7):
+            _update_report(report, LOGGER, "testuser", FakeCommunicator(), 5)
+        self.assertEqual(ChessGame.objects.filter(reports=report).count(), 5)
+        self.assertEqual(SingleGamePlayer.objects.count(), 10)
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 5)
+        game = ChessGame.objects.order_by("id")[3]
+        self.assertEqual(game.username, "testuser")
+        self.assertNotEqual(game.player_id, game.opponent_id)
+        # games are stored in the order they were fetched
+        self.assertEqual(
+            list(ChessGame.objects.order_by("id").values_list("date", flat=True)),
+            list(ChessGame.objects.order_by("-date").values_list("date", flat=True)),
+        )
+
+    @override_settings(INGEST_BATCH_SIZE=100, INGEST_PROGRESS_INTERVAL=0)
+    def test_progress_is_saved_after_interval(self):
+        report = create_report()
+        _update_report(report, LOGGER, "testuser", FakeCommunicator(), 3)
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 3)
+
+    @override_settings(INGEST_BATCH_SIZE=2, INGEST_PROGRESS_INTERVAL=60)
+    def test_saved_batches_are_kept_after_failure(self):
+        report = create_report()
+        with self.assertRaises(KeyError):
+            _update_report(
+                report, LOGGER, "testuser", FakeCommunicator(broken_after=3), 5
+            )
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 2)
+        self.assertEqual(ChessGame.objects.filter(reports=report).count(), 2)
+
+    def test_games_are_shared_between_reports(self):
+        first = create_report(engine_depth=3)
+        _update_report(first, LOGGER, "testuser", FakeCommunicator(), 5)
+        second = create_report(engine_depth=2)
+        with patch("analyze_app.tasks.get_engine_pool") as get_engine_pool:
+            _update_report(second, LOGGER, "testuser", FakeCommunicator(), 5)
+        get_engine_pool.return_value.analyze_game.assert_not_called()
+        second.refresh_from_db()
+        self.assertEqual(second.analyzed_games, 5)
+        self.assertEqual(ChessGame.objects.count(), 5)
+        self.assertEqual(ChessGame.objects.filter(reports=second).count(), 5)
+
+    def test_shallower_games_are_analyzed_again(self):
+        first = create_report(engine_depth=1)
+        _update_report(first, LOGGER, "testuser", FakeCommunicator(), 3)
+        second = create_report(engine_depth=2)
+        _update_report(second, LOGGER, "testuser", FakeCommunicator(), 3)
+        self.assertEqual(ChessGame.objects.count(), 6)
+        self.assertEqual(
+            set(
+                ChessGame.objects.filter(reports=second).values_list(
+                    "engine_depth", flat=True
+                )
+            ),
+            {2},
+        )
+
+
+@override_settings(INGEST_BATCH_SIZE=2, INGEST_PROGRESS_INTERVAL=60, METRICS_DIR=None)
+class GetGamesTest(TransactionTestCase):
+    def get_games(self, report: Report, **communicators) -> None:
+        with patch(
+            "analyze_app.tasks.get_communicator",
+            side_effect=lambda host, *args: communicators[host],
+        ), patch("analyze_app.tasks.async_task", side_effect=run_task) as async_task:
+            get_games(report, LOGGER)
+        self.enqueued = async_task.call_args_list
+
+    def test_hosts_are_fetched_concurrently(self):
+        report = create_report(lichess_username="lichessuser", games_num=6)
+        barrier = Barrier(2)
+        self.get_games(
+            report,
+            **{
+                "chess.com": FakeCommunicator("chess.com", barrier=barrier),
+                "lichess.org": FakeCommunicator("lichess.org", barrier=barrier),
+            },
+        )
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 6)
+        self.assertEqual(report.games_num, 6)
+        self.assertTrue(hasattr(report, "statistics"))
+        self.assertEqual(ChessGame.objects.filter(host="lichess.org").count(), 3)
+
+    @override_settings(INGEST_CHUNK_SIZE=2)
+    def test_games_are_analyzed_in_chunks(self):
+        report = create_report(lichess_username="lichessuser", games_num=10)
+        self.get_games(
+            report,
+            **{
+                "chess.com": FakeCommunicator("chess.com"),
+                "lichess.org": FakeCommunicator("lichess.org"),
+            },
+        )
+        # 5 games of each host in chunks of 2, 2 and 1
+        self.assertEqual([call.args[0] for call in self.enqueued], [analyze_chunk] * 6)
+        self.assertFalse(ReportChunk.objects.exists())
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 10)
+        self.assertEqual(report.games_num, 10)
+        self.assertTrue(hasattr(report, "statistics"))
+
+    def test_report_is_complete_before_evaluation(self):
+        report = create_report(games_num=5)
+        with patch(
+            "analyze_app.tasks.get_communicator", return_value=FakeCommunicator()
+        ), patch("analyze_app.tasks.async_task") as async_task:
+            get_games(report, LOGGER)
+        report.refresh_from_db()
+        self.assertTrue(report.is_complete)
+        self.assertEqual(ChessGame.objects.filter(evaluated=False).count(), 5)
+        data = report.statistics.data
+        self.assertEqual(data["win_ratio_per_color"]["total"]["white"][1], 0)
+        self.assertTrue(data["mistakes_per_phase"]["pending"])
+        query = QueriesMaker(report, LOGGER)
+        self.assertTrue(query.statistic("mistakes_per_phase")["pending"])
+
+        run_task(*async_task.call_args.args)
+        report.refresh_from_db()
+        self.assertFalse(ChessGame.objects.filter(evaluated=False).exists())
+        self.assertNotIn("pending", report.statistics.data["mistakes_per_phase"])
+        self.assertNotIn("pending", query.statistic("mistakes_per_phase"))
+
+    @override_settings(INGEST_CHUNK_SIZE=2)
+    def test_broken_games_are_skipped_before_evaluation(self):
+        report = create_report(games_num=5)
+        self.get_games(
+            report, **{"chess.com": FakeCommunicator("chess.com", broken_after=3)}
+        )
+        self.assertEqual([call.args[0] for call in self.enqueued], [analyze_chunk] * 2)
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 4)
+        self.assertEqual(report.games_num, 4)
+        self.assertTrue(report.fail_reason.startswith("chess.com: "))
+
+    @override_settings(INGEST_BATCH_SIZE=1, Q_CLUSTER={"max_attempts": 2})
+    def test_failed_chunk_is_retried_after_evaluated_games(self):
+        report = create_report(games_num=5)
+        with patch(
+            "analyze_app.tasks.get_engine_pool", return_value=FailingEnginePool(3)
+        ):
+            self.get_games(report, **{"chess.com": FakeCommunicator("chess.com")})
+        chunk = ReportChunk.objects.get(report=report)
+        self.assertEqual((chunk.analyzed, chunk.attempts), (3, 1))
+        self.assertEqual(ChessGame.objects.filter(evaluated=True).count(), 3)
+        report.refresh_from_db()
+        self.assertIsNone(report.fail_reason)
+        self.assertTrue(report.statistics.data["mistakes_per_phase"]["pending"])
+
+        with patch(
+            "analyze_app.tasks.get_engine_pool", return_value=FailingEnginePool(0)
+        ), patch(
+            "analyze_app.tasks._analyze_games", wraps=tasks._analyze_games
+        ) as analyze_games, self.assertRaises(
+            KeyError
+        ):
+            analyze_chunk(chunk.pk, LOGGER)
+        self.assertEqual(analyze_games.call_args.args[3], chunk.pgns[3:])
+        self.assertFalse(ReportChunk.objects.exists())
+        # games left unevaluated are dropped from the report
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 3)
+        self.assertEqual(report.games_num, 3)
+        self.assertTrue(report.fail_reason.startswith("chess.com: "))
+        self.assertNotIn("pending", report.statistics.data["mistakes_per_phase"])
+
+    def test_duplicate_chunk_task_finishes_report_once(self):
+        report = create_report()
+        with patch(
+            "analyze_app.tasks.get_communicator", return_value=FakeCommunicator()
+        ), patch("analyze_app.tasks.async_task") as async_task:
+            get_games(report, LOGGER)
+        chunk_id = async_task.call_args.args[1]
+        analyze_games = tasks._analyze_games
+
+        def resumed(*args, **kwargs):
+            # the chunk was enqueued again by a resumed report meanwhile
+            if analyze.call_count == 1:
+                analyze_chunk(chunk_id, LOGGER)
+            analyze_games(*args, **kwargs)
+
+        with patch(
+            "analyze_app.tasks._analyze_games", side_effect=resumed
+        ) as analyze, patch(
+            "analyze_app.tasks.finish_report", wraps=tasks.finish_report
+        ) as finish_report:
+            analyze_chunk(chunk_id, LOGGER)
+        self.assertEqual(analyze.call_count, 2)
+        finish_report.assert_called_once()
+        self.assertFalse(ReportChunk.objects.exists())
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 5)
+
+    def test_write_transactions_lock_database_at_start(self):
+        connection.ensure_connection()
+        executed = []
+        connection.connection.set_trace_callback(executed.append)
+        try:
+            with tasks._write_transaction():
+                Report.objects.count()
+        finally:
+            connection.connection.set_trace_callback(None)
+        self.assertEqual(executed[0], "BEGIN IMMEDIATE")
+
+    def test_retried_fetch_enqueues_stored_chunks(self):
+        report = create_report()
+        with patch(
+            "analyze_app.tasks.get_communicator", return_value=FakeCommunicator()
+        ), patch("analyze_app.tasks.async_task") as async_task:
+            get_games(report, LOGGER)
+        chunks = list(ReportChunk.objects.values_list("pk", flat=True))
+        # the worker died before analyzing the chunks, games aren't fetched again
+        communicator = FakeCommunicator(fail=True)
+        self.get_games(report, **{"chess.com": communicator})
+        self.assertEqual(communicator.requests, [])
+        self.assertEqual([call.args[1] for call in self.enqueued], chunks)
+        self.assertEqual(async_task.call_args.args[1], chunks[-1])
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 5)
+
+    def test_resume_command_enqueues_unfinished_reports(self):
+        unfinished = create_report(analyzed_games=2)
+        create_report(analyzed_games=5)
+        create_report(analyzed_games=-1)
+        with patch("analyze_app.management.commands.resume_reports.async_task") as (
+            async_task
+        ):
+            call_command("resume_reports", stdout=StringIO())
+        async_task.assert_called_once_with(resume_report, unfinished)
+
+    def test_reused_games_are_not_enqueued(self):
+        report = create_report()
+        self.get_games(report, **{"chess.com": FakeCommunicator()})
+        second = create_report()
+        self.get_games(second, **{"chess.com": FakeCommunicator()})
+        self.assertEqual(self.enqueued, [])
+        second.refresh_from_db()
+        self.assertEqual(second.analyzed_games, 5)
+        self.assertEqual(second.games_num, 5)
+
+    def test_failed_host_does_not_abort_other_host(self):
+        report = create_report(lichess_username="lichessuser", games_num=6)
+        self.get_games(
+            report,
+            **{
+                "chess.com": FakeCommunicator("chess.com", fail=True),
+                "lichess.org": FakeCommunicator("lichess.org"),
+            },
+        )
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 3)
+        self.assertEqual(report.games_num, 3)
+        self.assertEqual(report.fail_reason, "chess.com: chess.com is down")
+
+    @override_settings(INGEST_BATCH_SIZE=1)
+    def test_games_of_host_failing_midway_are_dropped(self):
+        report = create_report(lichess_username="lichessuser", games_num=6)
+        progress = []
+
+        def drop_stored_games(report, hosts):
+            _drop_stored_games(report, hosts)
+            progress.append(Report.objects.get(pk=report.pk).analyzed_games)
+
+        with patch(
+            "analyze_app.tasks._drop_stored_games", side_effect=drop_stored_games
+        ):
+            self.get_games(
+                report,
+                **{
+                    "chess.com": FakeCommunicator("chess.com", fail_after=2),
+                    "lichess.org": FakeCommunicator("lichess.org"),
+                },
+            )
+        # the progress doesn't count dropped games
+        self.assertEqual(progress, [3])
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 3)
+        self.assertEqual(report.fail_reason, "chess.com: chess.com is down")
+        self.assertEqual(len(self.enqueued), 1)
+        self.assertFalse(ChessGame.objects.filter(reports=report, host="chess.com"))
+        # games stored before the failure are kept for other reports
+        self.assertEqual(ChessGame.objects.filter(host="chess.com").count(), 2)
+
+    def test_report_fails_when_all_hosts_fail(self):
+        report = create_report()
+        with self.assertRaises(ConnectionError):
+            self.get_games(
+                report, **{"chess.com": FakeCommunicator("chess.com", fail=True)}
+            )
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, -1)
+        self.assertEqual(report.fail_reason, "chess.com: chess.com is down")
+
+
+@override_settings(INGEST_BATCH_SIZE=2, INGEST_PROGRESS_INTERVAL=60, METRICS_DIR=None)
+class RefreshReportTest(TransactionTestCase):
+    def run_task(self, task, report: Report, **communicators) -> None:
+        with patch(
+            "analyze_app.tasks.get_communicator",
+            side_effect=lambda host, *args: communicators[host],
+        ), patch("analyze_app.tasks.async_task", side_effect=run_task):
+            task(report, LOGGER)
+
+    def test_only_new_games_are_analyzed(self):
+        report = create_report(games_num=5)
+        communicator = FakeCommunicator(unplayed=2)
+        self.run_task(get_games, report, **{"chess.com": communicator})
+        newest = ChessGame.objects.filter(reports=report).latest("date").date
+
+        communicator.unplayed = 0
+        self.run_task(refresh_report, report, **{"chess.com": communicator})
+        self.assertEqual(communicator.requests[-1], (5, newest))
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 5)
+        self.assertEqual(report.games_num, 5)
+        # two new games replaced the two oldest ones
+        self.assertEqual(
+            list(
+                ChessGame.objects.filter(reports=report)
+                .order_by("-date")
+                .values_list("url", flat=True)
+            ),
+            [
+                f"https://www.chess.com/game/live/{seed_id('testuser', number)}"
+                for number in range(5)
+            ],
+        )
+        # the oldest games stay stored for other reports
+        self.assertEqual(ChessGame.objects.count(), 7)
+        statistics = ReportStatistics.objects.get(pk=report.pk)
+        self.assertEqual(statistics.analyzed_games, 5)
+
+    def test_new_games_are_evaluated_in_chunks(self):
+        report = create_report(games_num=5)
+        communicator = FakeCommunicator(unplayed=2)
+        self.run_task(get_games, report, **{"chess.com": communicator})
+
+        communicator.unplayed = 0
+        with patch(
+            "analyze_app.tasks.get_communicator", return_value=communicator
+        ), patch("analyze_app.tasks.async_task") as async_task:
+            refresh_report(report, LOGGER)
+        self.assertEqual(
+            [call.args[0] for call in async_task.call_args_list], [analyze_chunk]
+        )
+        chunk = ReportChunk.objects.get(pk=async_task.call_args.args[1])
+        self.assertEqual(len(chunk.pgns), 2)
+        report.refresh_from_db()
+        self.assertTrue(report.is_complete)
+        self.assertEqual(
+            ChessGame.objects.filter(reports=report, evaluated=False).count(), 2
+        )
+        self.assertTrue(report.statistics.data["mistakes_per_phase"]["pending"])
+
+    def test_host_without_games_is_fetched_fully(self):
+        report = create_report(lichess_username="lichessuser", games_num=6)
+        chess_com = FakeCommunicator("chess.com", fail=True)
+        lichess = FakeCommunicator("lichess.org", unplayed=1)
+        self.run_task(
+            get_games, report, **{"chess.com": chess_com, "lichess.org": lichess}
+        )
+        report.refresh_from_db()
+        self.assertEqual(report.games_num, 3)
+
+        chess_com.fail = False
+        lichess.unplayed = 0
+        self.run_task(
+            refresh_report, report, **{"chess.com": chess_com, "lichess.org": lichess}
+        )
+        self.assertEqual(chess_com.requests[-1], (1, None))
+        report.refresh_from_db()
+        self.assertIsNone(report.fail_reason)
+        self.assertEqual(report.analyzed_games, 4)
+        self.assertEqual(
+            ChessGame.objects.filter(reports=report, host="lichess.org").count(), 3
+        )
+
+    def test_failed_refresh_keeps_games(self):
+        report = create_report(games_num=3)
+        self.run_task(get_games, report, **{"chess.com": FakeCommunicator()})
+        with self.assertRaises(ConnectionError):
+            self.run_task(
+                refresh_report,
+                report,
+                **{"chess.com": FakeCommunicator(fail=True)},
+            )
+        report.refresh_from_db()
+        self.assertEqual(report.analyzed_games, 3)
+        self.assertEqual(report.fail_reason, "chess.com: chess.com is down")
+        self.assertTrue(ReportStatistics.objects.filter(pk=report.pk).exists())
+
+    def test_refresh_view_enqueues_complete_report(self):
+        report = create_report(analyzed_games=5)
+        url = reverse("report:report-refresh", kwargs={"id": report.id})
+        with patch("analyze_app.views.async_task") as async_task:
+            response = self.client.post(url)
+            self.client.post(
+                reverse(
+                    "report:report-refresh",
+                    kwargs={"id": create_report(analyzed_games=1).id},
+                )
+            )
+        self.assertRedirects(
+            response,
+            reverse("report:report-visualized", kwargs={"id": report.id}),
+            fetch_redirect_response=False,
+        )
+        async_task.assert_called_once_with(refresh_report, report)
@@ -5,6 +5,7 @@ from . import views
 app_name = "report"
 urlpatterns = [
     path("", views.IndexView.as_view(), name="index"),
+    path("metrics", views.MetricsView.as_view(), name="metrics"),
     path("reports/", views.ReportListView.as_view(), name="report-list"),
     path("create/", views.ReportCreateView.as_view(), name="report-create"),
     path("<int:id>/", views.ReportDetailView.as_view(), name="report-detail"),
@@ -13,6 +14,17 @@ urlpatterns = [
         views.VisualizedReportDetailView.as_view(),
         name="report-visualized",
     ),
+    path(
+        "<int:id>/stats/<str:name>",
+        views.ReportStatisticView.as_view(),
+        name="report-statistic",
+    ),
+    path(
+        "<int:id>/progress",
+        views.ReportProgressView.as_view(),
+        name="report-progress",
+    ),
     path("<int:id>/delete", views.ReportDeleteView.as_view(), name="report-delete"),
+    path("<int:id>/refresh", views.ReportRefreshView.as_view(), name="report-refresh"),
     # path("<int:id>/games", views, name="report-games"),
 ]
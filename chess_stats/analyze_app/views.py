@@ -1,13 +1,80 @@
+import asyncio
+import json
+from pathlib import Path
+from time import monotonic, sleep
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
-from django.views.generic import CreateView, DetailView, ListView, TemplateView
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.middleware.gzip import GZipMiddleware
+from django.utils.http import quote_etag
+from django.views.generic import (
+    CreateView,
+    DetailView,
+    ListView,
+    TemplateView,
+    View,
+)
 from django_q.tasks import async_task
 from easy_logs import get_logger
 
 from . import forms, models, queries
-from .tasks import get_games
+from .metrics import render_metrics
+from .tasks import get_games, import_games, refresh_report
 
 LOGGER = get_logger(lvl="DEBUG")
+YEAR = 365 * 24 * 60 * 60
+
+
+# used only to compress responses of report views, pages with forms aren't compressed
+_GZIP = GZipMiddleware(lambda request: None)
+
+
+async def _aget_report(id: int) -> models.Report:
+    try:
+        return await models.Report.objects.aget(id=id)
+    except models.Report.DoesNotExist:
+        raise Http404("No report matches the given query.")
+
+
+class ReportCacheMixin:
+    """
+    Answers `304 Not Modified` while the report has not changed since the client
+    fetched it. Responses of complete reports are cached by clients for `max_age`,
+    unless the view clears `cacheable`.
+    """
+
+    max_age = 0
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.report = await _aget_report(self.kwargs.get("id"))
+        self.cacheable = self.report.is_complete
+        self.etag = queries.get_report_etag(self.report)
+        etag = quote_etag(self.etag)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = await super().dispatch(request, *args, **kwargs)
+            response.headers["ETag"] = etag
+        if self.cacheable:
+            patch_cache_control(response, public=True, max_age=self.max_age)
+        else:
+            patch_cache_control(response, no_cache=True)
+        if hasattr(response, "render") and callable(response.render):
+            # template responses are compressed once they are rendered
+            response.add_post_render_callback(
+                lambda response: _GZIP.process_response(request, response)
+            )
+            return response
+        return _GZIP.process_response(request, response)
 
 
 class IndexView(TemplateView):
@@ -30,16 +97,37 @@ class ReportCreateView(CreateView):
             time_class=form.data["time_class"],
             games_num=int(form.data["games_num"]),
             engine_depth=int(form.data["engine_depth"]),
+            analysis_budget=(
+                int(form.data["analysis_minutes"]) * 60
+                if form.data.get("analysis_minutes")
+                else settings.ANALYSIS_BUDGET
+            ),
             professional=bool(form.data.get("professional", False)),
         )
         report.save()
-        async_task(get_games, report)
+        if "games_file" in request.FILES:
+            path = _save_upload(request.FILES["games_file"], report)
+            # games of each host are read as played by the username given for it
+            async_task(import_games, report, path, limit=report.games_num, delete=True)
+        else:
+            async_task(get_games, report)
         return redirect(f"/{report.pk}/visualized")  # TODO CHANGE THIS TO REVERSE
 
     def get_absolute_url(self):
         return reverse("report:report-list")
 
 
+def _save_upload(file, report: models.Report) -> str:
+    """Stores the uploaded file chunk by chunk, it is imported by a queue task."""
+    directory = Path(settings.IMPORT_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{report.pk}.pgn"
+    with open(path, "wb") as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+    return str(path)
+
+
 class ReportDeleteView(DetailView):
     def get_object(self):
         _id = self.kwargs.get("id")
@@ -53,48 +141,165 @@ class ReportDeleteView(DetailView):
         return redirect("report:report-list")
 
 
+class ReportRefreshView(DetailView):
+    def post(self, request, *args, **kwargs):
+        _id = self.kwargs.get("id")
+        report = get_object_or_404(models.Report, id=_id)
+        # a report still being analyzed has nothing to refresh yet
+        if report.is_complete:
+            async_task(refresh_report, report)
+        return redirect("report:report-visualized", id=report.id)
+
+
 class ReportListView(ListView):
     template_name = "reports.html"
     queryset = models.Report.objects.all()
 
+    async def get(self, request, *args, **kwargs):
+        self.object_list = [report async for report in self.get_queryset()]
+        return self.render_to_response(self.get_context_data())
+
 
 class ReportDetailView(DetailView):
     template_name = "report_detail.html"
 
-    def get_object(self):
-        id = self.kwargs.get("id")
-        print(id)
-        report = get_object_or_404(models.Report, id=id)
-        games = models.ChessGame.objects.filter(report=report)
-        return games
+    async def get(self, request, *args, **kwargs):
+        report = await _aget_report(self.kwargs.get("id"))
+        self.object = [
+            game
+            async for game in models.ChessGame.objects.filter(
+                reports=report
+            ).select_related("player")
+        ]
+        return self.render_to_response(self.get_context_data(object=self.object))
 
     def get_absolute_url(self):
         return reverse("report:report-detail", kwargs={"id": self.id})
 
 
-class VisualizedReportDetailView(DetailView):
+class VisualizedReportDetailView(ReportCacheMixin, DetailView):
     template_name = "visualized_wraper.html"
 
-    def get_object(self):
-        id = self.kwargs.get("id")
-        report = get_object_or_404(models.Report, id=id)
-        if not models.ChessGame.objects.filter(report=self.kwargs.get("id")).exists():
-            return {
-                "Xanalyzed_games": {
-                    "total": report.analyzed_games,
-                },
-                "Xfail_reason": report.fail_reason,
-            }
-        queries_maker = queries.QueriesMaker(report, LOGGER)
-        data = queries_maker.asdict()
-        # conclusion_maker = ConclusionsMaker(data, LOGGER)
-        # conclusions = conclusion_maker.asdict()
-        # merge dicts
-        # return {**data, **conclusions}
-        from rich import inspect
-
-        inspect(data)
-        return data
+    async def get(self, request, *args, **kwargs):
+        # charts load their statistics from `ReportStatisticView`
+        self.object = queries.get_report_outline(self.report, LOGGER)
+        return self.render_to_response(self.get_context_data(object=self.object))
 
     def get_absolute_url(self):
         return reverse("report:report-visualized", kwargs={"id": self.id})
+
+
+class ReportStatisticView(ReportCacheMixin, View):
+    # urls of statistics carry the report etag, so they are never outdated
+    max_age = YEAR
+
+    async def dispatch(self, request, *args, **kwargs):
+        name = self.kwargs.get("name")
+        if name not in queries.STATISTIC_NAMES:
+            raise Http404(f"No statistic {name}")
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        name = self.kwargs.get("name")
+        try:
+            points = self._points(request)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        data = await queries.aget_report_statistic(
+            self.report, name, LOGGER, elo_points=points
+        )
+        # pending statistics are asked for again until games are evaluated
+        self.cacheable = self.cacheable and not data.get("pending")
+        return JsonResponse(data)
+
+    def _points(self, request) -> int | None:
+        """
+        Budget of points per host of series downsampled for the client, e.g. the
+        width of its chart. Budgets above `max_elo_points` are lowered to it.
+        """
+        points = request.GET.get("points")
+        if points is None:
+            return None
+        if not points.isdigit() or int(points) < 3:
+            raise ValueError(f"points must be a number of at least 3, not {points}")
+        return min(int(points), queries.QueriesMaker.max_elo_points)
+
+
+class ReportProgressView(View):
+    """
+    Streams progress of the report as server-sent events until it is analyzed,
+    so the report page doesn't have to be reloaded. Streams end after `timeout`
+    seconds, browsers then reconnect.
+    """
+
+    interval = 1
+    timeout = 60
+    fields = ["analyzed_games", "games_num", "fail_reason"]
+
+    async def get(self, request, *args, **kwargs):
+        report = await _aget_report(self.kwargs.get("id"))
+        # WSGI servers can't stream async iterators and ASGI servers sync ones
+        events = self.aevents if isinstance(request, ASGIRequest) else self.events
+        response = StreamingHttpResponse(
+            events(report), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        # proxies must not buffer the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    def events(self, report: models.Report):
+        deadline = monotonic() + self.timeout
+        state = None
+        while True:
+            # games per host are counted only when the report changed
+            if state != self._state(report):
+                state = self._state(report)
+                yield self._message(queries.get_report_progress(report))
+            if self._finished(report):
+                yield "event: done\ndata: {}\n\n"
+                return
+            if monotonic() >= deadline:
+                return
+            sleep(self.interval)
+            report.refresh_from_db(fields=self.fields)
+
+    async def aevents(self, report: models.Report):
+        deadline = monotonic() + self.timeout
+        state = None
+        while True:
+            if state != self._state(report):
+                state = self._state(report)
+                progress = await sync_to_async(queries.get_report_progress)(report)
+                yield self._message(progress)
+            if self._finished(report):
+                yield "event: done\ndata: {}\n\n"
+                return
+            if monotonic() >= deadline:
+                return
+            await asyncio.sleep(self.interval)
+            await report.arefresh_from_db(fields=self.fields)
+
+    def _state(self, report: models.Report) -> tuple:
+        return tuple(getattr(report, field) for field in self.fields)
+
+    def _finished(self, report: models.Report) -> bool:
+        return report.is_complete or report.analyzed_games == -1
+
+    def _message(self, progress: dict) -> str:
+        return f"data: {json.dumps(progress)}\n\n"
+
+
+class MetricsView(View):
+    """Metrics in Prometheus text format, served only to local addresses."""
+
+    def get(self, request, *args, **kwargs):
+        if request.META.get("REMOTE_ADDR") not in {
+            "127.0.0.1",
+            "::1",
+            *settings.INTERNAL_IPS,
+        }:
+            raise Http404()
+        return HttpResponse(
+            render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -28,14 +29,78 @@ DEBUG = True
 ALLOWED_HOSTS = []
 
 
+# Tasks that failed or whose worker died are retried after `retry` seconds, which
+# must exceed `timeout`. Ingestion tasks resume after the games they already saved.
 Q_CLUSTER = {
-    "retry": 9999,
+    "retry": 1260,
     "workers": 2,
     "orm": "default",
-    "max_attempts": 1,
+    "max_attempts": 3,
     "timeout": 1200,
 }
 
+# Analyzed games are written to the database in batches of `INGEST_BATCH_SIZE`.
+# A smaller batch is written earlier if `INGEST_PROGRESS_INTERVAL` seconds passed,
+# so the report progress is refreshed at least that often.
+INGEST_BATCH_SIZE = 50
+INGEST_PROGRESS_INTERVAL = 5
+# Fetched games are analyzed by queue tasks of `INGEST_CHUNK_SIZE` games, spread
+# across all qcluster workers, so big reports fit within the task timeout.
+INGEST_CHUNK_SIZE = 25
+# Games are ingested by a pipeline of stages working at once - fetch, parse, analysis
+# (or reading without the engine) and writes. `INGEST_WORKERS` threads run each
+# stage, analysis one per engine of the pool by default. At most `INGEST_QUEUE_SIZE`
+# games are between the stages, a faster fetch waits for the others.
+INGEST_WORKERS = {"parse": 1, "metadata": 1}
+INGEST_QUEUE_SIZE = 64
+# Imported PGN / NDJSON files are streamed in blocks of `IMPORT_BLOCK_SIZE` games.
+# Files uploaded with a new report wait in `IMPORT_DIR` until they are imported.
+IMPORT_BLOCK_SIZE = 1000
+IMPORT_DIR = BASE_DIR / "imports"
+
+# Games are downloaded from `HOST_APIS`. Requests to a host share pooled connections
+# and at most `concurrency` of them run at once, e.g. chess.com archive months.
+# Rate limited requests wait for `Retry-After` and are retried `FETCH_RETRIES` times.
+HOST_APIS = {
+    "chess.com": {"base_url": "https://api.chess.com", "concurrency": 4},
+    # lichess asks to export games of one user at a time
+    "lichess.org": {"base_url": "https://lichess.org", "concurrency": 1},
+}
+FETCH_RETRIES = 5
+FETCH_TIMEOUT = 30
+FETCH_USER_AGENT = "chess-stats (https://github.com/michalskibinski109/chess-stats)"
+
+# Raw responses of host APIs, e.g. monthly archives, are cached compressed in
+# `RESPONSE_CACHE_DIR`, so repeated reports don't download them again. Least recently
+# used responses are evicted above `RESPONSE_CACHE_MAX_BYTES`. `None` disables it.
+RESPONSE_CACHE_DIR = BASE_DIR / "response_cache"
+RESPONSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Stockfish used to analyze games, download it from https://stockfishchess.org/download/
+# Games are analyzed in parallel by `ENGINE_POOL_SIZE` long-lived engine processes
+# of each qcluster worker, together they use all cores.
+ENGINE_PATH = "./stockfish.exe"
+ENGINE_POOL_SIZE = max(1, (os.cpu_count() or 1) // Q_CLUSTER["workers"])
+# Reports evaluate their games within an analysis budget, the depth is lowered for
+# the games left once measured games show they wouldn't fit. Each ply deeper costs
+# `ENGINE_DEPTH_GROWTH` times more, depth doesn't drop below `ENGINE_MIN_DEPTH`.
+# Once the depth is lowered, positions after a decisive evaluation are searched only
+# `ENGINE_DECISIVE_DEPTH` deep.
+ANALYSIS_BUDGET = 30 * 60
+ENGINE_DEPTH_GROWTH = 1.5
+ENGINE_MIN_DEPTH = 2
+ENGINE_DECISIVE_DEPTH = 4
+
+# Evaluations of positions (most of them from popular openings) are cached in memory
+# and saved to `EVALUATION_CACHE_PATH` after each report, so they survive restarts.
+EVALUATION_CACHE_SIZE = 200_000
+EVALUATION_CACHE_PATH = BASE_DIR / "evaluation_cache.json"
+
+# qcluster workers save their metrics to `METRICS_DIR` after each report, `/metrics`
+# sums them up with metrics of the web server. Files of ended workers are removed,
+# so the directory is shared by processes of one host. `None` keeps metrics in memory.
+METRICS_DIR = BASE_DIR / "metrics"
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -92,6 +157,8 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # seconds a write transaction waits for writers of other qcluster workers
+        "OPTIONS": {"timeout": 30},
     }
 }
 